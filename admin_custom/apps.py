@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class AdminCustomConfig(AppConfig):
+    name = 'admin_custom'
+
+    def ready(self):
+        import admin_custom.signals  # noqa: F401
@@ -1,7 +1,19 @@
+import time
+
 from django.contrib import admin
+from django.core.cache import cache
 from django.urls import reverse, NoReverseMatch, resolve
+from django.utils.functional import SimpleLazyObject
 from django.utils.text import capfirst
 
+VERSION_CACHE_KEY = 'admin_custom:app-list-version'
+
+# Maximum number of memoized app lists per process.
+MAX_APP_LISTS = 128
+
+# App lists keyed by (permissions version, admin site name, permissions key).
+_app_lists = {}
+
 
 def get_admin_site(request):
     try:
@@ -20,8 +32,55 @@ def get_admin_site(request):
     return admin.site
 
 
+def get_permissions_key(user):
+    """
+    Key identifying what the user is allowed to see in the admin.
+    """
+    if user.is_active and user.is_superuser:
+        return (True, user.is_staff, True, None)
+    return (user.is_active, user.is_staff, False, frozenset(user.get_all_permissions()))
+
+
+def get_version():
+    """
+    Version of the permissions, shared by all the processes through the cache.
+    """
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(VERSION_CACHE_KEY, version, None):
+            version = cache.get(VERSION_CACHE_KEY, version)
+    return version
+
+
+def invalidate():
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, time.time_ns(), None)
+    _app_lists.clear()
+
+
 def app_list(request):
+    """
+    Apps and models of the admin site the user has permissions for, evaluated
+    only when a template uses them and memoized per admin site and permissions.
+    """
+    return {'apps': SimpleLazyObject(lambda: get_app_list(request))}
+
+
+def get_app_list(request):
     admin_site = get_admin_site(request)
+    key = (get_version(), admin_site.name, get_permissions_key(request.user))
+    apps = _app_lists.get(key)
+    if apps is None:
+        if len(_app_lists) >= MAX_APP_LISTS:
+            _app_lists.clear()
+        apps = _app_lists[key] = build_app_list(request, admin_site)
+    return apps
+
+
+def build_app_list(request, admin_site):
 
     app_dict = {}
     for model, model_admin in admin_site._registry.items():
@@ -82,4 +141,4 @@ def app_list(request):
     for app in app_list:
         app['models'].sort(key=lambda x: x['name'])
 
-    return {'apps': app_list}
+    return app_list
@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from admin_custom.context_processors import invalidate
+
+User = get_user_model()
+
+
+# The permissions key already changes with the permissions of the user, the
+# invalidation drops entries made unreachable by permission changes.
+@receiver([post_save, post_delete], sender=Permission)
+@receiver([post_save, post_delete], sender=Group)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_app_lists(sender, **kwargs):
+    invalidate()
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import Permission, User
+from django.test import RequestFactory, TestCase
+
+from admin_custom import context_processors
+
+
+class AppListTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.staff = User.objects.create_user(username='staff', password='staff', is_staff=True)
+        self.superuser = User.objects.create_superuser(username='admin', password='admin')
+
+    def setUp(self):
+        context_processors._app_lists.clear()
+        self.factory = RequestFactory()
+
+    def get_request(self, user, path='/admin/'):
+        request = self.factory.get(path)
+        request.user = User.objects.get(pk=user.pk)
+        return request
+
+    def test_app_list_is_lazy(self):
+        request = self.get_request(self.staff, '/quiz/list/')
+        with self.assertNumQueries(0):
+            context = context_processors.app_list(request)
+        self.assertEqual(context_processors._app_lists, {})
+        self.assertEqual(list(context['apps']), [])
+
+    def test_app_list_memoized(self):
+        apps = list(context_processors.app_list(self.get_request(self.superuser))['apps'])
+        self.assertIn('Quiz', [model['object_name'] for app in apps for model in app['models']])
+
+        request = self.get_request(self.superuser)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(context_processors.app_list(request)['apps']), apps)
+        self.assertEqual(len(context_processors._app_lists), 1)
+
+    def test_app_list_follows_permissions(self):
+        request = self.get_request(self.staff)
+        self.assertEqual(list(context_processors.app_list(request)['apps']), [])
+
+        self.staff.user_permissions.add(Permission.objects.get(codename='view_quiz'))
+        self.assertEqual(context_processors._app_lists, {})
+        apps = list(context_processors.app_list(self.get_request(self.staff))['apps'])
+        self.assertEqual([model['object_name'] for app in apps for model in app['models']], ['Quiz'])
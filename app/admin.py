@@ -17,8 +17,9 @@ class QuizAdmin(SimpleHistoryAdmin):
         return super().changelist_view(request, extra_context=extra_context)
 
     def get_total_test_counts(self, obj):
-        return obj.quiz_test_results.count()
+        return obj.test_count
     get_total_test_counts.short_description = 'Tests'
+    get_total_test_counts.admin_order_field = 'test_count'
 
     def publish_quiz(self, request, queryset):
         for q in queryset:
@@ -48,8 +49,20 @@ class QuizTestResultAdmin(ModelAdmin):
     list_display = ('user', 'quiz', 'score', 'created')
 
 
+class ExportJobAdmin(ModelAdmin):
+    list_display = ('quiz', 'filetype', 'status', 'latest_result_id', 'result_count', 'score_total', 'created', 'modified')
+    list_filter = ('status', 'filetype')
+
+
+class QueuedMailAdmin(ModelAdmin):
+    list_display = ('recipient', 'subject', 'status', 'attempts', 'next_attempt', 'created', 'sent')
+    list_filter = ('status',)
+
+
 admin.site.register(Quiz, QuizAdmin)
 admin.site.register(Question, QuestionAdmin)
 admin.site.register(QuestionChoice, QuestionChoiceAdmin)
 admin.site.register(QuizTestResult, QuizTestResultAdmin)
 admin.site.register(QuizTestResultAnswer)
+admin.site.register(ExportJob, ExportJobAdmin)
+admin.site.register(QueuedMail, QueuedMailAdmin)
@@ -0,0 +1,148 @@
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Max
+
+from app.answers import AnswerPacking
+from app.cache import QuizStructure, QuizVersion
+from app.grading import AnswerKey
+from app.models import QuizTestResult, QuizTestResultAnswer
+
+# Share of the attempts in the upper and lower groups of the discrimination index.
+DISCRIMINATION_GROUP = 0.27
+
+
+class QuizAnalytics:
+    """
+    Item statistics of the attempts of a quiz, computed over the attempt x choice
+    selection matrix with NumPy. Cached until a new attempt is saved or the quiz changes.
+    """
+
+    @staticmethod
+    def get(quiz_id):
+        """
+        Get the statistics of the quiz from the cache, computing them on a miss.
+
+        :param quiz_id: PK value of the quiz.
+        :return: Dict of the statistics, see QuizAnalytics.build.
+        """
+        latest_result_id = QuizTestResult.objects.filter(quiz_id=quiz_id).aggregate(latest=Max('pk'))['latest'] or 0
+        key = f"{QuizVersion.key('quiz-analytics', quiz_id)}:{latest_result_id}"
+        analytics = cache.get(key)
+        if analytics is None:
+            analytics = QuizAnalytics.build(quiz_id)
+            cache.set(key, analytics, None)
+        return analytics
+
+    @staticmethod
+    def selections(quiz_id, choice_ids):
+        """
+        Selection matrix of the attempts of the quiz, from the answer rows and the packed answers.
+
+        :param quiz_id: PK value of the quiz.
+        :param choice_ids: Array of the choice pks, in column order.
+        :return: Tuple of the array of the scores and the boolean matrix of the selected choices, one row per attempt.
+        """
+        results = list(QuizTestResult.objects.filter(quiz_id=quiz_id).order_by('pk')
+                       .values_list('pk', 'score', 'answer_layout_id', 'packed_answers'))
+        result_ids = np.array([result_id for result_id, score, layout_id, packed in results], dtype=np.int64)
+        scores = np.array([score for result_id, score, layout_id, packed in results], dtype=np.int64)
+        selected = np.zeros((len(results), len(choice_ids)), dtype=bool)
+        if not results or not len(choice_ids):
+            return scores, selected
+
+        # Columns of the choices, sorted for searchsorted. Choices deleted since an attempt are dropped.
+        order = np.argsort(choice_ids)
+        sorted_choice_ids = choice_ids[order]
+
+        def mark(rows, answer_choice_ids):
+            positions = np.minimum(np.searchsorted(sorted_choice_ids, answer_choice_ids), len(choice_ids) - 1)
+            known = sorted_choice_ids[positions] == answer_choice_ids
+            selected[rows[known], order[positions[known]]] = True
+
+        answers = np.array(list(QuizTestResultAnswer.objects.filter(quiz_test__quiz_id=quiz_id).values_list('quiz_test_id', 'choice_id')),
+                           dtype=np.int64).reshape(-1, 2)
+        if len(answers):
+            mark(np.searchsorted(result_ids, answers[:, 0]), answers[:, 1])
+
+        # Bitmaps packed over the same layout have the same length and are unpacked together.
+        layouts = dict()
+        for row, (result_id, score, layout_id, packed) in enumerate(results):
+            if packed is not None:
+                layouts.setdefault(layout_id, []).append((row, bytes(packed)))
+        for layout_id, packed_rows in layouts.items():
+            layout_choice_ids = np.array([choice_id for question_id, choice_id in AnswerPacking.layout_pairs(layout_id)], dtype=np.int64)
+            bitmaps = np.frombuffer(b''.join(packed for row, packed in packed_rows), dtype=np.uint8).reshape(len(packed_rows), -1)
+            bits = np.unpackbits(bitmaps, axis=1, bitorder='little')[:, :len(layout_choice_ids)].astype(bool)
+            rows, columns = np.nonzero(bits)
+            mark(np.array([row for row, packed in packed_rows], dtype=np.int64)[rows], layout_choice_ids[columns])
+        return scores, selected
+
+    @staticmethod
+    def build(quiz_id):
+        """
+        Compute the score distribution, and for each question its difficulty
+        (share of attempts answering it correctly), discrimination index
+        (difficulty in the top minus the bottom 27% of the attempts by score)
+        and the popularity of its choices.
+
+        :param quiz_id: PK value of the quiz.
+        """
+        structure = QuizStructure.get(quiz_id)
+        answer_key = AnswerKey.get(quiz_id)
+        choice_ids = np.array([choice_id for question_id, question, choices in structure for choice_id, choice in choices], dtype=np.int64)
+        # Question index of each choice column.
+        choice_questions = np.array([index for index, (question_id, question, choices) in enumerate(structure) for _ in choices], dtype=np.int64)
+        is_correct = np.array([choice_id in answer_key[question_id] for question_id, question, choices in structure for choice_id, choice in choices], dtype=bool)
+        graded = np.array([bool(answer_key[question_id]) for question_id, question, choices in structure], dtype=bool)
+
+        scores, selected = QuizAnalytics.selections(quiz_id, choice_ids)
+        attempts = len(scores)
+
+        # A question is correct when none of its wrong choices is selected, as graded by AnswerKey.
+        wrong = selected & ~is_correct & graded[choice_questions]
+        membership = np.zeros((len(choice_ids), len(structure)), dtype=np.int64)
+        membership[np.arange(len(choice_ids)), choice_questions] = 1
+        correct = (wrong.astype(np.int64) @ membership) == 0
+
+        difficulty = correct.mean(axis=0) if attempts else np.zeros(len(structure))
+        group = max(1, int(round(attempts * DISCRIMINATION_GROUP)))
+        ranking = np.argsort(correct.sum(axis=1), kind='stable')
+        if attempts >= 2:
+            discrimination = correct[ranking[-group:]].mean(axis=0) - correct[ranking[:group]].mean(axis=0)
+        else:
+            discrimination = np.zeros(len(structure))
+        choice_counts = selected.sum(axis=0)
+
+        questions = []
+        column = 0
+        for index, (question_id, question, choices) in enumerate(structure):
+            question_choices = []
+            for choice_id, choice in choices:
+                question_choices.append({
+                    'id': choice_id,
+                    'choice': choice,
+                    'is_correct': bool(is_correct[column]),
+                    'count': int(choice_counts[column]),
+                    'popularity': round(float(choice_counts[column] / attempts), 4) if attempts else 0.0,
+                })
+                column += 1
+            questions.append({
+                'id': question_id,
+                'question': question,
+                'difficulty': round(float(difficulty[index]), 4),
+                'discrimination': round(float(discrimination[index]), 4),
+                'choices': question_choices,
+            })
+
+        # Scores saved before questions were removed count in the top bucket.
+        distribution = np.bincount(np.clip(scores, 0, len(structure)), minlength=len(structure) + 1)
+        return {
+            'attempts': attempts,
+            'score': {
+                'mean': round(float(scores.mean()), 4) if attempts else 0.0,
+                'median': float(np.median(scores)) if attempts else 0.0,
+                'std': round(float(scores.std()), 4) if attempts else 0.0,
+                'distribution': [int(count) for count in distribution],
+            },
+            'questions': questions,
+        }
@@ -0,0 +1,125 @@
+import hashlib
+import struct
+
+from django.core.cache import cache
+
+from app.cache import QuizStructure, QuizVersion
+from app.models import AnswerLayout, QuizTestResultAnswer
+
+
+class AnswerPacking:
+    """
+    Compact storage of the selected choices of a test result: one bit per choice
+    of the quiz, in question then choice pk order, over an AnswerLayout shared by
+    all the results saved while the quiz had the same questions and choices.
+    """
+
+    @staticmethod
+    def encode_layout(pairs):
+        return struct.pack(f'<{len(pairs) * 2}I', *(pk for pair in pairs for pk in pair))
+
+    @staticmethod
+    def decode_layout(data):
+        values = struct.unpack(f'<{len(data) // 4}I', bytes(data))
+        return tuple(zip(values[0::2], values[1::2]))
+
+    @staticmethod
+    def layout(quiz_id):
+        """
+        Current layout of the quiz, created on first use.
+
+        :param quiz_id: PK value of the quiz.
+        :return: Tuple of the AnswerLayout pk and a dict of choice pk to its bit.
+        """
+        key = QuizVersion.key('answer-layout', quiz_id)
+        layout = cache.get(key)
+        if layout is None:
+            pairs = tuple((question_id, choice_id) for question_id, question, choices in QuizStructure.get(quiz_id)
+                          for choice_id, choice in choices)
+            data = AnswerPacking.encode_layout(pairs)
+            instance, created = AnswerLayout.objects.get_or_create(quiz_id=quiz_id, digest=hashlib.sha1(data).hexdigest(),
+                                                                   defaults={'choices': data})
+            layout = (instance.pk, {choice_id: bit for bit, (question_id, choice_id) in enumerate(pairs)})
+            cache.set(key, layout, None)
+        return layout
+
+    @staticmethod
+    def layout_pairs(layout_id):
+        """
+        :return: Tuple of the (question pk, choice pk) pairs of the layout, by bit.
+        """
+        # Layouts never change once saved.
+        key = f'app:answer-layout-pairs:{layout_id}'
+        pairs = cache.get(key)
+        if pairs is None:
+            pairs = AnswerPacking.decode_layout(AnswerLayout.objects.values_list('choices', flat=True).get(pk=layout_id))
+            cache.set(key, pairs, None)
+        return pairs
+
+    @staticmethod
+    def pack(bits, choice_ids):
+        """
+        :param bits: Dict of choice pk to its bit, from the layout.
+        :param choice_ids: Iterable of selected choice pks.
+        :return: Bytes of the bitmap.
+        """
+        value = 0
+        for choice_id in choice_ids:
+            value |= 1 << bits[choice_id]
+        return value.to_bytes((len(bits) + 7) // 8, 'little')
+
+    @staticmethod
+    def unpack(pairs, data):
+        """
+        :param pairs: Pairs of the layout the bitmap was packed over.
+        :param data: Bytes of the bitmap.
+        :return: List of (question pk, choice pk) of the selected choices.
+        """
+        value = int.from_bytes(bytes(data), 'little')
+        selected = []
+        bit = 0
+        while value:
+            if value & 1:
+                selected.append(pairs[bit])
+            value >>= 1
+            bit += 1
+        return selected
+
+    @staticmethod
+    def pack_answers(quiz_id, answers):
+        """
+        Pack the answers of a submission over the current layout of the quiz.
+
+        :param quiz_id: PK value of the quiz.
+        :param answers: Answers returned by QuizTestForm.check_correct_answers.
+        :return: Tuple of the AnswerLayout pk and the bitmap.
+        """
+        layout_id, bits = AnswerPacking.layout(quiz_id)
+        return layout_id, AnswerPacking.pack(bits, (choice_id for answer in answers.values() for choice_id in answer['selected']))
+
+
+class PackedAnswers:
+    """
+    Answers of a result with packed storage, unpacked on first access into
+    unsaved QuizTestResultAnswer instances.
+    """
+    def __init__(self, result):
+        self.result = result
+        self._answers = None
+
+    @property
+    def answers(self):
+        if self._answers is None:
+            pairs = AnswerPacking.layout_pairs(self.result.answer_layout_id)
+            self._answers = [QuizTestResultAnswer(quiz_test=self.result, question_id=question_id, choice_id=choice_id)
+                             for question_id, choice_id in AnswerPacking.unpack(pairs, self.result.packed_answers)]
+        return self._answers
+
+    def __iter__(self):
+        return iter(self.answers)
+
+    def __len__(self):
+        return len(self.answers)
+
+    def __getitem__(self, index):
+        return self.answers[index]
@@ -0,0 +1,19 @@
+from django.urls import path
+
+from app import async_views, urls
+
+app_name = urls.app_name
+
+# Views of app.urls with an async version, by url name.
+ASYNC_VIEWS = {
+    'Index': async_views.Index.as_view(),
+    'QuizList': async_views.QuizList.as_view(),
+    'QuizDetail': async_views.QuizDetail.as_view(),
+    'QuizTest': async_views.QuizTest.as_view(),
+    'quiz_result_export': async_views.quiz_result_export,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name) if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in urls.urlpatterns
+]
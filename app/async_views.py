@@ -0,0 +1,272 @@
+"""
+Async versions of the busiest views, served by the ASGI application (see
+quiz/asgi.py and quiz/async_urls.py). They read through the async ORM and
+hand the blocking work, the transaction saving a test result and the result
+exports, to threads so the event loop keeps serving other connections.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.mixins import UserPassesTestMixin
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.db import connections
+from django.http import Http404, HttpResponseNotAllowed, HttpResponseRedirect
+from django.urls import reverse_lazy
+
+from app import views
+from app.cache import PageCacheMixin
+from app.conditional import QuizValidators, conditional_response
+from app.models import Quiz
+from quiz.settings.base import logger
+
+
+async def load_user(request):
+    """
+    Resolve the lazy request.user, whose session and user lookups are synchronous.
+
+    :return: The user of the request.
+    """
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+class AsyncPageCacheMixin(PageCacheMixin):
+    """
+    PageCacheMixin for views with async handlers.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        await load_user(request)
+        # The dispatch of View, returning the coroutine of the handler.
+        handle = super(PageCacheMixin, self).dispatch
+        if not await sync_to_async(self.is_page_cacheable)(request):
+            return await handle(request, *args, **kwargs)
+
+        key = await sync_to_async(self.get_page_cache_key)()
+        response = await cache.aget(key)
+        if response is not None:
+            return self.cached_response(request, response)
+        response = await handle(request, *args, **kwargs)
+        self.store_page(key, response)
+        return response
+
+
+class Index(AsyncPageCacheMixin, views.Index):
+    """
+    Index or Home view.
+    """
+    async def get(self, request, *args, **kwargs):
+        etag = await QuizValidators.alisting_etag(request)
+        return await conditional_response(request, etag, lambda: self.render_page(**kwargs))
+
+    async def render_page(self, **kwargs):
+        quizzes = [quiz async for quiz in self.get_queryset()]
+        quizzes = await sync_to_async(views.with_versions)(quizzes)
+        return self.render_to_response(super(views.Index, self).get_context_data(quizzes=quizzes, **kwargs))
+
+
+class QuizList(AsyncPageCacheMixin, views.QuizList):
+    """
+    View all quizzes.
+    """
+    async def get(self, request, *args, **kwargs):
+        etag = await QuizValidators.alisting_etag(request)
+        return await conditional_response(request, etag, self.render_page)
+
+    async def render_page(self):
+        self.object_list = [quiz async for quiz in self.get_queryset()]
+        return self.render_to_response(await sync_to_async(self.get_context_data)())
+
+
+class QuizDetail(AsyncPageCacheMixin, views.QuizDetail):
+    """
+    Detail of the quiz.
+    """
+    async def get(self, request, *args, **kwargs):
+        etag = await QuizValidators.adetail_etag(request, self.kwargs.get(self.pk_url_kwarg))
+        return await conditional_response(request, etag, self.render_page)
+
+    async def render_page(self):
+        try:
+            self.object = await self.get_queryset().aget(pk=self.kwargs.get(self.pk_url_kwarg))
+        except Quiz.DoesNotExist:
+            raise Http404('No quiz found matching the query')
+        # Only the quiz version is read, from the cache, the questions are rendered from a lazy queryset.
+        return self.render_to_response(await sync_to_async(self.get_context_data)(object=self.object))
+
+
+class QuizTest(views.QuizTest):
+    """
+    Test Form View.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        await load_user(request)
+        if not self.test_func():
+            return self.handle_no_permission()
+        return await super(UserPassesTestMixin, self).dispatch(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        return await self.render_test(await sync_to_async(self.get_form)())
+
+    async def post(self, request, *args, **kwargs):
+        # The structure of the quiz comes from the cache, read from the database on a miss.
+        form = await sync_to_async(self.get_form)()
+        if not form.is_valid():
+            logger.error(form.errors)
+            return await self.render_test(form)
+        # Transactions are not supported by the async ORM, the result and its mail are saved in a thread.
+        await sync_to_async(self.save_result)(form)
+        messages.add_message(request, messages.SUCCESS, 'Thank you for your participation.')
+        return HttpResponseRedirect(reverse_lazy('app:QuizResultList'))
+
+    async def put(self, *args, **kwargs):
+        return await self.post(*args, **kwargs)
+
+    async def render_test(self, form):
+        quiz = await Quiz.objects.aget(pk=self.kwargs.get('quiz_id'))
+        return self.render_to_response(super(views.QuizTest, self).get_context_data(form=form, quiz=quiz))
+
+
+async def quiz_result_export(request, quiz_id, filetype):
+    """
+    Export quiz result, generated and streamed from a thread of its own.
+
+    :param request:
+    :param quiz_id: The primary key of the quiz.
+    :param filetype: The type of file to be exported.
+    :return: Response with attachment.
+    """
+    # require_GET and login_required only wrap sync views in this version of Django.
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    user = await load_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    etag = await QuizValidators.aexport_etag(request, quiz_id, filetype)
+    return await conditional_response(request, etag, lambda: offload_response(views.export_response, quiz_id, filetype))
+
+
+# Threads generating the result exports of the async views, see offload_response.
+export_executor = ThreadPoolExecutor(max_workers=settings.QUIZ_ASYNC_EXPORT_THREADS, thread_name_prefix='export')
+
+
+async def offload_response(build, *args):
+    """
+    Build a response in a thread of export_executor, and stream its content
+    from that same thread. Neither the export nor the database cursor it reads
+    from block the event loop, or the thread shared by the sync views, and the
+    content is not buffered as sync iterators are under ASGI.
+
+    :param build: Function returning the response.
+    :return: The response, with an async iterator as streaming content.
+    """
+    loop = asyncio.get_running_loop()
+    built = loop.create_future()
+    chunks = asyncio.Queue(maxsize=settings.QUIZ_ASYNC_EXPORT_BUFFER)
+    stopped = threading.Event()
+    # The context carries the profiling timer of the request to the thread.
+    loop.run_in_executor(export_executor, contextvars.copy_context().run, produce, loop, built, chunks, stopped, build, *args)
+    content = QueueStream(loop, chunks, stopped)
+    try:
+        response = await built
+    except BaseException:
+        content.close()
+        raise
+    if response.streaming and not response.is_async:
+        # Closed with the response, which stops the thread when the client goes away.
+        response.streaming_content = content
+    else:
+        content.close()
+    return response
+
+
+def produce(loop, built, chunks, stopped, build, *args):
+    """
+    Body of the export thread: build the response, then put its content in the
+    chunks queue, followed by None, until the stream is stopped. The stream
+    ends with the error instead when the content fails, or when a chunk is not
+    taken within QUIZ_ASYNC_EXPORT_STALL_TIMEOUT seconds.
+    """
+    def resolve(method, value):
+        loop.call_soon_threadsafe(lambda: built.done() or method(value))
+
+    def put(item):
+        future = asyncio.run_coroutine_threadsafe(chunks.put(item), loop)
+        try:
+            future.result(settings.QUIZ_ASYNC_EXPORT_STALL_TIMEOUT)
+        except BaseException:
+            future.cancel()
+            raise
+
+    try:
+        try:
+            response = build(*args)
+        except BaseException as e:
+            resolve(built.set_exception, e)
+            return
+        # Taken before the event loop replaces it with the stream of the queue.
+        content = response.streaming_content if response.streaming and not response.is_async else None
+        resolve(built.set_result, response)
+        if content is None:
+            return
+        try:
+            for chunk in content:
+                put(chunk)
+                if stopped.is_set():
+                    return
+            put(None)
+        except Exception as e:
+            logger.error(f'Export stream aborted: {e!r}')
+            loop.call_soon_threadsafe(abort, chunks, e)
+    finally:
+        # The thread has its own database connections.
+        connections.close_all()
+
+
+class QueueStream:
+    """
+    Async iterator over the content put in the queue by the export thread.
+    """
+
+    def __init__(self, loop, chunks, stopped):
+        self.loop = loop
+        self.chunks = chunks
+        self.stopped = stopped
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        chunk = await self.chunks.get()
+        if chunk is None:
+            raise StopAsyncIteration
+        if isinstance(chunk, Exception):
+            raise chunk
+        return chunk
+
+    def close(self):
+        """
+        Stop the export thread. The queue is emptied, from the event loop, so the thread does not wait on a full one.
+        """
+        self.stopped.set()
+        self.loop.call_soon_threadsafe(empty, self.chunks)
+
+
+def empty(chunks):
+    while not chunks.empty():
+        chunks.get_nowait()
+
+
+def abort(chunks, error):
+    """
+    Replace the content left in the queue by the error.
+    """
+    empty(chunks)
+    chunks.put_nowait(error)
@@ -0,0 +1,165 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from app.models import Question
+
+
+class QuizVersion:
+    """
+    Modification version of a quiz, bumped whenever the quiz, its questions
+    or their choices change. Cache keys of per-quiz data embed the version so
+    bumping it invalidates all of them at once.
+
+    The LISTING version covers the pages listing quizzes, and is bumped with any quiz.
+    """
+    CACHE_KEY = 'app:quiz-version:{quiz_id}'
+    LISTING = 'listing'
+
+    @staticmethod
+    def cache_key(quiz_id):
+        return QuizVersion.CACHE_KEY.format(quiz_id=quiz_id)
+
+    @staticmethod
+    def get(quiz_id):
+        key = QuizVersion.cache_key(quiz_id)
+        version = cache.get(key)
+        if version is None:
+            # Start from the clock so a version evicted from the cache never repeats an old one.
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        return version
+
+    @staticmethod
+    def get_many(quiz_ids):
+        """
+        :param quiz_ids: PK values of the quizzes.
+        :return: Dict of quiz pk to its version.
+        """
+        keys = {QuizVersion.cache_key(quiz_id): quiz_id for quiz_id in quiz_ids}
+        versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+        for quiz_id in set(keys.values()) - versions.keys():
+            versions[quiz_id] = QuizVersion.get(quiz_id)
+        return versions
+
+    @staticmethod
+    def bump(quiz_id):
+        if quiz_id != QuizVersion.LISTING:
+            QuizVersion.bump(QuizVersion.LISTING)
+        # A new clock reading rather than an increment, which shared caches like the file cache do not make
+        # atomic: two processes bumping the same version at once still leave a version unseen by both.
+        version = time.time_ns()
+        cache.set(QuizVersion.cache_key(quiz_id), version, None)
+        return version
+
+    @staticmethod
+    def key(prefix, quiz_id):
+        """
+        Cache key for per-quiz data, valid until the quiz version is bumped.
+
+        :param prefix: Name of the cached data.
+        :param quiz_id: PK value of the quiz.
+        """
+        return f'app:{prefix}:{quiz_id}:{QuizVersion.get(quiz_id)}'
+
+
+class QuizStructure:
+    """
+    Immutable structure of a quiz used to build the test form: a tuple of
+    (question pk, question, ((choice pk, choice), ...)) for each question.
+    """
+
+    @staticmethod
+    def build(quiz_id):
+        """
+        Build the structure of the quiz with a single query.
+
+        :param quiz_id: PK value of the quiz.
+        """
+        rows = Question.objects.filter(quiz_id=quiz_id).order_by('pk', 'question_choice__pk').values_list(
+            'pk', 'question', 'question_choice__pk', 'question_choice__choice')
+
+        questions = dict()
+        for question_id, question, choice_id, choice in rows:
+            _, choices = questions.setdefault(question_id, (question, []))
+            if choice_id is not None:
+                choices.append((choice_id, choice))
+        return tuple((question_id, question, tuple(choices)) for question_id, (question, choices) in questions.items())
+
+    @staticmethod
+    def get(quiz_id):
+        """
+        Get the structure of the quiz from the cache, building it on a miss.
+
+        :param quiz_id: PK value of the quiz.
+        """
+        key = QuizVersion.key('quiz-structure', quiz_id)
+        structure = cache.get(key)
+        if structure is None:
+            structure = QuizStructure.build(quiz_id)
+            cache.set(key, structure, None)
+        return structure
+
+
+class PageCacheMixin:
+    """
+    View mixin caching the rendered page for anonymous visitors, until the
+    version returned by get_page_version is bumped or for at most
+    QUIZ_PAGE_CACHE_TIMEOUT seconds, which bounds the staleness of the counters.
+    Pages with pending messages are neither cached nor served from the cache.
+    Cached pages answer conditional requests against the ETag they were
+    rendered with.
+    """
+
+    def get_page_version(self):
+        """
+        Version of the data shown on the page, see QuizVersion.
+        """
+        raise NotImplementedError
+
+    def get_page_cache_key(self):
+        path = hashlib.md5(self.request.get_full_path().encode()).hexdigest()
+        return f'app:page:{self.request.resolver_match.view_name}:{path}:{self.get_page_version()}'
+
+    @staticmethod
+    def is_page_cacheable(request):
+        return bool(settings.QUIZ_PAGE_CACHE_TIMEOUT) and request.method == 'GET' and not request.user.is_authenticated \
+            and not len(messages.get_messages(request))
+
+    @staticmethod
+    def cached_response(request, response):
+        # The validators the page was rendered with, the view is not run.
+        return get_conditional_response(request, etag=response.get('ETag'), response=response)
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_page_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.get_page_cache_key()
+        response = cache.get(key)
+        if response is not None:
+            return self.cached_response(request, response)
+        response = super().dispatch(request, *args, **kwargs)
+        self.store_page(key, response)
+        return response
+
+    def store_page(self, key, response):
+        """
+        Cache the response once rendered, if it can be served to any anonymous visitor.
+        """
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            if hasattr(response, 'add_post_render_callback'):
+                response.add_post_render_callback(lambda rendered: self.cache_page(key, rendered, settings.QUIZ_PAGE_CACHE_TIMEOUT))
+            else:
+                self.cache_page(key, response, settings.QUIZ_PAGE_CACHE_TIMEOUT)
+
+    @staticmethod
+    def cache_page(key, response, timeout):
+        # A plain copy, template responses carry the attributes set on them by middlewares.
+        cache.set(key, HttpResponse(response.content, status=response.status_code, headers=dict(response.items())), timeout)
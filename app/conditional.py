@@ -0,0 +1,140 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, quote_etag
+
+from app.models import Quiz
+
+
+def make_etag(*values):
+    return hashlib.md5(repr(values).encode()).hexdigest()
+
+
+def first(queryset):
+    """
+    First row of a grouped queryset, without the ordering QuerySet.first adds to the group by.
+    """
+    return next(iter(queryset[:1]), None)
+
+
+async def afirst(queryset):
+    async for row in queryset[:1]:
+        return row
+    return None
+
+
+def has_messages(request):
+    """
+    Pages showing pending messages are rendered, never answered with a 304.
+    """
+    return bool(len(messages.get_messages(request)))
+
+
+async def conditional_response(request, etag, get_response):
+    """
+    The condition decorator for async views, with the ETag already computed.
+
+    :param etag: ETag of the current state, or None.
+    :param get_response: Coroutine function returning the response, only awaited when the client copy is stale.
+    """
+    etag = quote_etag(etag) if etag is not None else None
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = await get_response()
+    if request.method in ('GET', 'HEAD') and etag:
+        response.headers.setdefault('ETag', etag)
+    return response
+
+
+class QuizValidators:
+    """
+    ETags of the quiz pages for the condition decorator, each from a single
+    aggregate query run before the view. The a-prefixed methods compute them
+    with the async ORM, for the async views.
+
+    There is no Last-Modified: the latest modified of the rows goes back when
+    a quiz is unpublished or a question deleted, and misses the counters, so
+    a client revalidating with If-Modified-Since alone would keep a stale page.
+    """
+
+    @staticmethod
+    def detail_queryset(quiz_id):
+        """
+        :return: Rows of the modified of the quiz, the latest modified of its questions,
+                 the number of questions and the test counter, empty if the quiz does not exist.
+        """
+        return Quiz.objects.filter(pk=quiz_id).values('modified', 'test_count').annotate(
+            questions_modified=Max('question__modified'), questions=Count('question'),
+        ).values_list('modified', 'questions_modified', 'questions', 'test_count')
+
+    @staticmethod
+    def detail_validator(request, quiz_id, state):
+        """
+        :return: ETag of the quiz detail page.
+        """
+        if state is None:
+            return None
+        # The page shows the user, and the edit buttons to the author.
+        return make_etag('detail', quiz_id, request.user.pk, *state)
+
+    @staticmethod
+    def detail_etag(request, quiz_id):
+        if has_messages(request):
+            return None
+        return QuizValidators.detail_validator(request, quiz_id, first(QuizValidators.detail_queryset(quiz_id)))
+
+    @staticmethod
+    async def adetail_etag(request, quiz_id):
+        if await sync_to_async(has_messages)(request):
+            return None
+        return QuizValidators.detail_validator(request, quiz_id, await afirst(QuizValidators.detail_queryset(quiz_id)))
+
+    @staticmethod
+    def listing_aggregates():
+        """
+        :return: Aggregates of the latest modified, number, and question and test counters of the published quizzes.
+        """
+        return dict(modified=Max('modified'), quizzes=Count('pk'), questions=Sum('question_count'), tests=Sum('test_count'))
+
+    @staticmethod
+    def listing_validator(request, state):
+        return make_etag('listing', request.path, request.user.pk, *sorted(state.items()))
+
+    @staticmethod
+    def listing_etag(request, *args, **kwargs):
+        if has_messages(request):
+            return None
+        return QuizValidators.listing_validator(
+            request, Quiz.objects.filter(is_published=True).aggregate(**QuizValidators.listing_aggregates()))
+
+    @staticmethod
+    async def alisting_etag(request):
+        if await sync_to_async(has_messages)(request):
+            return None
+        state = await Quiz.objects.filter(is_published=True).aaggregate(**QuizValidators.listing_aggregates())
+        return QuizValidators.listing_validator(request, state)
+
+    @staticmethod
+    def export_queryset(quiz_id):
+        return Quiz.objects.filter(pk=quiz_id).values('modified').annotate(
+            latest=Max('quiz_test_result__pk'), results=Count('quiz_test_result'), total=Sum('quiz_test_result__score'),
+        ).values_list('modified', 'latest', 'results', 'total')
+
+    @staticmethod
+    def export_validators(quiz_id, filetype, state):
+        """
+        ETag of the result export, from the quiz and the latest, number and total score of its results.
+        """
+        if state is None:
+            return None
+        return make_etag('export', quiz_id, filetype, *state)
+
+    @staticmethod
+    def export_etag(request, quiz_id, filetype):
+        return QuizValidators.export_validators(quiz_id, filetype, first(QuizValidators.export_queryset(quiz_id)))
+
+    @staticmethod
+    async def aexport_etag(request, quiz_id, filetype):
+        return QuizValidators.export_validators(quiz_id, filetype, await afirst(QuizValidators.export_queryset(quiz_id)))
@@ -1,37 +1,188 @@
-from io import BytesIO
+import csv
+from itertools import islice
 
-from django.http import HttpResponse
-from xhtml2pdf import pisa
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.loader import get_template
+from django.utils import dateformat
+from django.utils.text import capfirst
+from django.utils.timezone import localtime
+from app.models import Quiz, QuizTestResult
+from app.ooxml import docx_chunks, xlsx_chunks
+from app.pdf import PdfRenderError, render_pdf_parallel
+
+
+class Echo:
+    """
+    File-like object that returns what is written instead of buffering it.
+    """
+    def write(self, value):
+        return value
 
 
 class Export:
     @staticmethod
-    def export_csv(template, context, filename):
-        response = HttpResponse(content_type='text/csv')
+    def stream_csv(header, rows, filename):
+        """
+        Stream the rows as csv without holding the whole file in memory.
+
+        :param header: Column names of the csv.
+        :param rows: Iterable of rows, consumed lazily while the response is sent.
+        :param filename: Name of the attachment.
+        :return: Streaming response with csv attachment.
+        """
+        writer = csv.writer(Echo())
+        lines = (writer.writerow(row) for row in Export.prepend(header, rows))
+        response = StreamingHttpResponse(lines, content_type='text/csv')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        response.write(template.render(context))
         return response
 
     @staticmethod
-    def export_xlsx(template, context, filename):
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    def prepend(first, rows):
+        yield first
+        yield from rows
+
+    @staticmethod
+    def export_xlsx(header, rows, filename):
+        """
+        Stream the rows as a xlsx workbook.
+
+        :param header: Column names of the sheet.
+        :param rows: Iterable of rows, consumed lazily while the response is sent.
+        :param filename: Name of the attachment.
+        :return: Streaming response with xlsx attachment.
+        """
+        response = StreamingHttpResponse(xlsx_chunks(header, rows, sheet_name='Results'), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        response.write(template.render(context))
         return response
 
     @staticmethod
-    def export_pdf(template, context, filename):
-        html = template.render(context)
-        response = BytesIO()
-        pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), response)
-        if not pdf.err:
-            return HttpResponse(response.getvalue(), content_type='application/pdf')
-        else:
+    def export_pdf(template, context, rows, filename, chunk_rows=None, workers=1):
+        """
+        Render the rows to pdf in chunks, rendered in parallel and merged.
+
+        :param template: Template rendering one chunk, given the context plus rows and first_chunk.
+        :param context: Context of the template.
+        :param rows: Iterable of rows.
+        :param filename: Name of the attachment.
+        :param chunk_rows: Rows per chunk, defaults to settings.QUIZ_PDF_CHUNK_ROWS.
+        :param workers: Rendering processes, None for the number of CPUs. With 1 the chunks are rendered in the calling process.
+        :return: Response with pdf.
+        """
+        if chunk_rows is None:
+            chunk_rows = settings.QUIZ_PDF_CHUNK_ROWS
+
+        html_chunks = [template.render({**context, 'rows': chunk, 'first_chunk': index == 0})
+                       for index, chunk in enumerate(Export.chunks(rows, chunk_rows))]
+        try:
+            pdf = render_pdf_parallel(html_chunks, workers)
+        except PdfRenderError:
             return HttpResponse("Error Rendering PDF", status=400)
+        return HttpResponse(pdf, content_type='application/pdf')
+
+    @staticmethod
+    def chunks(rows, size):
+        """
+        Split the rows in lists of size rows, always yielding at least one list.
+        """
+        rows = iter(rows)
+        chunk = list(islice(rows, size))
+        yield chunk
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
 
     @staticmethod
-    def export_docx(template, context, filename):
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+    def export_docx(title, header, rows, filename, intro=''):
+        """
+        Stream the rows as a table of a docx document.
+
+        :param title: Title of the document.
+        :param header: Column names of the table.
+        :param rows: Iterable of rows, consumed lazily while the response is sent.
+        :param filename: Name of the attachment.
+        :param intro: Paragraph written between the title and the table.
+        :return: Streaming response with docx attachment.
+        """
+        response = StreamingHttpResponse(docx_chunks(title, header, rows, intro), content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        response.write(template.render(context))
         return response
+
+
+class QuizResultListExport:
+    FILETYPES = ('csv', 'xlsx', 'pdf', 'docx')
+
+    def __init__(self, quiz_id, *args, until_result_id=None, pdf_workers=1, **kwargs):
+        """
+        :param quiz_id: The primary key of the quiz.
+        :param until_result_id: Only export results up to this primary key, all results if None.
+        :param pdf_workers: Processes rendering the pdf, see Export.export_pdf. Requests render it
+                            themselves, only the export worker renders in a pool of processes.
+        """
+        self.quiz = get_object_or_404(Quiz, pk=quiz_id)
+        self.pdf_workers = pdf_workers
+        self.results = QuizTestResult.objects.filter(quiz=self.quiz)
+        if until_result_id is not None:
+            self.results = self.results.filter(pk__lte=until_result_id)
+
+    def export(self, filetype):
+        """
+        Export quiz result in the given file type.
+
+        :param filetype: One of FILETYPES.
+        :return: Response with attachment.
+        """
+        if filetype not in self.FILETYPES:
+            raise Http404(f'Unknown export file type {filetype}.')
+        return getattr(self, f'export_{filetype}')()
+
+    def get_rows(self):
+        """
+        Rows of username, email, score and date of the results, fetched in chunks.
+        """
+        results = self.results.order_by('pk').values_list('user__username', 'user__email', 'score', 'created')
+        for username, email, score, created in results.iterator(chunk_size=settings.QUIZ_EXPORT_CHUNK_SIZE):
+            yield username or '', email or '', score, dateformat.format(localtime(created), 'd M, Y')
+
+    def export_csv(self):
+        """
+        Export csv for quiz result.
+
+        :return: Streaming response with csv attachment.
+        """
+        filename = f'{self.quiz.title}-result.csv'
+        return Export.stream_csv(('Username', 'Email', 'Score', 'Date'), self.get_rows(), filename)
+
+    def export_xlsx(self):
+        """
+        Export xlsx for quiz result.
+
+        :return: Streaming response with xlsx attachment.
+        """
+        filename = f'{self.quiz.title}-result.xlsx'
+        return Export.export_xlsx(('Username', 'Email', 'Score', 'Date'), self.get_rows(), filename)
+
+    def export_pdf(self):
+        """
+        Export pdf for quiz result.
+
+        :return: Response with pdf.
+        """
+        template = get_template('app/quiz/quiz_result_pdf_template.html')
+        rows = ((number, username, score, date) for number, (username, email, score, date) in enumerate(self.get_rows(), start=1))
+        filename = f'{self.quiz.title}-result.pdf'
+        return Export.export_pdf(template, {'quiz': self.quiz}, rows, filename, workers=self.pdf_workers)
+
+    def export_docx(self):
+        """
+        Export docx for quiz result.
+
+        :return: Streaming response with docx attachment.
+        """
+        rows = ((number, username, score, date) for number, (username, email, score, date) in enumerate(self.get_rows(), start=1))
+        filename = f'{self.quiz.title}-result.docx'
+        return Export.export_docx(capfirst(self.quiz.title), ('#', 'User', 'Score', 'Date'), rows, filename,
+                                  intro='Here are the results of other users who have attended your quiz test.')
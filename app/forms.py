@@ -1,9 +1,15 @@
 import random
 
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.utils import timezone
 
+from app.answers import AnswerPacking
+from app.cache import QuizStructure
+from app.grading import AnswerKey
+from app.leaderboard import Leaderboard
 from app.models import Question, QuestionChoice, Quiz, QuizTestResult, QuizTestResultAnswer
 
 
@@ -38,8 +44,9 @@ class QuestionForm(forms.Form):
 
         self.fields['quiz'].initial = quiz_id
         if question_id is not None:
-            question = Question.objects.get(pk=question_id)
-            choices = question.question_choices.all()
+            # Kept to compare the cleaned data with, only the changed rows are saved.
+            self.question = question = Question.objects.get(pk=question_id)
+            self.choices = choices = list(question.question_choices.order_by('pk'))
 
             self.fields['question'].initial = question.question
 
@@ -62,24 +69,48 @@ class QuestionForm(forms.Form):
             raise ValidationError('Please select a correct choice.')
         return self.cleaned_data
 
-    @transaction.atomic
     def save(self, quiz_id, question_id=None, **kwargs):
-        data = self.cleaned_data
-        question, created = Question.objects.update_or_create(pk=question_id, defaults={'quiz_id': data['quiz'], 'question': data['question']})
+        if question_id:
+            return self.update(self.question, self.choices)
+        return self.create()
 
-        if not question_id:
-            QuestionChoice.objects.create(question=question, choice=data['choice1'], is_correct=data['is_correct1'])
-            QuestionChoice.objects.create(question=question, choice=data['choice2'], is_correct=data['is_correct2'])
-            QuestionChoice.objects.create(question=question, choice=data['choice3'], is_correct=data['is_correct3'])
-            QuestionChoice.objects.create(question=question, choice=data['choice4'], is_correct=data['is_correct4'])
+    @transaction.atomic
+    def create(self):
+        data = self.cleaned_data
+        question = Question.objects.create(quiz_id=data['quiz'], question=data['question'])
+        QuestionChoice.objects.create(question=question, choice=data['choice1'], is_correct=data['is_correct1'])
+        QuestionChoice.objects.create(question=question, choice=data['choice2'], is_correct=data['is_correct2'])
+        QuestionChoice.objects.create(question=question, choice=data['choice3'], is_correct=data['is_correct3'])
+        QuestionChoice.objects.create(question=question, choice=data['choice4'], is_correct=data['is_correct4'])
+        return question
 
-        if question_id:
-            choices = question.question_choices.all()
-            QuestionChoice.objects.update_or_create(pk=choices[0].id, defaults={'choice': data['choice1'], 'is_correct': data['is_correct1']})
-            QuestionChoice.objects.update_or_create(pk=choices[1].id, defaults={'choice': data['choice2'], 'is_correct': data['is_correct2']})
-            QuestionChoice.objects.update_or_create(pk=choices[2].id, defaults={'choice': data['choice3'], 'is_correct': data['is_correct3']})
-            QuestionChoice.objects.update_or_create(pk=choices[3].id, defaults={'choice': data['choice4'], 'is_correct': data['is_correct4']})
+    def update(self, question, choices):
+        """
+        Save the changes of the cleaned data to the question and choices loaded with the form.
+        Nothing is written, not even a transaction opened, when nothing changed.
 
+        :return: Question instance.
+        """
+        data = self.cleaned_data
+        question.quiz_id = data['quiz']
+        question.question = data['question']
+        for number, choice in enumerate(choices, 1):
+            choice.choice = data[f'choice{number}']
+            choice.is_correct = data[f'is_correct{number}']
+        changed_choices = [choice for choice in choices if choice.get_dirty_fields()]
+        if not changed_choices and not question.get_dirty_fields():
+            return question
+
+        with transaction.atomic():
+            for choice in changed_choices:
+                # The quiz of the question is known, not read again by the signal handlers.
+                choice.question = question
+                choice.save()
+            if question.get_dirty_fields():
+                question.save()
+            else:
+                # The ETag of the quiz detail page follows the modified of the questions.
+                Question.objects.filter(pk=question.pk).update(modified=timezone.now())
         return question
 
 
@@ -88,47 +119,60 @@ class AnonymousUserForm(forms.Form):
     email = forms.EmailField(required=True)
 
 
-class QuestionChoiceModelChoiceField(forms.ModelMultipleChoiceField):
-    def label_from_instance(self, obj):
-        return obj.choice
+class QuestionChoiceField(forms.TypedMultipleChoiceField):
+    """
+    Multiple choice field validated against the in-memory choices of a question,
+    cleaning to the list of selected choice pks.
+    """
+    def __init__(self, choices, **kwargs):
+        super().__init__(choices=choices, coerce=int, widget=forms.CheckboxSelectMultiple(), **kwargs)
 
 
 class QuizTestForm(forms.Form):
     def __init__(self, quiz_id, **kwargs):
         super().__init__(**kwargs)
 
-        quiz = Quiz.objects.get(pk=quiz_id)
-        questions = list(quiz.questions.all())
+        questions = list(QuizStructure.get(quiz_id))
         random.shuffle(questions)
-        for question in questions:
-            self.fields[str(question.pk)] = QuestionChoiceModelChoiceField(queryset=question.question_choices.all(), widget=forms.CheckboxSelectMultiple())
-            self.fields[str(question.pk)].label = question.question
+        for question_id, question, choices in questions:
+            self.fields[str(question_id)] = QuestionChoiceField(choices=choices, label=question)
 
     def check_correct_answers(self, quiz_id, **kwargs):
         data = self.cleaned_data
-        quiz = Quiz.objects.get(pk=quiz_id)
-        questions = quiz.questions.all()
+        answer_key = AnswerKey.get(quiz_id)
 
         score = 0
         answers = dict()
-        for question in questions:
-            selected_choice = data.get(str(question.pk))
-            correct_choices = QuestionChoice.get_correct_choices(question.pk)
-            a = (set(selected_choice)).difference(set(correct_choices))
-            if not a or not correct_choices:
+        for question_id, correct_choices in answer_key.items():
+            selected_choice = data.get(str(question_id)) or []
+            if AnswerKey.is_correct(correct_choices, selected_choice):
                 score += 1
-            answers[question] = {'correct': correct_choices, 'selected': selected_choice}
+            answers[question_id] = {'correct': correct_choices, 'selected': selected_choice}
         return answers, score
 
     @transaction.atomic
-    def save_answers(self,result,answers):
-        for question, answer in answers.items():
-            for ans in answer['selected']:
-                QuizTestResultAnswer.objects.create(quiz_test=result,question=question,choice=ans)
+    def save_answers(self,result,answers,batch_size=None):
+        """
+        Persist the selected choices of the submission with batched inserts.
+
+        :param result: QuizTestResult instance the answers belong to.
+        :param answers: Answers returned by check_correct_answers.
+        :param batch_size: Rows per INSERT, defaults to settings.QUIZ_ANSWER_BATCH_SIZE.
+        """
+        if batch_size is None:
+            batch_size = settings.QUIZ_ANSWER_BATCH_SIZE
+        rows = [QuizTestResultAnswer(quiz_test=result, question_id=question_id, choice_id=ans)
+                for question_id, answer in answers.items() for ans in answer['selected']]
+        QuizTestResultAnswer.objects.bulk_create(rows, batch_size=batch_size)
 
     @transaction.atomic
     def save(self,quiz_id,user,**kwargs):
         answers, score = self.check_correct_answers(quiz_id)
-        q = QuizTestResult.objects.create(user=user,quiz_id=quiz_id,score=score)
-        self.save_answers(q,answers)
+        if settings.QUIZ_ANSWER_STORAGE == 'packed':
+            layout_id, packed = AnswerPacking.pack_answers(quiz_id, answers)
+            q = QuizTestResult.objects.create(user=user,quiz_id=quiz_id,score=score,answer_layout_id=layout_id,packed_answers=packed)
+        else:
+            q = QuizTestResult.objects.create(user=user,quiz_id=quiz_id,score=score)
+            self.save_answers(q,answers)
+        transaction.on_commit(lambda: Leaderboard.record(q))
         return q
\ No newline at end of file
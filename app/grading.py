@@ -0,0 +1,119 @@
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from app.answers import AnswerPacking
+from app.cache import QuizStructure, QuizVersion
+from app.models import Question, QuizTestResult, QuizTestResultAnswer
+
+
+class AnswerKey:
+    """
+    Compiled answer key of a quiz, mapping question pk to a frozenset of the
+    pks of its correct choices.
+    """
+
+    @staticmethod
+    def build(quiz_id):
+        """
+        Build the answer key of the quiz with a single query.
+
+        :param quiz_id: PK value of the quiz.
+        :return: Dict of question pk to frozenset of correct choice pks.
+        """
+        rows = Question.objects.filter(quiz_id=quiz_id).values_list('pk', 'question_choice__pk', 'question_choice__is_correct')
+
+        correct = dict()
+        for question_id, choice_id, is_correct in rows:
+            choices = correct.setdefault(question_id, set())
+            if is_correct:
+                choices.add(choice_id)
+        return {question_id: frozenset(choices) for question_id, choices in correct.items()}
+
+    @staticmethod
+    def get(quiz_id):
+        """
+        Get the answer key of the quiz from the cache, building it on a miss.
+
+        :param quiz_id: PK value of the quiz.
+        :return: Dict of question pk to frozenset of correct choice pks.
+        """
+        key = QuizVersion.key('answer-key', quiz_id)
+        answer_key = cache.get(key)
+        if answer_key is None:
+            answer_key = AnswerKey.build(quiz_id)
+            cache.set(key, answer_key, None)
+        return answer_key
+
+    @staticmethod
+    def is_correct(correct_choices, selected_choices):
+        """
+        A question is answered correctly when no wrong choice is selected, or
+        when the question has no correct choice at all.
+
+        :param correct_choices: Set of correct choice pks.
+        :param selected_choices: Set of selected choice pks.
+        """
+        return not correct_choices or not (set(selected_choices) - correct_choices)
+
+    @staticmethod
+    def grade(answer_key, selections):
+        """
+        Grade the selections against the answer key without touching the database.
+
+        :param answer_key: Dict of question pk to frozenset of correct choice pks.
+        :param selections: Dict of question pk to iterable of selected choice pks.
+        :return: Score of the selections.
+        """
+        score = 0
+        for question_id, correct_choices in answer_key.items():
+            if AnswerKey.is_correct(correct_choices, selections.get(question_id, ())):
+                score += 1
+        return score
+
+    @staticmethod
+    def reevaluate(quiz_id, result_ids=None):
+        """
+        Re-score test results of the quiz with a single aggregate query over
+        their answers, counting the questions with a wrongly selected choice.
+
+        :param quiz_id: PK value of the quiz.
+        :param result_ids: PK values of the results to re-score, all results of the quiz if None.
+        :return: Dict of result pk to score. Results without answers are left out.
+        """
+        answer_key = AnswerKey.get(quiz_id)
+        graded = [question_id for question_id, correct_choices in answer_key.items() if correct_choices]
+
+        answers = QuizTestResultAnswer.objects.filter(quiz_test__quiz_id=quiz_id)
+        if result_ids is not None:
+            answers = answers.filter(quiz_test_id__in=result_ids)
+        wrong = answers.values('quiz_test_id').annotate(
+            wrong=Count('question_id', distinct=True, filter=Q(choice__is_correct=False, question_id__in=graded))
+        ).values_list('quiz_test_id', 'wrong')
+
+        scores = {result_id: len(answer_key) - wrong_count for result_id, wrong_count in wrong}
+        scores.update(AnswerKey.reevaluate_packed(quiz_id, answer_key, result_ids))
+        return scores
+
+    @staticmethod
+    def reevaluate_packed(quiz_id, answer_key, result_ids=None):
+        """
+        Re-score the results of the quiz with packed answers.
+
+        :return: Dict of result pk to score. Results without selected choices are left out.
+        """
+        # Like the cascade deleting the answer rows, deleted choices no longer count as selected.
+        choice_ids = {choice_id for question_id, question, choices in QuizStructure.get(quiz_id) for choice_id, choice in choices}
+
+        results = QuizTestResult.objects.filter(quiz_id=quiz_id, packed_answers__isnull=False)
+        if result_ids is not None:
+            results = results.filter(pk__in=result_ids)
+
+        scores = dict()
+        for result_id, layout_id, packed in results.values_list('pk', 'answer_layout_id', 'packed_answers'):
+            selections = dict()
+            for question_id, choice_id in AnswerPacking.unpack(AnswerPacking.layout_pairs(layout_id), packed):
+                if choice_id in choice_ids:
+                    selections.setdefault(question_id, set()).add(choice_id)
+            if selections:
+                scores[result_id] = AnswerKey.grade(answer_key, selections)
+        return scores
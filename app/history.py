@@ -0,0 +1,53 @@
+from django.conf import settings
+from simple_history.models import HistoricalRecords
+
+
+class QuizHistoricalRecords(HistoricalRecords):
+    """
+    HistoricalRecords that, with QUIZ_HISTORY_SKIP_UNCHANGED, writes no
+    revision for a save leaving the tracked fields as the latest revision
+    has them. Changes to the ignored fields alone, refreshed on every save,
+    do not count.
+    """
+
+    def __init__(self, *args, ignored_fields=('modified',), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ignored_fields = tuple(ignored_fields)
+
+    def create_history_model(self, model, inherited):
+        history_model = super().create_history_model(model, inherited)
+        # Read by the prune_history command to find the no-op revisions.
+        history_model.ignored_fields = self.ignored_fields
+        return history_model
+
+    def post_save(self, instance, created, using=None, **kwargs):
+        if not created and not kwargs.get('raw', False) and settings.QUIZ_HISTORY_SKIP_UNCHANGED:
+            if not self.has_changed(instance, using):
+                return
+        super().post_save(instance, created, using=using, **kwargs)
+
+    def has_changed(self, instance, using=None):
+        """
+        Whether the tracked fields of the instance differ from its latest revision. The changes are
+        known from the fields saved by a DirtyFieldsMixin instance, or else read with a single query.
+
+        :param instance: Saved instance of the model.
+        :return: True if a field changed or the instance has no revision yet.
+        """
+        manager = getattr(instance, self.manager_name)
+        attnames = compared_fields(manager.model)
+        changed = getattr(instance, '_changed_fields', None)
+        if changed is not None:
+            return any(instance._meta.get_field(name).attname in attnames for name in changed)
+        latest = manager.using(using if self.use_base_model_db else None).order_by('-history_date', '-history_id')
+        latest = latest.values_list(*attnames).first()
+        return latest is None or latest != tuple(getattr(instance, attname) for attname in attnames)
+
+
+def compared_fields(history_model):
+    """
+    :param history_model: Historical model of a model tracked by QuizHistoricalRecords.
+    :return: List of the attnames of the tracked fields that tell revisions apart.
+    """
+    ignored = getattr(history_model, 'ignored_fields', ())
+    return [field.attname for field in history_model.tracked_fields if field.name not in ignored]
@@ -0,0 +1,140 @@
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from app.export import QuizResultListExport
+from app.models import ExportJob
+
+
+class ExportQueue:
+    """
+    Background quiz result exports. Generated files are cached on disk, keyed
+    by the quiz, the latest result they include, the number and total score of
+    the results and the file type, so unchanged results are never exported
+    twice and deleted results or re-evaluated scores are exported again. Jobs left running by a worker that
+    died are claimed again after QUIZ_EXPORT_LEASE_TIMEOUT seconds.
+    """
+
+    @staticmethod
+    def artifact_path(quiz_id, latest_result_id, result_count, score_total, filetype):
+        return os.path.join(settings.QUIZ_EXPORT_ROOT, str(quiz_id), f'{latest_result_id}-{result_count}-{score_total}.{filetype}')
+
+    @staticmethod
+    def results_state(quiz):
+        """
+        :return: Tuple of the latest result id, the number and the total score of the results of the quiz.
+        """
+        state = quiz.quiz_test_results.aggregate(latest=Max('pk'), results=Count('pk'), total=Sum('score'))
+        return state['latest'] or 0, state['results'], state['total'] or 0
+
+    @staticmethod
+    def cached_artifact(quiz, filetype):
+        """
+        Path of the cached export of the current results of the quiz, None if not generated yet.
+        """
+        path = ExportQueue.artifact_path(quiz.pk, *ExportQueue.results_state(quiz), filetype)
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def enqueue(quiz, filetype, user=None):
+        """
+        Get the export job of the current results of the quiz, queueing a new
+        one unless it is already queued, running or generated.
+
+        :param quiz: Quiz instance to export the results of.
+        :param filetype: One of QuizResultListExport.FILETYPES.
+        :param user: User requesting the export.
+        :return: ExportJob instance.
+        """
+        latest_result_id, result_count, score_total = ExportQueue.results_state(quiz)
+        path = ExportQueue.artifact_path(quiz.pk, latest_result_id, result_count, score_total, filetype)
+
+        job = ExportJob.objects.filter(quiz=quiz, filetype=filetype, latest_result_id=latest_result_id, result_count=result_count,
+                                       score_total=score_total, status__in=[ExportJob.PENDING, ExportJob.RUNNING, ExportJob.DONE]).order_by('-pk').first()
+        if job is not None and (job.status != ExportJob.DONE or os.path.exists(job.artifact)):
+            return job
+
+        if os.path.exists(path):
+            return ExportJob.objects.create(quiz=quiz, user=user, filetype=filetype, latest_result_id=latest_result_id,
+                                            result_count=result_count, score_total=score_total, status=ExportJob.DONE, artifact=path)
+        return ExportJob.objects.create(quiz=quiz, user=user, filetype=filetype, latest_result_id=latest_result_id,
+                                        result_count=result_count, score_total=score_total)
+
+    @staticmethod
+    def claimable():
+        """
+        Condition of the jobs a worker may claim: the pending jobs and the jobs whose lease expired.
+        """
+        expired = timezone.now() - timedelta(seconds=settings.QUIZ_EXPORT_LEASE_TIMEOUT)
+        return Q(status=ExportJob.PENDING) | Q(status=ExportJob.RUNNING, modified__lt=expired)
+
+    @staticmethod
+    def claim(limit):
+        """
+        Mark up to limit pending jobs, or running jobs whose lease expired, as running,
+        skipping the ones claimed by another worker. The modified of a running job is the start of its lease.
+
+        :return: List of claimed ExportJob pks.
+        """
+        claimed = []
+        for pk in ExportJob.objects.filter(ExportQueue.claimable()).order_by('pk').values_list('pk', flat=True)[:limit]:
+            if ExportJob.objects.filter(ExportQueue.claimable(), pk=pk).update(status=ExportJob.RUNNING, modified=timezone.now()):
+                claimed.append(pk)
+        return claimed
+
+    @staticmethod
+    def run(job_id):
+        """
+        Generate the file of a claimed job, reusing the cached artifact when it exists.
+        """
+        job = ExportJob.objects.get(pk=job_id)
+        path = ExportQueue.artifact_path(job.quiz_id, job.latest_result_id, job.result_count, job.score_total, job.filetype)
+        try:
+            if not os.path.exists(path):
+                ExportQueue.write(job, path)
+        except Exception as e:
+            job.status = ExportJob.FAILED
+            job.error = str(e)
+        else:
+            job.status = ExportJob.DONE
+            job.artifact = path
+        job.save(update_fields=['status', 'error', 'artifact', 'modified'])
+        return job
+
+    @staticmethod
+    def write(job, path):
+        response = QuizResultListExport(job.quiz_id, until_result_id=job.latest_result_id,
+                                        pdf_workers=settings.QUIZ_PDF_WORKERS).export(job.filetype)
+        if response.status_code != 200:
+            raise ValueError(f'Export failed with status {response.status_code}.')
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write next to the artifact and rename, so readers never see a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in (response.streaming_content if response.streaming else [response.content]):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        ExportQueue.prune(directory, path, job.filetype)
+
+    @staticmethod
+    def prune(directory, keep, filetype):
+        """
+        Remove the artifacts of the quiz made stale by a newer export of the same file type.
+        """
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(f'.{filetype}') and path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
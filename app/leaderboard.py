@@ -0,0 +1,106 @@
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+
+from app.cache import QuizVersion
+from app.models import QuizTestResult
+
+
+class Leaderboard:
+    """
+    Top results of a quiz, best score first and earliest attempt first on ties.
+    Kept in the cache as a min-heap of at most QUIZ_LEADERBOARD_SIZE entries
+    whose root is the weakest one, built from the app_result_quiz_score_idx
+    index on a miss. Saved results that do not make the leaderboard leave it
+    cached, those that do drop it to be rebuilt from the database.
+
+    An entry is a tuple of (score, -created timestamp, -result pk, username),
+    so that a larger tuple is a better result.
+    """
+
+    @staticmethod
+    def cache_key(quiz_id):
+        return QuizVersion.key('leaderboard', quiz_id)
+
+    @staticmethod
+    def entry(score, created, result_id, username):
+        return score, -created.timestamp(), -result_id, username or 'Anonymous'
+
+    @staticmethod
+    def rebuild(quiz_id):
+        """
+        Build the heap of the quiz with a single query.
+
+        :param quiz_id: PK value of the quiz.
+        :return: List of the entries, heap ordered.
+        """
+        rows = QuizTestResult.objects.filter(quiz_id=quiz_id).order_by('-score', 'created', 'pk').values_list(
+            'score', 'created', 'pk', 'user__username')[:settings.QUIZ_LEADERBOARD_SIZE]
+        heap = [Leaderboard.entry(*row) for row in rows]
+        heapq.heapify(heap)
+        cache.set(Leaderboard.cache_key(quiz_id), heap, settings.QUIZ_LEADERBOARD_TIMEOUT)
+        return heap
+
+    @staticmethod
+    def get(quiz_id):
+        heap = cache.get(Leaderboard.cache_key(quiz_id))
+        if heap is None:
+            heap = Leaderboard.rebuild(quiz_id)
+        return heap
+
+    @staticmethod
+    def record(result):
+        """
+        Drop the leaderboard of the quiz if the new result enters it. Pushing it
+        onto the cached heap would be a read and a write of the shared cache,
+        losing the entries of concurrent submissions.
+
+        :param result: Saved QuizTestResult instance.
+        """
+        key = Leaderboard.cache_key(result.quiz_id)
+        heap = cache.get(key)
+        if heap is None:
+            return
+        entry = Leaderboard.entry(result.score, result.created, result.pk, result.user.username if result.user_id else None)
+        if len(heap) < settings.QUIZ_LEADERBOARD_SIZE or entry > heap[0]:
+            cache.delete(key)
+
+    @staticmethod
+    def discard(result):
+        """
+        Drop the leaderboard of the quiz of a deleted result if it is listed, to be rebuilt on next use.
+
+        :param result: Deleted QuizTestResult instance.
+        """
+        key = Leaderboard.cache_key(result.quiz_id)
+        heap = cache.get(key)
+        if heap is not None and any(-entry[2] == result.pk for entry in heap):
+            cache.delete(key)
+
+    @staticmethod
+    def top(quiz_id):
+        """
+        :param quiz_id: PK value of the quiz.
+        :return: List of dicts of rank, score, created timestamp, result pk and username, best first.
+        """
+        entries = sorted(Leaderboard.get(quiz_id), reverse=True)
+        return [{'rank': rank, 'score': score, 'created': -created, 'result': -result_id, 'username': username}
+                for rank, (score, created, result_id, username) in enumerate(entries, 1)]
+
+    @staticmethod
+    def rank(result):
+        """
+        Rank of the result among all the results of its quiz, counted on the
+        app_result_quiz_score_idx index.
+
+        :param result: QuizTestResult instance.
+        """
+        # One range per branch, each a seek on the index instead of an OR over the rows of the quiz.
+        results = QuizTestResult.objects.filter(quiz_id=result.quiz_id)
+        better = results.filter(score__gt=result.score).values('pk').union(
+            results.filter(score=result.score, created__lt=result.created).values('pk'),
+            results.filter(score=result.score, created=result.created, pk__lt=result.pk).values('pk'),
+            all=True,
+        )
+        return better.count() + 1
@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import QueuedMail
+
+
+class MailQueue:
+    """
+    Outbox of the e-mails sent by the app. Requests only write the mails to the
+    queue, the send_queued_mail worker delivers them in batches over a single
+    connection, each mail on its own and retried with exponential backoff when
+    it fails. Mails left sending by a worker that died are claimed again once
+    their lease of QUIZ_MAIL_LEASE_TIMEOUT seconds expires.
+    """
+
+    @staticmethod
+    def enqueue(subject, message, from_email, recipient_list):
+        """
+        Queue a mail per recipient. Call inside the transaction writing the data
+        the mail is about, so the mail is only queued if the data is committed.
+
+        :return: List of the QueuedMail instances.
+        """
+        return QueuedMail.objects.bulk_create([QueuedMail(subject=subject, message=message, from_email=from_email, recipient=recipient)
+                                               for recipient in recipient_list])
+
+    @staticmethod
+    def claim(limit):
+        """
+        Mark up to limit mails due for delivery as sending, skipping the rows locked by another worker.
+        The next_attempt of a sending mail is the end of its lease.
+
+        :return: List of the claimed QueuedMail instances.
+        """
+        with transaction.atomic():
+            mails = list(QueuedMail.objects.select_for_update(skip_locked=True)
+                         .filter(status__in=[QueuedMail.PENDING, QueuedMail.SENDING], next_attempt__lte=timezone.now())
+                         .order_by('pk')[:limit])
+            QueuedMail.objects.filter(pk__in=[mail.pk for mail in mails]).update(
+                status=QueuedMail.SENDING, next_attempt=timezone.now() + timedelta(seconds=settings.QUIZ_MAIL_LEASE_TIMEOUT))
+        return mails
+
+    @staticmethod
+    def deliver(mails):
+        """
+        Send the claimed mails with one connection, recording the outcome of each
+        mail as soon as it is known. A failed mail is retried after
+        QUIZ_MAIL_RETRY_DELAY seconds, doubled at every attempt, until
+        QUIZ_MAIL_MAX_ATTEMPTS.
+
+        :return: Number of mails sent.
+        """
+        if not mails:
+            return 0
+        sent = 0
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as e:
+            for mail in mails:
+                MailQueue.fail(mail, e)
+            return 0
+        try:
+            for mail in mails:
+                try:
+                    connection.send_messages([EmailMessage(mail.subject, mail.message, mail.from_email, [mail.recipient])])
+                except Exception as e:
+                    MailQueue.fail(mail, e)
+                    continue
+                mail.status, mail.sent, mail.error = QueuedMail.SENT, timezone.now(), ''
+                mail.save(update_fields=['status', 'sent', 'error'])
+                sent += 1
+        finally:
+            connection.close()
+        return sent
+
+    @staticmethod
+    def fail(mail, error):
+        """
+        Record a failed attempt to send the mail and schedule the next one.
+        """
+        mail.attempts += 1
+        mail.error = str(error)
+        if mail.attempts >= settings.QUIZ_MAIL_MAX_ATTEMPTS:
+            mail.status = QueuedMail.FAILED
+        else:
+            mail.status = QueuedMail.PENDING
+            mail.next_attempt = timezone.now() + timedelta(seconds=settings.QUIZ_MAIL_RETRY_DELAY * 2 ** (mail.attempts - 1))
+        mail.save(update_fields=['attempts', 'error', 'status', 'next_attempt'])
@@ -0,0 +1,78 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from app.answers import AnswerPacking
+from app.forms import QuizTestForm
+from app.models import Question, QuestionChoice, Quiz, QuizTestResult
+
+STORAGE_TABLES = ('app_quiztestresult', 'app_quiztestresultanswer', 'app_answerlayout')
+
+
+class Command(BaseCommand):
+    help = 'Compare write time and table size of the row and packed answer storages. Nothing is persisted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=20, help='Number of questions in the synthetic quiz.')
+        parser.add_argument('--submissions', type=int, default=2000, help='Number of submissions saved per storage.')
+
+    def handle(self, *args, **options):
+        for storage in ('rows', 'packed'):
+            with transaction.atomic():
+                quiz_id, submissions = self.seed(options['questions'], options['submissions'])
+                size_before = self.storage_size()
+                elapsed = self.measure(storage, quiz_id, submissions)
+                size = self.storage_size() - size_before if size_before is not None else None
+                transaction.set_rollback(True)
+
+            line = f'{storage:<6}: {len(submissions) / elapsed:9.1f} submissions/s'
+            if size is not None:
+                line += f', {size / 1024:9.1f} KiB, {size / len(submissions):7.1f} bytes/submission'
+            self.stdout.write(line)
+
+    @staticmethod
+    def seed(question_count, submission_count):
+        user = User.objects.create(username='benchmark-answer-storage')
+        quiz = Quiz.objects.create(title='Benchmark', author=user)
+        Question.objects.bulk_create([Question(quiz=quiz, question=f'Question {i}') for i in range(question_count)])
+        QuestionChoice.objects.bulk_create([QuestionChoice(question=question, choice=f'Choice {i}', is_correct=i == 0)
+                                            for question in quiz.questions.all() for i in range(4)])
+        choices = dict()
+        for question_id, choice_id in QuestionChoice.objects.filter(question__quiz=quiz).values_list('question_id', 'pk'):
+            choices.setdefault(question_id, []).append(choice_id)
+
+        submissions = [{question_id: {'correct': frozenset(), 'selected': random.sample(question_choices, random.randint(1, 2))}
+                        for question_id, question_choices in choices.items()} for _ in range(submission_count)]
+        return quiz.pk, submissions
+
+    @staticmethod
+    def measure(storage, quiz_id, submissions):
+        form = QuizTestForm.__new__(QuizTestForm)
+        start = time.perf_counter()
+        for answers in submissions:
+            with transaction.atomic():
+                if storage == 'packed':
+                    layout_id, packed = AnswerPacking.pack_answers(quiz_id, answers)
+                    QuizTestResult.objects.create(quiz_id=quiz_id, answer_layout_id=layout_id, packed_answers=packed)
+                else:
+                    form.save_answers(QuizTestResult.objects.create(quiz_id=quiz_id), answers)
+        return time.perf_counter() - start
+
+    @staticmethod
+    def storage_size():
+        """
+        Bytes used by the answer storage tables and their indexes, None if the database can not tell.
+        """
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('SELECT name FROM sqlite_master WHERE tbl_name IN (%s, %s, %s)' % (('%s',) * 3), STORAGE_TABLES)
+                names = [name for name, in cursor.fetchall()]
+                cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name IN (%s)' % ', '.join(['%s'] * len(names)), names)
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT SUM(pg_total_relation_size(name)) FROM unnest(%s) AS name', [list(STORAGE_TABLES)])
+            else:
+                return None
+            return cursor.fetchone()[0] or 0
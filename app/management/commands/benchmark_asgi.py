@@ -0,0 +1,188 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from app.models import Question, QuestionChoice, QueuedMail, Quiz
+from app.profiling import percentile
+
+OPERATIONS = ('index', 'list', 'detail', 'start_test', 'submit')
+
+# Root url configuration served by each interface.
+INTERFACES = {
+    'wsgi': 'quiz.urls',
+    'asgi': 'quiz.async_urls',
+}
+
+
+class Command(BaseCommand):
+    help = ('Serve the same concurrent anonymous visitors, browsing quizzes and submitting tests, through the WSGI handler '
+            'with the sync views and through the ASGI handler with the async views, and print the throughput and latency '
+            'percentiles of each as json. The requests go through the middlewares but not over the network. '
+            'The seeded data is deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Number of requests served by each interface.')
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='Number of connections open at the same time, threads under WSGI and tasks under ASGI.')
+        parser.add_argument('--questions', type=int, default=10, help='Number of questions of the quiz.')
+        parser.add_argument('--page-cache', action='store_true',
+                            help='Serve the anonymous pages from the page cache, instead of running the views every time.')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        user, quiz_id, answers = self.seed(run, options['questions'])
+        requests = self.requests(quiz_id, answers, run)
+        report = {
+            'config': {key: options[key] for key in ('requests', 'concurrency', 'questions', 'page_cache')},
+            'database': connection.vendor,
+            'interfaces': dict(),
+        }
+        try:
+            page_cache_timeout = settings.QUIZ_PAGE_CACHE_TIMEOUT if options['page_cache'] else 0
+            for interface, urlconf in INTERFACES.items():
+                # As in production, without the debug toolbar and the recording of the queries. The toolbar
+                # middleware is removed too, a sync only middleware would move every async view to a thread.
+                with override_settings(ROOT_URLCONF=urlconf, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], DEBUG=False,
+                                       MIDDLEWARE=[name for name in settings.MIDDLEWARE if not name.startswith('debug_toolbar.')],
+                                       QUIZ_PAGE_CACHE_TIMEOUT=page_cache_timeout):
+                    serve = self.serve_wsgi if interface == 'wsgi' else async_to_sync(self.serve_asgi)
+                    samples, duration = serve(requests, options['requests'], options['concurrency'])
+                report['interfaces'][interface] = self.report(samples, duration)
+        finally:
+            user.delete()
+            QueuedMail.objects.filter(recipient=f'asgi-{run}@example.com').delete()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def seed(run, question_count):
+        """
+        Create a published quiz.
+
+        :return: Tuple of its author, its pk and the answers of a test, dict of question pk to a list of a choice pk.
+        """
+        user = User.objects.create_user(username=f'asgi-{run}')
+        quiz = Quiz.objects.create(author=user, title=f'Asgi {run}', is_published=True, question_count=question_count)
+        Question.objects.bulk_create([Question(quiz=quiz, question=f'Question {n}') for n in range(question_count)])
+        QuestionChoice.objects.bulk_create([QuestionChoice(question=question, choice=f'Choice {n}', is_correct=n == 0)
+                                            for question in quiz.questions.all() for n in range(4)])
+        answers = dict()
+        for question_id, choice_id in QuestionChoice.objects.filter(question__quiz=quiz, is_correct=True).values_list('question_id', 'pk'):
+            answers[question_id] = [choice_id]
+        return user, quiz.pk, answers
+
+    @staticmethod
+    def requests(quiz_id, answers, run):
+        """
+        :return: Dict of operation to (method, url, data), the urls are the same under both interfaces.
+        """
+        test_url = reverse('app:QuizTest', kwargs={'quiz_id': quiz_id}) + f'?anonymous=True&name=asgi&email=asgi-{run}@example.com'
+        return {
+            'index': ('get', reverse('app:Index'), None),
+            'list': ('get', reverse('app:QuizList'), None),
+            'detail': ('get', reverse('app:QuizDetail', kwargs={'quiz_id': quiz_id}), None),
+            'start_test': ('get', test_url, None),
+            'submit': ('post', test_url, answers),
+        }
+
+    @staticmethod
+    def serve_wsgi(requests, count, concurrency):
+        """
+        Send the requests from a pool of threads, each through its own test client.
+
+        :return: Tuple of the list of (operation, seconds, failed) samples and the total duration in seconds.
+        """
+        samples = []
+        lock = threading.Lock()
+        counter = itertools.count()
+
+        def connect():
+            client = Client(raise_request_exception=False)
+            try:
+                for i in counter:
+                    if i >= count:
+                        break
+                    operation = OPERATIONS[i % len(OPERATIONS)]
+                    method, url, data = requests[operation]
+                    start = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        samples.append((operation, elapsed, response.status_code >= 400))
+            finally:
+                # Each thread has its own database connection.
+                connection.close()
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=connect) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - start
+
+    @staticmethod
+    async def serve_asgi(requests, count, concurrency):
+        """
+        Send the requests from tasks on a single event loop, each through its own async test client.
+
+        :return: Tuple of the list of (operation, seconds, failed) samples and the total duration in seconds.
+        """
+        samples = []
+        counter = itertools.count()
+
+        async def connect():
+            client = AsyncClient(raise_request_exception=False)
+            for i in counter:
+                if i >= count:
+                    break
+                operation = OPERATIONS[i % len(OPERATIONS)]
+                method, url, data = requests[operation]
+                start = time.perf_counter()
+                response = await getattr(client, method)(url, data)
+                if response.streaming:
+                    b''.join([chunk async for chunk in response.streaming_content])
+                samples.append((operation, time.perf_counter() - start, response.status_code >= 400))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[connect() for _ in range(concurrency)])
+        return samples, time.perf_counter() - start
+
+    @staticmethod
+    def report(samples, duration):
+        report = {
+            'duration_s': round(duration, 3),
+            'requests': len(samples),
+            'errors': sum(1 for operation, elapsed, failed in samples if failed),
+            'throughput_rps': round(len(samples) / duration, 2) if duration else 0,
+            'operations': dict(),
+        }
+        for operation in OPERATIONS:
+            latencies = sorted(elapsed for name, elapsed, failed in samples if name == operation)
+            report['operations'][operation] = {
+                'count': len(latencies),
+                'errors': sum(1 for name, elapsed, failed in samples if name == operation and failed),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            }
+        return report
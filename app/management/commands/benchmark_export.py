@@ -0,0 +1,51 @@
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.template import Template, Context
+from django.template.loader import get_template
+from django.utils import timezone
+
+from app.ooxml import docx_chunks, xlsx_chunks
+
+# Template the xlsx export used to render before the workbook writer existed.
+XLSX_TEMPLATE = '''Username,Email,Score,Date
+{% for result in results %}
+"{{ result.user.username|addslashes }}","{{ result.user.email|addslashes }}","{{ result.score }}","{% with date=result.created|date:"d M, Y" %}{{ date|addslashes }}{% endwith %}"{% endfor %}'''
+
+
+class Command(BaseCommand):
+    help = 'Compare size and generation time of the xlsx/docx writers against the HTML template exports.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000], help='Number of synthetic results.')
+
+    def handle(self, *args, **options):
+        created = timezone.now()
+        for count in options['rows']:
+            results = [SimpleNamespace(user=SimpleNamespace(username=f'user{i}', email=f'user{i}@example.com'), score=i % 20, created=created)
+                       for i in range(count)]
+            rows = [(r.user.username, r.user.email, r.score, created.strftime('%d %b, %Y')) for r in results]
+            numbered = [(n, r[0], r[2], r[3]) for n, r in enumerate(rows, start=1)]
+            context = {'quiz': SimpleNamespace(title='Benchmark'), 'results': results}
+
+            self.report(count, 'xlsx', lambda: Template(XLSX_TEMPLATE).render(Context(context)).encode(),
+                        lambda: b''.join(xlsx_chunks(('Username', 'Email', 'Score', 'Date'), iter(rows))))
+            # The docx export used to render the same HTML as the pdf export.
+            self.report(count, 'docx', lambda: get_template('app/quiz/quiz_result_pdf_template.html').render(
+                            {'quiz': context['quiz'], 'rows': numbered, 'first_chunk': True}).encode(),
+                        lambda: b''.join(docx_chunks('Benchmark', ('#', 'User', 'Score', 'Date'), iter(numbered))))
+
+    def report(self, count, filetype, template_path, writer_path):
+        template_time, template_size = self.measure(template_path)
+        writer_time, writer_size = self.measure(writer_path)
+        self.stdout.write(
+            f'{filetype} {count:>7} rows | template {template_time * 1000:9.1f} ms {template_size / 1024:9.1f} KiB'
+            f' | writer {writer_time * 1000:9.1f} ms {writer_size / 1024:9.1f} KiB'
+        )
+
+    @staticmethod
+    def measure(generate):
+        start = time.perf_counter()
+        size = len(generate())
+        return time.perf_counter() - start, size
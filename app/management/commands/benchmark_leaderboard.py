@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.leaderboard import Leaderboard
+from app.models import Quiz, QuizTestResult
+from app.profiling import percentile
+
+
+class Command(BaseCommand):
+    help = ('Time the leaderboard of a quiz with many attempts: rebuilding the top results, reading them from the cache, '
+            'recording new results and reading the leaderboard again, and ranking attempts. Nothing is persisted.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=1000000, help='Number of results of the synthetic quiz.')
+        parser.add_argument('--questions', type=int, default=20, help='Highest score of the synthetic quiz.')
+        parser.add_argument('--samples', type=int, default=200, help='Number of timed reads, records and ranks.')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Results inserted per query while seeding.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            quiz_id = self.seed(options['attempts'], options['questions'], options['batch_size'])
+            self.stdout.write(f'seed    : {options["attempts"]} attempts in {time.perf_counter() - start:.1f} s')
+
+            self.report('rebuild', [self.timed(Leaderboard.rebuild, quiz_id) for _ in range(5)])
+            self.report('top', [self.timed(Leaderboard.top, quiz_id) for _ in range(options['samples'])])
+
+            samples = []
+            for _ in range(options['samples']):
+                result = QuizTestResult.objects.create(quiz_id=quiz_id, score=random.randint(0, options['questions']))
+                samples.append(self.timed(self.record, result))
+            self.report('record', samples)
+
+            pks = QuizTestResult.objects.filter(quiz_id=quiz_id).values_list('pk', flat=True)
+            results = [QuizTestResult.objects.get(pk=random.choice(pks)) for _ in range(options['samples'])]
+            self.report('rank', [self.timed(Leaderboard.rank, result) for result in results])
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def record(result):
+        # A result entering the leaderboard drops it, the time of the rebuild is paid by the next read.
+        Leaderboard.record(result)
+        Leaderboard.top(result.quiz_id)
+
+    @staticmethod
+    def seed(attempt_count, question_count, batch_size):
+        user = User.objects.create(username='benchmark-leaderboard')
+        quiz = Quiz.objects.create(title='Benchmark', author=user, question_count=question_count)
+        for offset in range(0, attempt_count, batch_size):
+            QuizTestResult.objects.bulk_create([QuizTestResult(quiz=quiz, user=user, score=random.randint(0, question_count))
+                                                for _ in range(min(batch_size, attempt_count - offset))])
+        return quiz.pk
+
+    @staticmethod
+    def timed(function, *args):
+        start = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - start
+
+    def report(self, name, samples):
+        samples = sorted(samples)
+        self.stdout.write(f'{name:<8}: p50 {percentile(samples, 50) * 1000:8.3f} ms, p95 {percentile(samples, 95) * 1000:8.3f} ms, '
+                          f'p99 {percentile(samples, 99) * 1000:8.3f} ms')
@@ -0,0 +1,35 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+
+from app.export import Export
+from app.pdf import render_pdf_parallel
+
+
+class Command(BaseCommand):
+    help = 'Measure the result pdf rendering time over synthetic results with an increasing number of processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000], help='Number of synthetic results.')
+        parser.add_argument('--workers', type=int, nargs='+', default=None, help='Process counts to compare, 1 up to the number of CPUs by default.')
+        parser.add_argument('--chunk-rows', type=int, default=500, help='Result rows per partial pdf.')
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or sorted({1, 2, 4, os.cpu_count() or 1})
+        template = get_template('app/quiz/quiz_result_pdf_template.html')
+        context = {'quiz': {'title': 'Benchmark'}}
+
+        for count in options['rows']:
+            rows = [(number, f'user{number}', number % 20, '01 Jan, 2020') for number in range(1, count + 1)]
+            html_chunks = [template.render({**context, 'rows': chunk, 'first_chunk': index == 0})
+                           for index, chunk in enumerate(Export.chunks(rows, options['chunk_rows']))]
+
+            baseline = None
+            for worker_count in workers:
+                start = time.perf_counter()
+                size = len(render_pdf_parallel(html_chunks, worker_count))
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                self.stdout.write(f'{count:>7} rows | {worker_count:>2} workers | {elapsed:8.2f} s | {size / 1024:9.1f} KiB | speedup {baseline / elapsed:4.1f}x')
@@ -0,0 +1,137 @@
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from app.models import Question, QuestionChoice, QueuedMail, Quiz
+from app.profiling import percentile
+
+OPERATIONS = ('list', 'start_test', 'submit')
+
+
+class Command(BaseCommand):
+    help = ('Seed users and quizzes and simulate concurrent test-takers listing quizzes, starting and submitting tests. '
+            'Prints throughput and latency percentiles per operation as json. The seeded data and the queued mails are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Number of simulated test-takers.')
+        parser.add_argument('--quizzes', type=int, default=5, help='Number of published quizzes.')
+        parser.add_argument('--questions', type=int, default=10, help='Number of questions per quiz.')
+        parser.add_argument('--tests', type=int, default=5, help='Number of tests taken by each user.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Number of users taking tests at the same time.')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout.')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded users and quizzes.')
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        users, quizzes = self.seed(run, options['users'], options['quizzes'], options['questions'])
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                samples, duration = self.simulate(users, quizzes, options['tests'], options['concurrency'])
+        finally:
+            if not options['keep']:
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+                QueuedMail.objects.filter(recipient__in=[user.email for user in users]).delete()
+
+        report = self.report(samples, duration, options)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def seed(run, user_count, quiz_count, question_count):
+        """
+        Create the test-takers and published quizzes of the run.
+
+        :return: Tuple of the users and a dict of quiz pk to dict of question pk to its choice pks.
+        """
+        users = [User.objects.create_user(username=f'load-{run}-{i}', email=f'load-{run}-{i}@example.com') for i in range(user_count)]
+
+        quizzes = dict()
+        for i in range(quiz_count):
+            quiz = Quiz.objects.create(author=users[0], title=f'Load {run} {i}', is_published=True, question_count=question_count)
+            Question.objects.bulk_create([Question(quiz=quiz, question=f'Question {n}') for n in range(question_count)])
+            questions = list(quiz.questions.all())
+            QuestionChoice.objects.bulk_create([QuestionChoice(question=question, choice=f'Choice {n}', is_correct=n == 0)
+                                                for question in questions for n in range(4)])
+            choices = dict()
+            for question_id, choice_id in QuestionChoice.objects.filter(question__quiz=quiz).values_list('question_id', 'pk'):
+                choices.setdefault(question_id, []).append(choice_id)
+            quizzes[quiz.pk] = choices
+        return users, quizzes
+
+    @staticmethod
+    def simulate(users, quizzes, tests, concurrency):
+        """
+        Run the test-takers in a pool of threads, each through its own test client.
+
+        :return: Tuple of the list of (operation, seconds, failed) samples and the total duration in seconds.
+        """
+        samples = []
+        lock = threading.Lock()
+
+        def request(client, operation, method, url, data=None):
+            start = time.perf_counter()
+            try:
+                response = getattr(client, method)(url, data)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.append((operation, elapsed, failed))
+
+        def take_tests(user):
+            try:
+                client = Client()
+                client.force_login(user)
+                for _ in range(tests):
+                    quiz_id = random.choice(list(quizzes))
+                    url = reverse('app:QuizTest', kwargs={'quiz_id': quiz_id})
+                    request(client, 'list', 'get', reverse('app:QuizList'))
+                    request(client, 'start_test', 'get', url)
+                    answers = {question_id: [random.choice(choices)] for question_id, choices in quizzes[quiz_id].items()}
+                    request(client, 'submit', 'post', url, answers)
+            finally:
+                # Each pool thread has its own database connection.
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(take_tests, users))
+        return samples, time.perf_counter() - start
+
+    @staticmethod
+    def report(samples, duration, options):
+        report = {
+            'config': {key: options[key] for key in ('users', 'quizzes', 'questions', 'tests', 'concurrency')},
+            'database': connection.vendor,
+            'duration_s': round(duration, 3),
+            'requests': len(samples),
+            'throughput_rps': round(len(samples) / duration, 2) if duration else 0,
+            'operations': dict(),
+        }
+        for operation in OPERATIONS:
+            latencies = sorted(elapsed for name, elapsed, failed in samples if name == operation)
+            report['operations'][operation] = {
+                'count': len(latencies),
+                'errors': sum(1 for name, elapsed, failed in samples if name == operation and failed),
+                'throughput_rps': round(len(latencies) / duration, 2) if duration else 0,
+                'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0,
+                'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            }
+        return report
@@ -0,0 +1,63 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.forms import QuizTestForm
+from app.models import Question, QuestionChoice, Quiz, QuizTestResult, QuizTestResultAnswer
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-row and the bulk insert paths for saving quiz test answers. Nothing is persisted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=100, help='Number of questions in the synthetic quiz.')
+        parser.add_argument('--selected', type=int, default=3, help='Number of selected choices per question.')
+        parser.add_argument('--submissions', type=int, default=20, help='Number of submissions saved per path.')
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows per INSERT for the bulk path.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            quiz_id, answers = self.seed(options['questions'], options['selected'])
+            rows = sum(len(answer['selected']) for answer in answers.values())
+
+            per_row = self.measure(quiz_id, options['submissions'], lambda result: self.save_per_row(result, answers))
+            form = QuizTestForm.__new__(QuizTestForm)
+            bulk = self.measure(quiz_id, options['submissions'], lambda result: form.save_answers(result, answers, batch_size=options['batch_size']))
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{rows} answers per submission, {options["submissions"]} submissions')
+        self.stdout.write(f'per-row : {per_row * 1000:.2f} ms/submission')
+        self.stdout.write(f'bulk    : {bulk * 1000:.2f} ms/submission')
+        self.stdout.write(self.style.SUCCESS(f'speedup : {per_row / bulk:.1f}x'))
+
+    def seed(self, question_count, selected_count):
+        user = User.objects.create(username='benchmark-save-answers')
+        quiz = Quiz.objects.create(title='Benchmark', author=user)
+        Question.objects.bulk_create([Question(quiz=quiz, question=f'Question {i}') for i in range(question_count)])
+        questions = list(quiz.questions.all())
+        QuestionChoice.objects.bulk_create([QuestionChoice(question=question, choice=f'Choice {i}') for question in questions for i in range(4)])
+        choices = list(QuestionChoice.objects.filter(question__quiz=quiz).order_by('pk'))
+
+        answers = dict()
+        for index, question in enumerate(questions):
+            answers[question.pk] = {'correct': frozenset(), 'selected': [choice.pk for choice in choices[index * 4:index * 4 + selected_count]]}
+        return quiz.pk, answers
+
+    @staticmethod
+    def save_per_row(result, answers):
+        for question_id, answer in answers.items():
+            for ans in answer['selected']:
+                QuizTestResultAnswer.objects.create(quiz_test=result, question_id=question_id, choice_id=ans)
+
+    @staticmethod
+    def measure(quiz_id, submissions, save):
+        elapsed = 0
+        for _ in range(submissions):
+            result = QuizTestResult.objects.create(quiz_id=quiz_id)
+            start = time.perf_counter()
+            with transaction.atomic():
+                save(result)
+            elapsed += time.perf_counter() - start
+        return elapsed / submissions
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.answers import AnswerPacking
+from app.models import Quiz, QuizTestResult, QuizTestResultAnswer
+
+
+class Command(BaseCommand):
+    help = 'Convert the QuizTestResultAnswer rows of quiz test results to packed answers, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int, help='PK values of the quizzes to convert.')
+        parser.add_argument('--all', action='store_true', help='Convert the results of every quiz.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of results converted per transaction.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            quiz_ids = list(Quiz.objects.values_list('pk', flat=True))
+        elif options['quiz_ids']:
+            quiz_ids = options['quiz_ids']
+        else:
+            raise CommandError('Give the quiz ids to convert or use --all.')
+
+        for quiz_id in quiz_ids:
+            converted = self.pack_quiz(quiz_id, options['batch_size'])
+            self.stdout.write(f'Quiz {quiz_id}: {converted} results packed.')
+
+    def pack_quiz(self, quiz_id, batch_size):
+        layout_id, bits = AnswerPacking.layout(quiz_id)
+        converted = 0
+        while True:
+            # Converted results leave the filter, so each batch starts from the first unconverted result.
+            result_ids = list(QuizTestResult.objects.filter(quiz_id=quiz_id, packed_answers__isnull=True)
+                              .order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not result_ids:
+                return converted
+            self.pack_batch(layout_id, bits, result_ids)
+            converted += len(result_ids)
+
+    @staticmethod
+    @transaction.atomic
+    def pack_batch(layout_id, bits, result_ids):
+        answers = QuizTestResultAnswer.objects.filter(quiz_test_id__in=result_ids)
+        selected = {result_id: [] for result_id in result_ids}
+        for result_id, choice_id in answers.values_list('quiz_test_id', 'choice_id'):
+            selected[result_id].append(choice_id)
+
+        results = [QuizTestResult(pk=result_id, answer_layout_id=layout_id, packed_answers=AnswerPacking.pack(bits, choice_ids))
+                   for result_id, choice_ids in selected.items()]
+        QuizTestResult.objects.bulk_update(results, ['answer_layout', 'packed_answers'])
+        answers.delete()
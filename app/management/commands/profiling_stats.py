@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from app import profiling
+
+
+class Command(BaseCommand):
+    help = ('Print per view percentiles of the requests recorded by the profiling middleware. '
+            'Samples are read from the cache shared with the server processes, which publish theirs every '
+            'QUIZ_PROFILING_PUBLISH_INTERVAL seconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the statistics as json.')
+
+    def handle(self, *args, **options):
+        stats = profiling.summarize(profiling.collect())
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        if not stats:
+            self.stdout.write('No samples recorded.')
+            return
+
+        self.stdout.write(f'{"view":<40} {"count":>6} {"wall p50":>9} {"p95":>9} {"p99":>9} {"queries p95":>12} {"db p95":>9} {"tpl p95":>9}')
+        for view, s in stats.items():
+            self.stdout.write(
+                f'{view:<40} {s["count"]:>6} {s["wall_p50"]:>9.1f} {s["wall_p95"]:>9.1f} {s["wall_p99"]:>9.1f}'
+                f' {s["queries_p95"]:>12.0f} {s["db_time_p95"]:>9.1f} {s["template_time_p95"]:>9.1f}'
+            )
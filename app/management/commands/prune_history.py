@@ -0,0 +1,107 @@
+from datetime import timedelta
+from itertools import groupby
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.history import compared_fields
+from app.models import Question, Quiz
+
+# Models whose history is pruned, by name.
+MODELS = {
+    'quiz': Quiz,
+    'question': Question,
+}
+
+
+class Command(BaseCommand):
+    help = ('Prune the historical rows of quizzes and questions: collapse the revisions that change no tracked field, '
+            'drop the revisions older than --days and keep at most --keep revisions per object. '
+            'The latest revision of an object is always kept. Objects are processed and rows deleted in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help=f'Models to prune among {", ".join(MODELS)}, all by default.')
+        parser.add_argument('--days', type=int, help='Delete the revisions older than this number of days.')
+        parser.add_argument('--keep', type=int, help='Number of most recent revisions kept per object.')
+        parser.add_argument('--collapse', action='store_true',
+                            help='Delete the revisions equal to the previous revision of their object.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of objects read, and of rows deleted, per query.')
+        parser.add_argument('--dry-run', action='store_true', help='Count the rows to delete without deleting them.')
+
+    def handle(self, *args, **options):
+        if options['days'] is None and options['keep'] is None and not options['collapse']:
+            raise CommandError('Give --days, --keep or --collapse.')
+        if options['keep'] is not None and options['keep'] < 1:
+            raise CommandError('--keep must be at least 1.')
+        unknown = set(options['models']) - set(MODELS)
+        if unknown:
+            raise CommandError(f'Unknown models: {", ".join(sorted(unknown))}.')
+
+        cutoff = timezone.now() - timedelta(days=options['days']) if options['days'] is not None else None
+        for name in options['models'] or MODELS:
+            deleted = self.prune(MODELS[name].history.model, cutoff, options['keep'], options['collapse'],
+                                 options['batch_size'], options['dry_run'])
+            verb = 'to delete' if options['dry_run'] else 'deleted'
+            self.stdout.write(f'{MODELS[name].__name__}: {deleted} historical rows {verb}.')
+
+    def prune(self, history_model, cutoff, keep, collapse, batch_size, dry_run):
+        """
+        Prune the rows of the objects of the historical model, batch_size objects at a time.
+
+        :return: Number of rows deleted.
+        """
+        pk_name = history_model.instance_type._meta.pk.attname
+        attnames = compared_fields(history_model)
+        rows = history_model.objects.order_by(pk_name, 'history_date', 'history_id')
+        deleted = 0
+        last_pk = None
+        while True:
+            object_ids = history_model.objects.order_by(pk_name).values_list(pk_name, flat=True).distinct()
+            if last_pk is not None:
+                object_ids = object_ids.filter(**{f'{pk_name}__gt': last_pk})
+            object_ids = list(object_ids[:batch_size])
+            if not object_ids:
+                return deleted
+            last_pk = object_ids[-1]
+
+            revisions = rows.filter(**{f'{pk_name}__in': object_ids}).values_list(
+                pk_name, 'history_id', 'history_date', 'history_type', *attnames)
+            history_ids = []
+            for object_id, object_revisions in groupby(revisions.iterator(), key=lambda row: row[0]):
+                history_ids += self.obsolete(list(object_revisions), cutoff, keep, collapse)
+            if not dry_run:
+                for start in range(0, len(history_ids), batch_size):
+                    history_model.objects.filter(history_id__in=history_ids[start:start + batch_size]).delete()
+            deleted += len(history_ids)
+
+    @staticmethod
+    def obsolete(revisions, cutoff, keep, collapse):
+        """
+        Revisions of an object to delete.
+
+        :param revisions: List of (pk, history_id, history_date, history_type, *tracked values) of the object, oldest first.
+        :param cutoff: Datetime before which revisions are deleted, or None.
+        :param keep: Number of most recent revisions to keep, or None.
+        :param collapse: Whether to delete the changes equal to the previous revision.
+        :return: List of the history_id of the revisions.
+        """
+        obsolete = set()
+        if collapse:
+            previous = None
+            for revision in revisions:
+                # Creations and deletions are revisions even when the values are unchanged.
+                if previous is not None and revision[3] == '~' and revision[4:] == previous[4:]:
+                    obsolete.add(revision[1])
+                else:
+                    previous = revision
+        kept = [revision for revision in revisions if revision[1] not in obsolete]
+        # The latest revision holds the current state of the object, it is never deleted.
+        kept.pop()
+        if keep is not None:
+            excess = max(len(kept) + 1 - keep, 0)
+            obsolete.update(revision[1] for revision in kept[:excess])
+            kept = kept[excess:]
+        if cutoff is not None:
+            obsolete.update(revision[1] for revision in kept if revision[2] < cutoff)
+        return [revision[1] for revision in revisions if revision[1] in obsolete]
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.leaderboard import Leaderboard
+from app.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cached leaderboards of quizzes from their results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int, help='PK values of the quizzes to rebuild, all quizzes if omitted.')
+
+    def handle(self, *args, **options):
+        quiz_ids = options['quiz_ids'] or Quiz.objects.order_by('pk').values_list('pk', flat=True)
+        count = 0
+        for quiz_id in quiz_ids:
+            Leaderboard.rebuild(quiz_id)
+            count += 1
+        self.stdout.write(f'{count} leaderboards rebuilt.')
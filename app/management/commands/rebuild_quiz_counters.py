@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from app.models import Question, Quiz, QuizTestResult
+
+
+def count_related(model):
+    counts = model.objects.filter(quiz=OuterRef('pk')).order_by().values('quiz').annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recompute the question and test counters of quizzes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int, help='PK values of the quizzes to rebuild, all quizzes if omitted.')
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.all()
+        if options['quiz_ids']:
+            quizzes = quizzes.filter(pk__in=options['quiz_ids'])
+
+        updated = quizzes.update(question_count=count_related(Question), test_count=count_related(QuizTestResult))
+        self.stdout.write(f'{updated} quiz counters rebuilt.')
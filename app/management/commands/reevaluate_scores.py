@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.cache import QuizVersion
+from app.grading import AnswerKey
+from app.leaderboard import Leaderboard
+from app.models import Quiz, QuizTestResult
+
+
+class Command(BaseCommand):
+    help = 'Re-score quiz test results against the current correct choices.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int, help='PK values of the quizzes to re-score.')
+        parser.add_argument('--all', action='store_true', help='Re-score the results of every quiz.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Number of results re-scored per query.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            quiz_ids = list(Quiz.objects.values_list('pk', flat=True))
+        elif options['quiz_ids']:
+            quiz_ids = options['quiz_ids']
+        else:
+            raise CommandError('Give the quiz ids to re-score or use --all.')
+
+        for quiz_id in quiz_ids:
+            updated = self.reevaluate_quiz(quiz_id, options['chunk_size'])
+            self.stdout.write(f'Quiz {quiz_id}: {updated} scores updated.')
+
+    def reevaluate_quiz(self, quiz_id, chunk_size):
+        # Correct choices may have been fixed with queryset updates, which skip the invalidation signals.
+        QuizVersion.bump(quiz_id)
+
+        updated = 0
+        chunk = []
+        results = QuizTestResult.objects.filter(quiz_id=quiz_id).only('pk', 'quiz_id', 'score').order_by('pk')
+        for result in results.iterator(chunk_size=chunk_size):
+            chunk.append(result)
+            if len(chunk) == chunk_size:
+                updated += self.reevaluate_chunk(quiz_id, chunk)
+                chunk = []
+        if chunk:
+            updated += self.reevaluate_chunk(quiz_id, chunk)
+        # Through the shared cache, the server processes drop the analytics and leaderboards they
+        # cached from the scores during the re-scoring, and rebuild them from the committed ones.
+        QuizVersion.bump(quiz_id)
+        Leaderboard.rebuild(quiz_id)
+        return updated
+
+    @staticmethod
+    @transaction.atomic
+    def reevaluate_chunk(quiz_id, chunk):
+        scores = AnswerKey.reevaluate(quiz_id, [result.pk for result in chunk])
+
+        changed = []
+        for result in chunk:
+            score = scores.get(result.pk)
+            if score is not None and score != result.score:
+                result.score = score
+                changed.append(result)
+        QuizTestResult.objects.bulk_update(changed, ['score'])
+        return len(changed)
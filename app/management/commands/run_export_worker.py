@@ -0,0 +1,43 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from app.jobs import ExportQueue
+from app.models import ExportJob
+
+
+def run_job(job_id):
+    try:
+        return ExportQueue.run(job_id)
+    finally:
+        # Each pool thread has its own database connection.
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Generate pending quiz result exports in the background.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of exports generated concurrently.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to wait when no job is pending.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is pending.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                close_old_connections()
+                job_ids = ExportQueue.claim(workers)
+                if not job_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+
+                for job in pool.map(run_job, job_ids):
+                    if job.status == ExportJob.DONE:
+                        self.stdout.write(f'Export job {job.pk}: {job.artifact}')
+                    else:
+                        self.stderr.write(f'Export job {job.pk} failed: {job.error}')
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app.mail import MailQueue
+from app.models import QueuedMail
+
+
+class Command(BaseCommand):
+    help = 'Deliver the queued e-mails in batches, one connection per batch and one message per mail.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Mails sent per connection, defaults to settings.QUIZ_MAIL_BATCH_SIZE.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to wait when no mail is due.')
+        parser.add_argument('--once', action='store_true', help='Exit once no mail is due.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or settings.QUIZ_MAIL_BATCH_SIZE
+        while True:
+            close_old_connections()
+            mails = MailQueue.claim(batch_size)
+            if not mails:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            sent = MailQueue.deliver(mails)
+            if sent:
+                self.stdout.write(f'Sent {sent} mails.')
+            failed = [mail for mail in mails if mail.status != QueuedMail.SENT]
+            if failed:
+                self.stderr.write(f'Failed to send {len(failed)} mails: {failed[0].error}')
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+def populate_counters(apps, schema_editor):
+    Quiz = apps.get_model('app', 'Quiz')
+    Question = apps.get_model('app', 'Question')
+    QuizTestResult = apps.get_model('app', 'QuizTestResult')
+    Quiz.objects.update(question_count=count_related(Question, 'quiz'), test_count=count_related(QuizTestResult, 'quiz'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_historicalquestion_historicalquiz'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='test_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
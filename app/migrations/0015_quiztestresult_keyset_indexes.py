@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_queuedmail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quiztestresult',
+            index=models.Index(fields=['quiz', 'created', 'id'], name='app_result_quiz_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiztestresult',
+            index=models.Index(fields=['user', 'created', 'id'], name='app_result_user_created_idx'),
+        ),
+    ]
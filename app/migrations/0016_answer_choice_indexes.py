@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_quiztestresult_keyset_indexes'),
+    ]
+
+    operations = [
+        # Create the composite indexes before dropping the foreign key indexes they replace.
+        migrations.AddIndex(
+            model_name='questionchoice',
+            index=models.Index(fields=['question', 'is_correct'], name='app_choice_question_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionchoice',
+            index=models.Index(condition=models.Q(('is_correct', True)), fields=['question'], name='app_choice_correct_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiztestresultanswer',
+            index=models.Index(fields=['quiz_test', 'question', 'choice'], name='app_answer_result_idx'),
+        ),
+        migrations.AlterField(
+            model_name='questionchoice',
+            name='question',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='question_choices', related_query_name='question_choice', to='app.question'),
+        ),
+        migrations.AlterField(
+            model_name='quiztestresultanswer',
+            name='quiz_test',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='results_answers', related_query_name='result_answer', to='app.quiztestresult'),
+        ),
+    ]
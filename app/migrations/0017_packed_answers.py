@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_answer_choice_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiztestresult',
+            name='packed_answers',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.CreateModel(
+            name='AnswerLayout',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(help_text='SHA-1 of the choices.', max_length=40)),
+                ('choices', models.BinaryField(help_text='Question and choice pks, packed as little-endian unsigned 32-bit integers.')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_layouts', related_query_name='answer_layout', to='app.quiz')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='quiztestresult',
+            name='answer_layout',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='+', to='app.answerlayout'),
+        ),
+        migrations.AddConstraint(
+            model_name='answerlayout',
+            constraint=models.UniqueConstraint(fields=('quiz', 'digest'), name='app_answer_layout_unique'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_packed_answers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quiztestresult',
+            index=models.Index(fields=['quiz', '-score', 'created', 'id'], name='app_result_quiz_score_idx'),
+        ),
+    ]
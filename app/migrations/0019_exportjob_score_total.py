@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_quiztestresult_score_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='score_total',
+            field=models.IntegerField(default=0, help_text='Total score of the results included in the export, changed by a re-evaluation.'),
+        ),
+    ]
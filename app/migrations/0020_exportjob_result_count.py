@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_exportjob_score_total'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='result_count',
+            field=models.IntegerField(default=0, help_text='Number of results included in the export, changed by a deletion.'),
+        ),
+    ]
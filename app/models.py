@@ -2,9 +2,73 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from django.utils import timezone
-from simple_history.models import HistoricalRecords
 
-class Quiz(models.Model):
+from app.history import QuizHistoricalRecords
+
+
+class DirtyFieldsMixin(models.Model):
+    """
+    Model remembering the field values it was loaded or last saved with.
+    Saving an unchanged instance runs no query, sends no signal and writes
+    no history, and saving a changed one updates only the changed columns
+    and the auto_now fields. Save with force_update to write every field.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance.get_field_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using, fields, **kwargs)
+        if hasattr(self, '_loaded_values'):
+            values = self.get_field_values()
+            if fields is not None:
+                attnames = {self._meta.get_field(name).attname for name in fields}
+                values = {attname: value for attname, value in values.items() if attname in attnames}
+            self._loaded_values.update(values)
+
+    def get_field_values(self):
+        """
+        :return: Dict of the attname to the value of the loaded concrete fields, deferred fields left out.
+        """
+        return {field.attname: self.__dict__[field.attname] for field in self._meta.concrete_fields
+                if field.attname in self.__dict__}
+
+    def get_dirty_fields(self):
+        """
+        :return: List of the names of the fields changed since the instance was loaded or saved,
+                 None if it was neither and every field has to be written.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return None
+        return [field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname in self.__dict__
+                and (field.attname not in loaded or loaded[field.attname] != self.__dict__[field.attname])]
+
+    def save(self, *args, **kwargs):
+        # Forced saves write the row as told.
+        dirty = None if kwargs.get('force_insert') or kwargs.get('force_update') else self.get_dirty_fields()
+        if dirty is not None:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                dirty = [name for name in dirty if name in update_fields or self._meta.get_field(name).attname in update_fields]
+            if not dirty:
+                return
+            kwargs['update_fields'] = dirty + [field.name for field in self._meta.concrete_fields
+                                               if getattr(field, 'auto_now', False) and field.name not in dirty]
+        # Read by QuizHistoricalRecords, None when the changes are unknown.
+        self._changed_fields = dirty
+        super().save(*args, **kwargs)
+        self._loaded_values = self.get_field_values()
+
+
+class Quiz(DirtyFieldsMixin, models.Model):
     """
     Quizzes
     """
@@ -14,7 +78,12 @@ class Quiz(models.Model):
     published_date = models.DateTimeField(null=True)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
-    history = HistoricalRecords()
+    question_count = models.PositiveIntegerField(default=0, editable=False)
+    test_count = models.PositiveIntegerField(default=0, editable=False)
+    # Re-saving a published quiz refreshes its published date, not a change of its own.
+    history = QuizHistoricalRecords(excluded_fields=['question_count', 'test_count'], ignored_fields=['modified', 'published_date'])
+
+    COUNTER_FIELDS = ('question_count', 'test_count')
 
     def publish_quiz(self):
         self.is_published = True
@@ -25,15 +94,20 @@ class Quiz(models.Model):
         self.save()
 
     def save(self, *args, **kwargs):
-        if self.is_published:
+        # An unchanged quiz is not saved, its published date is not refreshed either.
+        if self.is_published and self.get_dirty_fields() != []:
             self.published_date = timezone.now()
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # Counters are maintained with F() updates, never overwrite them with possibly stale values.
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.COUNTER_FIELDS]
         super().save(*args, **kwargs)
 
     def __str__(self):
         return str(self.title)
 
 
-class Question(models.Model):
+class Question(DirtyFieldsMixin, models.Model):
     """
     Questions for the quizzes.
     """
@@ -41,7 +115,7 @@ class Question(models.Model):
     question = models.CharField(max_length=1024)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
-    history = HistoricalRecords()
+    history = QuizHistoricalRecords()
 
     def get_previous_question(self):
         try:
@@ -62,16 +136,24 @@ class Question(models.Model):
         return q
 
 
-class QuestionChoice(models.Model):
+class QuestionChoice(DirtyFieldsMixin, models.Model):
     """
     Choices for the questions.
     """
-    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='question_choices', related_query_name='question_choice')
+    # Indexed by app_choice_question_idx.
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='question_choices', related_query_name='question_choice', db_index=False)
     choice = models.CharField(max_length=1024)
     is_correct = models.BooleanField(default=False)
     created = models.DateTimeField(auto_now_add=True)
     modified = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['question', 'is_correct'], name='app_choice_question_idx'),
+            # Answer keys only read the correct choices, a small fraction of the table.
+            models.Index(fields=['question'], condition=models.Q(is_correct=True), name='app_choice_correct_idx'),
+        ]
+
     @staticmethod
     def get_correct_choices(question_id):
         """
@@ -83,6 +165,20 @@ class QuestionChoice(models.Model):
         return QuestionChoice.objects.filter(question_id=question_id, is_correct=True)
 
 
+class AnswerLayout(models.Model):
+    """
+    Ordered question and choice pairs of a quiz when packed answers were saved.
+    Bit n of QuizTestResult.packed_answers selects the choice of the nth pair.
+    """
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='answer_layouts', related_query_name='answer_layout')
+    digest = models.CharField(max_length=40, help_text='SHA-1 of the choices.')
+    choices = models.BinaryField(help_text='Question and choice pks, packed as little-endian unsigned 32-bit integers.')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['quiz', 'digest'], name='app_answer_layout_unique')]
+
+
 class QuizTestResult(models.Model):
     """
     Results of quizzes.
@@ -91,28 +187,106 @@ class QuizTestResult(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='quiz_test_results', related_query_name='quiz_test_result')
     score = models.IntegerField(default=0)
     created = models.DateTimeField(auto_now_add=True)
+    # Selected choices as a bitmap over the answer layout, instead of QuizTestResultAnswer rows. Null for row storage.
+    answer_layout = models.ForeignKey(AnswerLayout, on_delete=models.RESTRICT, null=True, related_name='+')
+    packed_answers = models.BinaryField(null=True)
+
+    class Meta:
+        # Keyset pagination of the result lists seeks on (created, id) within a quiz or a user.
+        # The leaderboard reads and ranks the results of a quiz in (-score, created, id) order.
+        indexes = [
+            models.Index(fields=['quiz', 'created', 'id'], name='app_result_quiz_created_idx'),
+            models.Index(fields=['user', 'created', 'id'], name='app_result_user_created_idx'),
+            models.Index(fields=['quiz', '-score', 'created', 'id'], name='app_result_quiz_score_idx'),
+        ]
 
     def reevaluate_scores(self):
-        if self.results_answers.exists():
-            questions = self.quiz.questions.all()
-
-            score = 0
-            for question in questions:
-                selected_choice = self.results_answers.filter(question=question).values_list('choice__pk', flat=True)
-                correct_choices = QuestionChoice.get_correct_choices(question.pk).values_list('pk', flat=True)
-                a = (set(selected_choice)).difference(set(correct_choices))
-                if not a or not correct_choices:
-                    score += 1
-
-            return score
-        else:
+        from app.grading import AnswerKey
+
+        scores = AnswerKey.reevaluate(self.quiz_id, [self.pk])
+        if self.pk not in scores:
             raise ObjectDoesNotExist('Test result answers does not exist to re-evaluate.')
+        return scores[self.pk]
+
+    def get_answers(self):
+        """
+        Answers of the result, QuizTestResultAnswer instances unpacked lazily when the answers are packed.
+        """
+        if self.packed_answers is None:
+            return self.results_answers.all()
+        from app.answers import PackedAnswers
+
+        return PackedAnswers(self)
+
+    def get_selected_choice_ids(self):
+        """
+        :return: Set of the pks of the selected choices.
+        """
+        if self.packed_answers is None:
+            return set(self.results_answers.values_list('choice_id', flat=True))
+        return {answer.choice_id for answer in self.get_answers()}
 
 
 class QuizTestResultAnswer(models.Model):
     """
     Store results of quiz test.
     """
-    quiz_test = models.ForeignKey(QuizTestResult, on_delete=models.CASCADE, related_name='results_answers', related_query_name='result_answer')
+    # Indexed by app_answer_result_idx.
+    quiz_test = models.ForeignKey(QuizTestResult, on_delete=models.CASCADE, related_name='results_answers', related_query_name='result_answer', db_index=False)
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='results_answers', related_query_name='result_answer')
     choice = models.ForeignKey(QuestionChoice, on_delete=models.CASCADE, related_name='results_answers', related_query_name='result_answer', help_text='Choice refers to the selected choice.')
+
+    class Meta:
+        indexes = [
+            # Covers the answers of a result per question, and their selected choices, without reading the table.
+            models.Index(fields=['quiz_test', 'question', 'choice'], name='app_answer_result_idx'),
+        ]
+
+
+class ExportJob(models.Model):
+    """
+    Quiz result export generated in the background by the export worker.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed'))
+    FILETYPE_CHOICES = (('csv', 'CSV'), ('xlsx', 'Excel'), ('pdf', 'PDF'), ('docx', 'Docx'))
+
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='export_jobs', related_query_name='export_job')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='export_jobs', related_query_name='export_job')
+    filetype = models.CharField(max_length=4, choices=FILETYPE_CHOICES)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    latest_result_id = models.IntegerField(default=0, help_text='Latest result included in the export.')
+    result_count = models.IntegerField(default=0, help_text='Number of results included in the export, changed by a deletion.')
+    score_total = models.IntegerField(default=0, help_text='Total score of the results included in the export, changed by a re-evaluation.')
+    artifact = models.CharField(max_length=255, blank=True, help_text='Path of the generated file.')
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+
+class QueuedMail(models.Model):
+    """
+    Outgoing e-mail written in the transaction of the request and delivered by the mail worker.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed'))
+
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now, help_text='The mail is not sent before this time.')
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt'])]
@@ -0,0 +1,191 @@
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+# Characters which are not allowed in XML 1.0 documents.
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# Number of rows serialized between two flushes of the zip stream.
+ROWS_PER_FLUSH = 500
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+XLSX_CONTENT_TYPES = XML_DECLARATION + (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+XLSX_RELS = XML_DECLARATION + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+XLSX_WORKBOOK = XML_DECLARATION + (
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+XLSX_WORKBOOK_RELS = XML_DECLARATION + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+XLSX_SHEET_START = XML_DECLARATION + '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+DOCX_CONTENT_TYPES = XML_DECLARATION + (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+
+DOCX_RELS = XML_DECLARATION + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+DOCX_DOCUMENT_START = XML_DECLARATION + (
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+)
+DOCX_TABLE_START = (
+    '<w:tbl><w:tblPr><w:tblW w:w="5000" w:type="pct"/><w:tblBorders>'
+    '<w:top w:val="single" w:sz="4"/><w:bottom w:val="single" w:sz="4"/><w:insideH w:val="single" w:sz="4"/>'
+    '</w:tblBorders></w:tblPr>'
+)
+DOCX_DOCUMENT_END = '</w:tbl><w:sectPr><w:pgSz w:w="11906" w:h="16838"/></w:sectPr></w:body></w:document>'
+
+
+class ZipStream:
+    """
+    Unseekable file-like object collecting what zipfile writes, so it can be
+    handed out chunk by chunk while the archive is being built.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def xml_text(value):
+    return escape(INVALID_XML_CHARS.sub('', str(value)))
+
+
+def column_name(index):
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+
+def xlsx_row(number, row):
+    cells = []
+    for index, value in enumerate(row):
+        reference = f'{column_name(index)}{number}'
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{reference}"><v>{value}</v></c>')
+        else:
+            cells.append(f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{xml_text(value)}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def docx_paragraph(text, bold=False):
+    properties = '<w:rPr><w:b/></w:rPr>' if bold else ''
+    return f'<w:p><w:r>{properties}<w:t xml:space="preserve">{xml_text(text)}</w:t></w:r></w:p>'
+
+
+def docx_row(row, bold=False):
+    cells = ''.join(f'<w:tc>{docx_paragraph(value, bold)}</w:tc>' for value in row)
+    return f'<w:tr>{cells}</w:tr>'
+
+
+def zip_chunks(static_parts, streamed_name, start, pieces, end):
+    """
+    Build a zip package, yielding its bytes as soon as they are compressed.
+
+    :param static_parts: Dict of part name to its complete content.
+    :param streamed_name: Name of the part written incrementally.
+    :param start: Leading content of the streamed part.
+    :param pieces: Iterable of strings making up the body of the streamed part.
+    :param end: Trailing content of the streamed part.
+    """
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as package:
+        for name, content in static_parts.items():
+            package.writestr(name, content)
+        yield stream.pop()
+
+        with package.open(streamed_name, 'w', force_zip64=True) as part:
+            part.write(start.encode())
+            batch = []
+            for piece in pieces:
+                batch.append(piece)
+                if len(batch) == ROWS_PER_FLUSH:
+                    part.write(''.join(batch).encode())
+                    batch = []
+                    yield stream.pop()
+            part.write((''.join(batch) + end).encode())
+    yield stream.pop()
+
+
+def xlsx_chunks(header, rows, sheet_name='Sheet1'):
+    """
+    Write the rows as a single sheet xlsx workbook.
+
+    :param header: Column names of the sheet.
+    :param rows: Iterable of rows, consumed lazily.
+    :param sheet_name: Name of the sheet.
+    :return: Generator of the bytes of the workbook.
+    """
+    static_parts = {
+        '[Content_Types].xml': XLSX_CONTENT_TYPES,
+        '_rels/.rels': XLSX_RELS,
+        'xl/workbook.xml': XLSX_WORKBOOK.format(name=xml_text(sheet_name[:31])),
+        'xl/_rels/workbook.xml.rels': XLSX_WORKBOOK_RELS,
+    }
+    pieces = (xlsx_row(number, row) for number, row in enumerate(rows, start=2))
+    return zip_chunks(static_parts, 'xl/worksheets/sheet1.xml', XLSX_SHEET_START + xlsx_row(1, header), pieces, XLSX_SHEET_END)
+
+
+def docx_chunks(title, header, rows, intro=''):
+    """
+    Write the rows as a table of a docx document.
+
+    :param title: Title of the document.
+    :param header: Column names of the table.
+    :param rows: Iterable of rows, consumed lazily.
+    :param intro: Paragraph written between the title and the table.
+    :return: Generator of the bytes of the document.
+    """
+    static_parts = {
+        '[Content_Types].xml': DOCX_CONTENT_TYPES,
+        '_rels/.rels': DOCX_RELS,
+    }
+    start = DOCX_DOCUMENT_START + docx_paragraph(title, bold=True)
+    if intro:
+        start += docx_paragraph(intro)
+    start += DOCX_TABLE_START + '<w:tblGrid>' + '<w:gridCol/>' * len(header) + '</w:tblGrid>' + docx_row(header, bold=True)
+    pieces = (docx_row(row) for row in rows)
+    return zip_chunks(static_parts, 'word/document.xml', start, pieces, DOCX_DOCUMENT_END)
@@ -0,0 +1,119 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset newest first on (created, id) without OFFSET or COUNT(*).
+    Each page is fetched by seeking past the last row of the previous page, so
+    deep pages cost the same as the first one given an index ending in (created, id).
+    """
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def __init__(self, queryset, per_page, count=None):
+        """
+        :param queryset: Queryset of models with a created field.
+        :param per_page: Number of rows per page.
+        :param count: Estimated number of rows, None if unknown.
+        """
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count = count
+
+    @staticmethod
+    def encode_cursor(obj, direction):
+        value = f'{direction}|{obj.created.isoformat()}|{obj.pk}'
+        return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        :return: Tuple of direction, created and pk of the row the cursor points at.
+        """
+        try:
+            value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            direction, created, pk = value.split('|')
+            if direction not in (KeysetPaginator.NEXT, KeysetPaginator.PREVIOUS):
+                raise ValueError(direction)
+            return direction, datetime.fromisoformat(created), int(pk)
+        except ValueError as e:
+            raise InvalidCursor(f'Invalid cursor {cursor}.') from e
+
+    def page(self, cursor=None):
+        """
+        :param cursor: Token of the page, the first page if None.
+        :return: KeysetPage instance.
+        """
+        queryset = self.queryset.order_by('-created', '-pk')
+        if cursor:
+            direction, created, pk = self.decode_cursor(cursor)
+            if direction == self.NEXT:
+                queryset = queryset.filter(Q(created__lt=created) | Q(created=created, pk__lt=pk))
+            else:
+                queryset = queryset.filter(Q(created__gt=created) | Q(created=created, pk__gt=pk)).reverse()
+        else:
+            direction = None
+
+        # One extra row tells whether there is another page in the direction of the seek.
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == self.PREVIOUS:
+            rows.reverse()
+            return KeysetPage(self, rows, has_next=True, has_previous=has_more)
+        return KeysetPage(self, rows, has_next=has_more, has_previous=direction == self.NEXT)
+
+
+class KeysetPage:
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.has_next = has_next and bool(object_list)
+        self.has_previous = has_previous and bool(object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        return KeysetPaginator.encode_cursor(self.object_list[-1], KeysetPaginator.NEXT) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return KeysetPaginator.encode_cursor(self.object_list[0], KeysetPaginator.PREVIOUS) if self.has_previous else None
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin replacing the page number pagination with KeysetPaginator,
+    reading the page from the cursor query parameter.
+    """
+    cursor_kwarg = 'cursor'
+
+    def get_estimated_count(self):
+        """
+        Cheap estimate of the number of rows shown on the page, None to skip it.
+        """
+        return None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, count=self.get_estimated_count())
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,62 @@
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from xhtml2pdf import pisa
+
+try:
+    from pypdf import PdfWriter
+except ImportError:  # Older xhtml2pdf releases depend on PyPDF2 instead of pypdf.
+    from PyPDF2 import PdfFileMerger as PdfWriter
+
+# This module is imported by the rendering processes, keep it free of Django imports.
+
+
+class PdfRenderError(Exception):
+    pass
+
+
+def render_pdf(html):
+    """
+    Render html to a pdf document.
+
+    :param html: Html string.
+    :return: Bytes of the pdf document.
+    """
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html.encode('UTF-8')), result)
+    if pdf.err:
+        raise PdfRenderError(f'{pdf.err} errors while rendering pdf.')
+    return result.getvalue()
+
+
+def merge_pdfs(documents):
+    """
+    Concatenate pdf documents.
+
+    :param documents: Iterable of bytes of pdf documents.
+    :return: Bytes of the merged pdf document.
+    """
+    writer = PdfWriter()
+    for document in documents:
+        writer.append(BytesIO(document))
+    result = BytesIO()
+    writer.write(result)
+    return result.getvalue()
+
+
+def render_pdf_parallel(html_chunks, workers=None):
+    """
+    Render each html chunk to pdf in a pool of processes and merge the parts
+    in order.
+
+    :param html_chunks: List of html strings, each rendered to a partial pdf.
+    :param workers: Number of rendering processes, the number of CPUs if None.
+    :return: Bytes of the merged pdf document.
+    """
+    if len(html_chunks) == 1:
+        return render_pdf(html_chunks[0])
+    if workers == 1:
+        return merge_pdfs(render_pdf(html) for html in html_chunks)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return merge_pdfs(pool.map(render_pdf, html_chunks))
@@ -0,0 +1,217 @@
+import math
+import os
+import socket
+import threading
+import time
+from collections import deque, namedtuple
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+Sample = namedtuple('Sample', ['view', 'wall', 'queries', 'db_time', 'template_time'])
+
+INDEX_CACHE_KEY = 'app:profiling:index'
+
+
+class RingBuffer:
+    """
+    Last samples recorded by this process.
+    """
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.published = time.monotonic()
+
+    def append(self, sample):
+        with self.lock:
+            self.samples.append(sample)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.samples)
+
+
+buffer = RingBuffer(settings.QUIZ_PROFILING_BUFFER_SIZE)
+
+
+def process_key():
+    return f'app:profiling:{socket.gethostname()}:{os.getpid()}'
+
+
+def publish():
+    """
+    Copy the samples of this process to the cache, where the stats endpoint
+    and command of any process can read them.
+    """
+    key = process_key()
+    cache.set(key, buffer.snapshot(), settings.QUIZ_PROFILING_PUBLISH_TIMEOUT)
+    index = cache.get(INDEX_CACHE_KEY) or set()
+    if key not in index:
+        cache.set(INDEX_CACHE_KEY, index | {key}, None)
+    buffer.published = time.monotonic()
+
+
+def collect():
+    """
+    Samples published by all the processes.
+    """
+    samples = []
+    index = cache.get(INDEX_CACHE_KEY) or set()
+    published = cache.get_many(index)
+    for key in index:
+        samples.extend(published.get(key) or [])
+    stale = index - published.keys()
+    if stale:
+        cache.set(INDEX_CACHE_KEY, index - stale, None)
+    return samples
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    if not values:
+        return 0
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def summarize(samples):
+    """
+    Percentiles of the samples per view.
+
+    :param samples: Iterable of Sample.
+    :return: Dict of view name to its statistics, times in milliseconds.
+    """
+    views = dict()
+    for sample in samples:
+        views.setdefault(sample.view, []).append(sample)
+
+    stats = dict()
+    for view, view_samples in sorted(views.items()):
+        view_stats = {'count': len(view_samples)}
+        for field in ('wall', 'queries', 'db_time', 'template_time'):
+            values = sorted(getattr(sample, field) for sample in view_samples)
+            scale = 1 if field == 'queries' else 1000
+            for percent in (50, 95, 99):
+                view_stats[f'{field}_p{percent}'] = round(percentile(values, percent) * scale, 3)
+        stats[view] = view_stats
+    return stats
+
+
+class QueryTimer:
+    def __init__(self):
+        self.queries = 0
+        self.time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.queries += 1
+
+
+# Timer of the request being profiled. Context variables follow the request into the threads of
+# sync_to_async, where the queries of the async views run on connections of their own.
+current_timer = ContextVar('profiling_timer', default=None)
+
+
+def execute_timed(execute, sql, params, many, context):
+    """
+    Execute wrapper of every connection, timing the queries of the request profiled in the current context.
+    """
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    if execute_timed not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_timed)
+
+
+connection_created.connect(install, dispatch_uid='app_profiling_install')
+
+
+class ProfilingMiddleware:
+    """
+    Record wall time, number and time of database queries and template render
+    time of every request into the process ring buffer.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections of this thread opened before the module was imported, the others install on connect.
+        for connection in connections.all():
+            install(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.QUIZ_PROFILING_ENABLED:
+            return self.get_response(request)
+
+        request._profiling_template_time = 0
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        if self.record(request, time.perf_counter() - start, timer):
+            publish()
+        return response
+
+    async def __acall__(self, request):
+        if not settings.QUIZ_PROFILING_ENABLED:
+            return await self.get_response(request)
+
+        request._profiling_template_time = 0
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        if self.record(request, time.perf_counter() - start, timer):
+            await sync_to_async(publish)()
+        return response
+
+    @staticmethod
+    def record(request, wall, timer):
+        """
+        Append the sample of the request to the ring buffer.
+
+        :return: True when the buffer is due to be published.
+        """
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        buffer.append(Sample(view, wall, timer.queries, timer.time, request._profiling_template_time))
+        return time.monotonic() - buffer.published > settings.QUIZ_PROFILING_PUBLISH_INTERVAL
+
+    def process_template_response(self, request, response):
+        if not hasattr(request, '_profiling_template_time'):
+            return response
+        render = response.render
+
+        def timed_render():
+            start = time.perf_counter()
+            try:
+                return render()
+            finally:
+                request._profiling_template_time += time.perf_counter() - start
+
+        response.render = timed_render
+        return response
@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from app.cache import QuizVersion
+from app.leaderboard import Leaderboard
+from app.models import Question, QuestionChoice, Quiz, QuizTestResult
+
+
+def bump_version(quiz_id):
+    """
+    Bump the version of the quiz now, for the reads of the writing transaction, and again on commit:
+    until then, concurrent requests still read the old rows and may cache them under the new version.
+    """
+    QuizVersion.bump(quiz_id)
+    transaction.on_commit(lambda: QuizVersion.bump(quiz_id))
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def bump_quiz_version(sender, instance, **kwargs):
+    bump_version(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def bump_question_quiz_version(sender, instance, **kwargs):
+    bump_version(instance.quiz_id)
+
+
+def deleted_by_cascade(origin, *models):
+    """
+    Whether the instance is deleted by the cascade of an instance of one of the
+    models, whose own handlers already cover the quiz. Origin is only sent by
+    Django 4.1+, older versions always run the handlers.
+    """
+    return isinstance(origin, models)
+
+
+@receiver([post_save, post_delete], sender=QuestionChoice)
+def bump_choice_quiz_version(sender, instance, **kwargs):
+    if deleted_by_cascade(kwargs.get('origin'), Quiz, Question):
+        return
+    if QuestionChoice.question.is_cached(instance):
+        bump_version(instance.question.quiz_id)
+        return
+    quiz_id = Question.objects.filter(pk=instance.question_id).values_list('quiz_id', flat=True).first()
+    if quiz_id is not None:
+        bump_version(quiz_id)
+
+
+@receiver(post_save, sender=Question)
+def increment_question_count(sender, instance, created, **kwargs):
+    if created:
+        Quiz.objects.filter(pk=instance.quiz_id).update(question_count=F('question_count') + 1)
+
+
+@receiver(post_delete, sender=Question)
+def decrement_question_count(sender, instance, **kwargs):
+    if deleted_by_cascade(kwargs.get('origin'), Quiz):
+        return
+    Quiz.objects.filter(pk=instance.quiz_id, question_count__gt=0).update(question_count=F('question_count') - 1)
+
+
+@receiver(post_save, sender=QuizTestResult)
+def increment_test_count(sender, instance, created, **kwargs):
+    if created:
+        Quiz.objects.filter(pk=instance.quiz_id).update(test_count=F('test_count') + 1)
+
+
+@receiver(post_delete, sender=QuizTestResult)
+def decrement_test_count(sender, instance, **kwargs):
+    if deleted_by_cascade(kwargs.get('origin'), Quiz):
+        return
+    Quiz.objects.filter(pk=instance.quiz_id, test_count__gt=0).update(test_count=F('test_count') - 1)
+
+
+@receiver(post_delete, sender=QuizTestResult)
+def discard_leaderboard_result(sender, instance, **kwargs):
+    if deleted_by_cascade(kwargs.get('origin'), Quiz):
+        return
+    Leaderboard.discard(instance)
@@ -0,0 +1,333 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPRecipientsRefused
+
+from django.core.cache import cache
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command, CommandError
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from app import profiling
+from app.leaderboard import Leaderboard
+from app.mail import MailQueue
+from app.models import *
+
+
+def create_user():
+    user = User.objects.create_user(username='test', password='test')
+    return user
+
+
+class ReevaluateScoresTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+        self.quiz = Quiz.objects.create(author=self.user, title='Test')
+        self.question1 = Question.objects.create(quiz=self.quiz, question='Question1')
+        self.choice1 = QuestionChoice.objects.create(question=self.question1, choice='Choice 1', is_correct=True)
+        self.choice2 = QuestionChoice.objects.create(question=self.question1, choice='Choice 2')
+        self.question2 = Question.objects.create(quiz=self.quiz, question='Question2')
+        self.choice3 = QuestionChoice.objects.create(question=self.question2, choice='Choice 3', is_correct=True)
+        self.choice4 = QuestionChoice.objects.create(question=self.question2, choice='Choice 4')
+
+        self.results = []
+        for selected in ([self.choice1, self.choice3], [self.choice2, self.choice3], [self.choice2, self.choice4]):
+            result = QuizTestResult.objects.create(user=self.user, quiz=self.quiz, score=0)
+            for choice in selected:
+                QuizTestResultAnswer.objects.create(quiz_test=result, question=choice.question, choice=choice)
+            self.results.append(result)
+        self.unanswered = QuizTestResult.objects.create(user=self.user, quiz=self.quiz, score=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reevaluate_scores(self):
+        out = StringIO()
+        call_command('reevaluate_scores', self.quiz.pk, chunk_size=2, stdout=out)
+        self.assertEqual([QuizTestResult.objects.get(pk=r.pk).score for r in self.results], [2, 1, 0])
+        self.assertEqual(QuizTestResult.objects.get(pk=self.unanswered.pk).score, 5)
+        self.assertIn('2 scores updated', out.getvalue())
+
+    def test_reevaluate_scores_after_answer_key_fix(self):
+        QuestionChoice.objects.filter(pk=self.choice2.pk).update(is_correct=True)
+        call_command('reevaluate_scores', all=True, stdout=StringIO())
+        self.assertEqual([QuizTestResult.objects.get(pk=r.pk).score for r in self.results], [2, 2, 1])
+
+    def test_reevaluate_scores_rebuilds_leaderboard(self):
+        Leaderboard.get(self.quiz.pk)
+        call_command('reevaluate_scores', self.quiz.pk, stdout=StringIO())
+        self.assertEqual([entry['score'] for entry in Leaderboard.top(self.quiz.pk)], [5, 2, 1, 0])
+
+    def test_reevaluate_scores_without_quiz(self):
+        self.assertRaises(CommandError, call_command, 'reevaluate_scores')
+
+
+class RebuildQuizCountersTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+        self.quiz = Quiz.objects.create(author=self.user, title='Test')
+        Question.objects.create(quiz=self.quiz, question='Question1')
+        Question.objects.create(quiz=self.quiz, question='Question2')
+        QuizTestResult.objects.create(user=self.user, quiz=self.quiz)
+        self.empty_quiz = Quiz.objects.create(author=self.user, title='Empty')
+
+    def test_rebuild_quiz_counters(self):
+        Quiz.objects.update(question_count=7, test_count=7)
+        call_command('rebuild_quiz_counters', stdout=StringIO())
+
+        self.quiz.refresh_from_db()
+        self.empty_quiz.refresh_from_db()
+        self.assertEqual((self.quiz.question_count, self.quiz.test_count), (2, 1))
+        self.assertEqual((self.empty_quiz.question_count, self.empty_quiz.test_count), (0, 0))
+
+
+class RebuildLeaderboardsTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+        self.quiz = Quiz.objects.create(author=self.user, title='Test')
+        self.result = QuizTestResult.objects.create(user=self.user, quiz=self.quiz, score=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rebuild_leaderboards(self):
+        Leaderboard.get(self.quiz.pk)
+        # Queryset updates skip the incremental updates.
+        QuizTestResult.objects.filter(pk=self.result.pk).update(score=3)
+        out = StringIO()
+        call_command('rebuild_leaderboards', stdout=out)
+        self.assertEqual(out.getvalue(), '1 leaderboards rebuilt.\n')
+        self.assertEqual([entry['score'] for entry in Leaderboard.top(self.quiz.pk)], [3])
+
+
+class BenchmarkLeaderboardTest(TestCase):
+    def test_benchmark_leaderboard(self):
+        out = StringIO()
+        call_command('benchmark_leaderboard', attempts=50, samples=3, batch_size=20, stdout=out)
+        for name in ('seed', 'rebuild', 'top', 'record', 'rank'):
+            self.assertIn(f'{name:<8}:', out.getvalue())
+        # Nothing is persisted.
+        self.assertEqual(QuizTestResult.objects.count(), 0)
+
+
+class PackAnswersTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+        self.quiz = Quiz.objects.create(author=self.user, title='Test')
+        self.question = Question.objects.create(quiz=self.quiz, question='Question1')
+        self.choice1 = QuestionChoice.objects.create(question=self.question, choice='Choice 1', is_correct=True)
+        self.choice2 = QuestionChoice.objects.create(question=self.question, choice='Choice 2')
+        self.results = [QuizTestResult.objects.create(user=self.user, quiz=self.quiz) for _ in range(3)]
+        QuizTestResultAnswer.objects.create(quiz_test=self.results[0], question=self.question, choice=self.choice1)
+        QuizTestResultAnswer.objects.create(quiz_test=self.results[1], question=self.question, choice=self.choice1)
+        QuizTestResultAnswer.objects.create(quiz_test=self.results[1], question=self.question, choice=self.choice2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pack_answers(self):
+        selected = [result.get_selected_choice_ids() for result in self.results]
+        out = StringIO()
+        call_command('pack_answers', self.quiz.pk, batch_size=2, stdout=out)
+        self.assertEqual(out.getvalue(), f'Quiz {self.quiz.pk}: 3 results packed.\n')
+        self.assertEqual(QuizTestResultAnswer.objects.count(), 0)
+
+        results = QuizTestResult.objects.order_by('pk')
+        self.assertEqual([result.get_selected_choice_ids() for result in results], selected)
+        self.assertEqual(len({result.answer_layout_id for result in results}), 1)
+
+        # Packed results are not converted again.
+        out = StringIO()
+        call_command('pack_answers', all=True, stdout=out)
+        self.assertEqual(out.getvalue(), f'Quiz {self.quiz.pk}: 0 results packed.\n')
+
+
+class PruneHistoryTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+
+    def setUp(self):
+        self.quiz = Quiz.objects.create(author=self.user, title='Test')
+        with self.settings(QUIZ_HISTORY_SKIP_UNCHANGED=False):
+            for title in ('Test', 'Test2', 'Test2', 'Test3'):
+                self.quiz.title = title
+                self.quiz.save(force_update=True)
+        self.question = Question.objects.create(quiz=self.quiz, question='Question1')
+        # Revisions from created, a month ago.
+        old = timezone.now() - timedelta(days=30)
+        for offset, history_id in enumerate(self.quiz.history.order_by('history_id').values_list('history_id', flat=True)):
+            Quiz.history.filter(history_id=history_id).update(history_date=old + timedelta(minutes=offset))
+
+    def titles(self):
+        return list(self.quiz.history.order_by('history_date', 'history_id').values_list('title', flat=True))
+
+    def test_prune_history_collapse(self):
+        out = StringIO()
+        call_command('prune_history', 'quiz', collapse=True, batch_size=1, stdout=out)
+        self.assertEqual(out.getvalue(), 'Quiz: 2 historical rows deleted.\n')
+        self.assertEqual(self.titles(), ['Test', 'Test2', 'Test3'])
+
+    def test_prune_history_keep(self):
+        out = StringIO()
+        call_command('prune_history', keep=2, stdout=out)
+        self.assertEqual(out.getvalue(), 'Quiz: 3 historical rows deleted.\nQuestion: 0 historical rows deleted.\n')
+        self.assertEqual(self.titles(), ['Test2', 'Test3'])
+
+    def test_prune_history_days(self):
+        self.quiz.title = 'Test4'
+        self.quiz.save()
+        call_command('prune_history', 'quiz', days=7, dry_run=True, stdout=StringIO())
+        self.assertEqual(len(self.titles()), 6)
+
+        call_command('prune_history', 'quiz', days=7, stdout=StringIO())
+        self.assertEqual(self.titles(), ['Test4'])
+        self.assertEqual(self.question.history.count(), 1)
+
+    def test_prune_history_keeps_latest(self):
+        call_command('prune_history', 'quiz', days=7, keep=1, collapse=True, stdout=StringIO())
+        self.assertEqual(self.titles(), ['Test3'])
+
+    def test_prune_history_errors(self):
+        self.assertRaises(CommandError, call_command, 'prune_history')
+        self.assertRaises(CommandError, call_command, 'prune_history', keep=0)
+        self.assertRaises(CommandError, call_command, 'prune_history', 'choice', collapse=True)
+
+
+class ProfilingStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.buffer.samples.clear()
+
+    def test_profiling_stats(self):
+        out = StringIO()
+        call_command('profiling_stats', stdout=out)
+        self.assertEqual(out.getvalue(), 'No samples recorded.\n')
+
+        self.client.get(reverse('app:Index'))
+        profiling.publish()
+        # Read back from the cache, as by a command run in another process.
+        profiling.buffer.samples.clear()
+        out = StringIO()
+        call_command('profiling_stats', json=True, stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['app:Index']['count'], 1)
+
+
+class BenchmarkQuizTakingTest(TransactionTestCase):
+    # The simulated test-takers run in other threads, which only see committed data.
+
+    def setUp(self):
+        cache.clear()
+
+    def test_benchmark_quiz_taking(self):
+        out = StringIO()
+        call_command('benchmark_quiz_taking', users=2, quizzes=1, questions=2, tests=2, concurrency=2, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['requests'], 12)
+        for operation in ('list', 'start_test', 'submit'):
+            self.assertEqual(report['operations'][operation]['count'], 4)
+            self.assertEqual(report['operations'][operation]['errors'], 0)
+            self.assertLessEqual(report['operations'][operation]['p50_ms'], report['operations'][operation]['p99_ms'])
+        # The seeded data is deleted afterwards.
+        self.assertEqual(User.objects.count(), 0)
+        self.assertEqual(Quiz.objects.count(), 0)
+        self.assertEqual(QueuedMail.objects.count(), 0)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('SMTP server is down.')
+
+
+class RejectingEmailBackend(locmem.EmailBackend):
+    def send_messages(self, email_messages):
+        if any('user1@example.com' in message.to for message in email_messages):
+            raise SMTPRecipientsRefused({'user1@example.com': (550, b'No such user')})
+        return super().send_messages(email_messages)
+
+
+class SendQueuedMailTest(TransactionTestCase):
+    # The worker closes the connections between batches, as in a request.
+
+    def setUp(self):
+        for i in range(3):
+            MailQueue.enqueue('Quiz Test Result', str(i), 'test@gmail.com', [f'user{i}@example.com'])
+
+    def test_send_queued_mail(self):
+        out = StringIO()
+        call_command('send_queued_mail', once=True, batch_size=2, stdout=out)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual([message.to for message in mail.outbox], [['user0@example.com'], ['user1@example.com'], ['user2@example.com']])
+        self.assertEqual(QueuedMail.objects.filter(status=QueuedMail.SENT).count(), 3)
+        self.assertEqual(out.getvalue().splitlines(), ['Sent 2 mails.', 'Sent 1 mails.'])
+
+        # Sent mails are not sent again.
+        call_command('send_queued_mail', once=True, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_send_queued_mail_retry(self):
+        with self.settings(EMAIL_BACKEND='app.tests.test_commands.FailingEmailBackend', QUIZ_MAIL_RETRY_DELAY=60, QUIZ_MAIL_MAX_ATTEMPTS=2):
+            call_command('send_queued_mail', once=True, stdout=StringIO(), stderr=StringIO())
+            queued = QueuedMail.objects.first()
+            self.assertEqual(queued.status, QueuedMail.PENDING)
+            self.assertEqual(queued.attempts, 1)
+            self.assertEqual(queued.error, 'SMTP server is down.')
+            self.assertGreater(queued.next_attempt, timezone.now() + timedelta(seconds=50))
+
+            # Not due yet.
+            self.assertEqual(MailQueue.claim(10), [])
+
+            QueuedMail.objects.update(next_attempt=timezone.now())
+            call_command('send_queued_mail', once=True, stdout=StringIO(), stderr=StringIO())
+            self.assertEqual(QueuedMail.objects.filter(status=QueuedMail.FAILED, attempts=2).count(), 3)
+
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_send_queued_mail_rejected_recipient(self):
+        with self.settings(EMAIL_BACKEND='app.tests.test_commands.RejectingEmailBackend'):
+            call_command('send_queued_mail', once=True, stdout=StringIO(), stderr=StringIO())
+            self.assertEqual([message.to for message in mail.outbox], [['user0@example.com'], ['user2@example.com']])
+            self.assertEqual(QueuedMail.objects.get(recipient='user1@example.com').status, QueuedMail.PENDING)
+
+            # Only the rejected mail is retried.
+            QueuedMail.objects.update(next_attempt=timezone.now())
+            self.assertEqual([queued.recipient for queued in MailQueue.claim(10)], ['user1@example.com'])
+
+    def test_send_queued_mail_lease(self):
+        claimed = MailQueue.claim(2)
+        self.assertEqual(len(claimed), 2)
+        # The mails of a live worker are not claimed by another one.
+        self.assertEqual(len(MailQueue.claim(10)), 1)
+
+        # The worker died, the mails are claimed again once the lease expired.
+        QueuedMail.objects.filter(pk__in=[queued.pk for queued in claimed]).update(next_attempt=timezone.now())
+        call_command('send_queued_mail', once=True, stdout=StringIO())
+        self.assertEqual([message.body for message in mail.outbox], ['0', '1'])
+
+
+class BenchmarkAsgiTest(TransactionTestCase):
+    # The WSGI connections are served by other threads, which only see committed data.
+
+    def setUp(self):
+        cache.clear()
+
+    def test_benchmark_asgi(self):
+        out = StringIO()
+        call_command('benchmark_asgi', requests=10, concurrency=2, questions=2, stdout=out)
+        report = json.loads(out.getvalue())
+        for interface in ('wsgi', 'asgi'):
+            self.assertEqual(report['interfaces'][interface]['requests'], 10)
+            self.assertEqual(report['interfaces'][interface]['errors'], 0)
+            self.assertEqual(report['interfaces'][interface]['operations']['submit']['count'], 2)
+        # The seeded data is deleted afterwards.
+        self.assertEqual(Quiz.objects.count(), 0)
+        self.assertEqual(QuizTestResult.objects.count(), 0)
+        self.assertEqual(QueuedMail.objects.count(), 0)
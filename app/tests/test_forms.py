@@ -1,6 +1,11 @@
+import threading
+
 import mixer
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
 from app.forms import *
+from app.grading import AnswerKey
 from app.models import *
 
 
@@ -112,3 +117,140 @@ class AnonymousUserFormTest(TestCase):
         }
         form = AnonymousUserForm(data=data)
         self.assertFalse(form.is_valid())
+
+
+class QuizTestFormTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+        self.quiz = Quiz.objects.create(title='Test', author=self.user)
+        self.question1 = Question.objects.create(quiz=self.quiz, question='Question 1')
+        self.choice1 = QuestionChoice.objects.create(question=self.question1, choice='Choice 1', is_correct=True)
+        self.choice2 = QuestionChoice.objects.create(question=self.question1, choice='Choice 2')
+        self.question2 = Question.objects.create(quiz=self.quiz, question='Question 2')
+        self.choice3 = QuestionChoice.objects.create(question=self.question2, choice='Choice 3')
+        self.choice4 = QuestionChoice.objects.create(question=self.question2, choice='Choice 4', is_correct=True)
+
+    def setUp(self):
+        # Cached answer keys outlive the rolled back test transactions.
+        cache.clear()
+
+    def test_answer_key(self):
+        answer_key = AnswerKey.get(self.quiz.pk)
+        self.assertEqual(answer_key, {self.question1.pk: frozenset([self.choice1.pk]), self.question2.pk: frozenset([self.choice4.pk])})
+
+        with self.assertNumQueries(0):
+            AnswerKey.get(self.quiz.pk)
+
+    def test_answer_key_invalidated_on_change(self):
+        AnswerKey.get(self.quiz.pk)
+        self.choice2.is_correct = True
+        self.choice2.save()
+        self.assertEqual(AnswerKey.get(self.quiz.pk)[self.question1.pk], frozenset([self.choice1.pk, self.choice2.pk]))
+
+        self.question2.delete()
+        self.assertEqual(list(AnswerKey.get(self.quiz.pk)), [self.question1.pk])
+
+    def test_grade(self):
+        answer_key = AnswerKey.get(self.quiz.pk)
+        self.assertEqual(AnswerKey.grade(answer_key, {self.question1.pk: [self.choice1.pk], self.question2.pk: [self.choice4.pk]}), 2)
+        self.assertEqual(AnswerKey.grade(answer_key, {self.question1.pk: [self.choice1.pk, self.choice2.pk], self.question2.pk: [self.choice4.pk]}), 1)
+
+    def test_quiz_structure_cached(self):
+        QuizTestForm(self.quiz.pk)
+        data = {str(self.question1.pk): [self.choice1.pk], str(self.question2.pk): [self.choice3.pk, self.choice4.pk]}
+        with self.assertNumQueries(0):
+            form = QuizTestForm(self.quiz.pk, data=data)
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.fields[str(self.question1.pk)].label, self.question1.question)
+        self.assertEqual(form.cleaned_data[str(self.question2.pk)], [self.choice3.pk, self.choice4.pk])
+
+    def test_quiz_structure_invalidated_on_change(self):
+        QuizTestForm(self.quiz.pk)
+        self.choice1.choice = 'Changed'
+        self.choice1.save()
+        form = QuizTestForm(self.quiz.pk)
+        self.assertIn((self.choice1.pk, 'Changed'), form.fields[str(self.question1.pk)].choices)
+
+    def test_invalid_choice(self):
+        data = {str(self.question1.pk): [self.choice3.pk], str(self.question2.pk): [self.choice3.pk]}
+        form = QuizTestForm(self.quiz.pk, data=data)
+        self.assertFalse(form.is_valid())
+        self.assertIn(str(self.question1.pk), form.errors)
+
+    def test_check_correct_answers(self):
+        data = {str(self.question1.pk): [self.choice1.pk], str(self.question2.pk): [self.choice3.pk]}
+        form = QuizTestForm(self.quiz.pk, data=data)
+        self.assertTrue(form.is_valid())
+
+        AnswerKey.get(self.quiz.pk)
+        with self.assertNumQueries(0):
+            answers, score = form.check_correct_answers(self.quiz.pk)
+        self.assertEqual(score, 1)
+        self.assertEqual(answers[self.question1.pk]['selected'], [self.choice1.pk])
+
+    def test_save_answers(self):
+        data = {str(self.question1.pk): [self.choice1.pk, self.choice2.pk], str(self.question2.pk): [self.choice4.pk]}
+        form = QuizTestForm(self.quiz.pk, data=data)
+        self.assertTrue(form.is_valid())
+
+        answers, score = form.check_correct_answers(self.quiz.pk)
+        result = QuizTestResult.objects.create(user=self.user, quiz=self.quiz, score=score)
+        # Savepoint, a single INSERT and the savepoint release.
+        with self.assertNumQueries(3):
+            form.save_answers(result, answers)
+        self.assertEqual(result.results_answers.count(), 3)
+
+    def test_save_packed(self):
+        data = {str(self.question1.pk): [self.choice1.pk, self.choice2.pk], str(self.question2.pk): [self.choice4.pk]}
+        form = QuizTestForm(self.quiz.pk, data=data)
+        self.assertTrue(form.is_valid())
+        with self.settings(QUIZ_ANSWER_STORAGE='packed'):
+            result = form.save(self.quiz.pk, self.user)
+
+        result = QuizTestResult.objects.get(pk=result.pk)
+        self.assertEqual(result.score, 1)
+        self.assertEqual(result.results_answers.count(), 0)
+        # One bit per choice of the quiz.
+        self.assertEqual(bytes(result.packed_answers), bytes([0b1011]))
+        self.assertEqual(result.get_selected_choice_ids(), {self.choice1.pk, self.choice2.pk, self.choice4.pk})
+        self.assertEqual([(answer.question_id, answer.choice_id) for answer in result.get_answers()],
+                         [(self.question1.pk, self.choice1.pk), (self.question1.pk, self.choice2.pk), (self.question2.pk, self.choice4.pk)])
+        self.assertEqual(result.get_answers()[0].choice, self.choice1)
+
+
+class AnswerKeyCommitTest(TransactionTestCase):
+    # The concurrent request is served by another thread, on a connection of its own.
+
+    def setUp(self):
+        cache.clear()
+        self.quiz = Quiz.objects.create(title='Test', author=create_user())
+        self.question = Question.objects.create(quiz=self.quiz, question='Question 1')
+        self.choice1 = QuestionChoice.objects.create(question=self.question, choice='Choice 1', is_correct=True)
+        self.choice2 = QuestionChoice.objects.create(question=self.question, choice='Choice 2')
+
+    def concurrent_get(self):
+        answer_keys = []
+
+        def get():
+            try:
+                answer_keys.append(AnswerKey.get(self.quiz.pk))
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=get)
+        thread.start()
+        thread.join()
+        return answer_keys[0]
+
+    def test_answer_key_rebuilt_after_commit(self):
+        with transaction.atomic():
+            self.choice1.is_correct = False
+            self.choice1.save()
+            self.choice2.is_correct = True
+            self.choice2.save()
+            # Before the commit, a concurrent request caches the old key under the bumped version.
+            self.assertEqual(self.concurrent_get(), {self.question.pk: frozenset([self.choice1.pk])})
+
+        self.assertEqual(AnswerKey.get(self.quiz.pk), {self.question.pk: frozenset([self.choice2.pk])})
+        self.assertEqual(self.concurrent_get(), {self.question.pk: frozenset([self.choice2.pk])})
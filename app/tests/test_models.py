@@ -1,4 +1,9 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from app.answers import AnswerPacking
 from app.models import *
 
 
@@ -57,6 +62,64 @@ class QuizTest(TestCase):
         quiz_2.refresh_from_db()
         self.assertFalse(quiz_2.is_published)
 
+    def test_quiz_counters(self):
+        question = Question.objects.create(quiz=self.quiz, question='Question1')
+        result = QuizTestResult.objects.create(user=self.user, quiz=self.quiz)
+        self.quiz.refresh_from_db()
+        self.assertEqual((self.quiz.question_count, self.quiz.test_count), (1, 1))
+
+        question.delete()
+        result.delete()
+        self.quiz.refresh_from_db()
+        self.assertEqual((self.quiz.question_count, self.quiz.test_count), (0, 0))
+
+    def test_quiz_save_keeps_counters(self):
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        Question.objects.create(quiz=self.quiz, question='Question1')
+        quiz.publish_quiz()
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.question_count, 1, 'Should not overwrite the counter with the stale value')
+
+    def test_quiz_history_skips_unchanged(self):
+        quiz = Quiz.objects.create(author=self.user, title='Test2', is_published=True)
+        quiz.save()
+        quiz.publish_quiz()
+        self.assertEqual(quiz.history.count(), 1, 'Should not write a revision refreshing the published date')
+        quiz.title = 'Test3'
+        quiz.save()
+        self.assertEqual(list(quiz.history.values_list('title', flat=True)), ['Test3', 'Test2'])
+
+        with self.settings(QUIZ_HISTORY_SKIP_UNCHANGED=False):
+            quiz.save(force_update=True)
+        self.assertEqual(quiz.history.count(), 3)
+
+    def test_quiz_save_unchanged(self):
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        self.assertEqual(quiz.get_dirty_fields(), [])
+        with self.assertNumQueries(0):
+            quiz.save()
+            quiz.unpublish_quiz()
+
+        quiz.publish_quiz()
+        published_date = quiz.published_date
+        with self.assertNumQueries(0):
+            quiz.publish_quiz()
+        self.assertEqual(quiz.published_date, published_date, 'Should not refresh the published date')
+
+    def test_quiz_save_changed_fields(self):
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        # Changed concurrently, not overwritten by the save of the title.
+        Quiz.objects.filter(pk=quiz.pk).update(is_published=True)
+        quiz.title = 'Test2'
+        self.assertEqual(quiz.get_dirty_fields(), ['title'])
+        # The update of the title and the historical row, the latest revision is not read.
+        with self.assertNumQueries(2):
+            quiz.save()
+        self.assertEqual(quiz.get_dirty_fields(), [])
+        quiz.refresh_from_db()
+        self.assertEqual((quiz.title, quiz.is_published), ('Test2', True))
+        self.assertEqual(quiz.history.first().title, 'Test2')
+
 
 class QuestionTest(TestCase):
     @classmethod
@@ -134,3 +197,58 @@ class QuestionTestResultAnswerTest(TestCase):
         self.assertEqual(answer.choice, self.choice1)
         score = self.result.reevaluate_scores()
         self.assertEqual(score,1)
+
+    def test_quiz_test_result_reevaluate_wrong_choice(self):
+        QuizTestResultAnswer.objects.create(quiz_test=self.result, question=self.question, choice=self.choice1)
+        QuizTestResultAnswer.objects.create(quiz_test=self.result, question=self.question, choice=self.choice2)
+        self.assertEqual(self.result.reevaluate_scores(), 0)
+
+    def test_quiz_test_result_reevaluate_packed(self):
+        cache.clear()
+        layout_id, bits = AnswerPacking.layout(self.quiz.pk)
+        self.result.answer_layout_id = layout_id
+        self.result.packed_answers = AnswerPacking.pack(bits, [self.choice1.pk])
+        self.result.save()
+        self.assertEqual(self.result.reevaluate_scores(), 1)
+
+        self.result.packed_answers = AnswerPacking.pack(bits, [self.choice1.pk, self.choice2.pk])
+        self.result.save()
+        self.assertEqual(self.result.reevaluate_scores(), 0)
+
+        # Deleted choices are no longer selected, as their answer rows would be deleted.
+        choice2_pk = self.choice2.pk
+        self.choice2.delete()
+        self.assertEqual(self.result.reevaluate_scores(), 1)
+        self.assertEqual(self.result.get_selected_choice_ids(), {self.choice1.pk, choice2_pk})
+
+        # Layouts are deleted with the quiz and its results.
+        self.quiz.delete()
+        self.assertEqual(AnswerLayout.objects.count(), 0)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite.')
+class IndexTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+        self.quiz = Quiz.objects.create(author=self.user, title='Test')
+        self.question = Question.objects.create(quiz=self.quiz, question='Question1')
+        self.choice = QuestionChoice.objects.create(question=self.question, choice='Choice 1', is_correct=True)
+        QuestionChoice.objects.create(question=self.question, choice='Choice 2')
+        self.result = QuizTestResult.objects.create(user=self.user, quiz=self.quiz)
+        QuizTestResultAnswer.objects.create(quiz_test=self.result, question=self.question, choice=self.choice)
+
+    def test_correct_choices_use_partial_index(self):
+        plan = QuestionChoice.get_correct_choices(self.question.pk).explain()
+        self.assertIn('USING INDEX app_choice_correct_idx', plan)
+
+    def test_answer_key_uses_choice_index(self):
+        plan = Question.objects.filter(quiz_id=self.quiz.pk).values_list('pk', 'question_choice__pk', 'question_choice__is_correct').explain()
+        self.assertIn('USING COVERING INDEX app_choice_question_idx', plan)
+
+    def test_result_answers_use_composite_index(self):
+        plan = QuizTestResultAnswer.objects.filter(quiz_test=self.result, question=self.question).explain()
+        self.assertIn('USING COVERING INDEX app_answer_result_idx (quiz_test_id=? AND question_id=?)', plan)
+
+        plan = QuizTestResultAnswer.objects.filter(quiz_test=self.result).values_list('choice_id', flat=True).explain()
+        self.assertIn('USING COVERING INDEX app_answer_result_idx (quiz_test_id=?)', plan)
@@ -0,0 +1,226 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from app.models import *
+
+# Number of quizzes, questions per quiz, results per quiz and answers per result seeded for each run.
+SIZES = (1, 5, 10)
+
+# Queries run by each view, whatever the size of the data. Session and user lookups included.
+# A (fixed, per question) tuple budgets the views that write a row per question of the quiz.
+QUERY_BUDGETS = {
+    'Index': 4,
+    'QuizList': 4,
+    'UserAuthorQuizList': 4,
+    'QuizCreate': 2,
+    'QuizUpdate': 3,
+    # Unchanged submissions only read, and write no row nor history.
+    'QuizUpdate POST unchanged': 5,
+    'QuizDetail': 6,
+    # The quiz is already published, saving it again writes nothing.
+    'quiz_publish': 3,
+    # One historical row is written per deleted question.
+    'quiz_delete': (14, 1),
+    'QuizLeaderboard': 4,
+    'QuestionCreate': 3,
+    'QuestionCreate POST': 11,
+    'QuestionUpdate': 5,
+    'QuestionUpdate POST unchanged': 4,
+    'QuestionUpdate POST': 12,
+    'question_delete': 10,
+    'QuizTest': 4,
+    'QuizTest POST': 14,
+    'AnonymousUserForm': 2,
+    'AnonymousUserForm POST': 0,
+    'QuizResultList': 3,
+    'quiz_result_export csv': 7,
+    'quiz_result_export xlsx': 7,
+    'quiz_result_export pdf': 7,
+    'quiz_result_export docx': 7,
+    'quiz_result_export_job': 6,
+    'export_job_status': 3,
+    'export_job_download': 3,
+    'UserAuthorQuizTestResultList': 4,
+    'QuizAnalytics': 8,
+    'quiz_analytics': 8,
+    'QuizResultAnswer': 7,
+    'profiling_stats': 2,
+}
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'performance_baselines.json')
+
+# A view fails when slower than its baseline (milliseconds, largest size) times the tolerance plus the slack.
+# The slack absorbs the noise of slow or busy machines on the fastest views.
+TIME_TOLERANCE = 5
+TIME_SLACK_MS = 100
+
+# Set to re-record performance_baselines.json instead of checking against it.
+RECORD_BASELINES = os.environ.get('QUIZ_RECORD_BASELINES') == '1'
+
+
+def create_user():
+    user = User.objects.create_user(username='test', password='test', email='test@example.com', is_staff=True)
+    return user
+
+
+class ViewPerformanceTest(TestCase):
+    """
+    Every view of app/urls.py runs a fixed number of queries, independent of the
+    size of the data, and stays close to its recorded wall time.
+    """
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+
+    def setUp(self):
+        self.export_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(QUIZ_EXPORT_ROOT=self.export_root.name,
+                                               EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+        self.settings_override.enable()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.export_root.cleanup()
+
+    def seed_quiz(self, size):
+        quiz = mixer.blend(Quiz, author=self.user, is_published=True, question_count=0, test_count=0)
+        for question in mixer.cycle(size).blend(Question, quiz=quiz):
+            mixer.cycle(4).blend(QuestionChoice, question=question, is_correct=(mixer.sequence(True, False, False, False)))
+        return quiz
+
+    def seed(self, size):
+        """
+        Seed size quizzes of size questions, the first one with size results of the user.
+        """
+        quizzes = [self.seed_quiz(size) for _ in range(size)]
+        quiz = quizzes[0]
+        questions = list(quiz.questions.prefetch_related('question_choices'))
+        results = mixer.cycle(size).blend(QuizTestResult, quiz=quiz, user=self.user, score=mixer.RANDOM(0, size),
+                                          answer_layout=None, packed_answers=None)
+        for result in results:
+            for question in questions:
+                mixer.blend(QuizTestResultAnswer, quiz_test=result, question=question, choice=question.question_choices.all()[0])
+
+        artifact = os.path.join(self.export_root.name, f'{quiz.pk}.csv')
+        with open(artifact, 'w') as f:
+            f.write('Username,Email,Score,Date\n')
+        job = mixer.blend(ExportJob, quiz=quiz, user=self.user, filetype='csv', status=ExportJob.DONE, artifact=artifact, error='')
+        return quiz, questions, results, job
+
+    def requests(self, size):
+        """
+        Requests to every view of the app against freshly seeded data.
+
+        :return: List of (name, method, url, data).
+        """
+        quiz, questions, results, job = self.seed(size)
+        question = questions[0]
+        # Deleted by the delete views.
+        deleted_quiz = self.seed_quiz(size)
+        deleted_question = self.seed_quiz(size).questions.first()
+
+        question_data = {
+            'quiz': quiz.pk, 'question': 'Question',
+            'choice1': 'A', 'choice2': 'B', 'choice3': 'C', 'choice4': 'D',
+            'is_correct1': 'true', 'is_correct2': 'false', 'is_correct3': 'false', 'is_correct4': 'false',
+        }
+        choices = list(question.question_choices.order_by('pk'))
+        unchanged_question_data = {'quiz': quiz.pk, 'question': question.question}
+        for number, choice in enumerate(choices, 1):
+            unchanged_question_data[f'choice{number}'] = choice.choice
+            unchanged_question_data[f'is_correct{number}'] = 'true' if choice.is_correct else 'false'
+        test_data = {q.pk: [q.question_choices.all()[0].pk] for q in questions}
+        anonymous = {'name': 'Anonymous', 'email': 'anonymous@example.com'}
+
+        requests = [
+            ('Index', 'get', reverse('app:Index'), None),
+            ('QuizList', 'get', reverse('app:QuizList'), None),
+            ('UserAuthorQuizList', 'get', reverse('app:UserAuthorQuizList'), None),
+            ('QuizCreate', 'get', reverse('app:QuizCreate'), None),
+            ('QuizUpdate', 'get', reverse('app:QuizUpdate', kwargs={'quiz_id': quiz.pk}), None),
+            ('QuizDetail', 'get', reverse('app:QuizDetail', kwargs={'quiz_id': quiz.pk}), None),
+            ('quiz_publish', 'get', reverse('app:quiz_publish', kwargs={'quiz_id': quiz.pk}), None),
+            ('QuizUpdate POST unchanged', 'post', reverse('app:QuizUpdate', kwargs={'quiz_id': quiz.pk}),
+             {'title': quiz.title, 'author': self.user.pk}),
+            ('quiz_delete', 'get', reverse('app:quiz_delete', kwargs={'quiz_id': deleted_quiz.pk}), None),
+            ('QuizLeaderboard', 'get', reverse('app:QuizLeaderboard', kwargs={'quiz_id': quiz.pk}), None),
+            # Before the question views change the questions answered by test_data.
+            ('QuizTest', 'get', reverse('app:QuizTest', kwargs={'quiz_id': quiz.pk}), None),
+            ('QuizTest POST', 'post', reverse('app:QuizTest', kwargs={'quiz_id': quiz.pk}), test_data),
+            ('QuestionCreate', 'get', reverse('app:QuestionCreate', kwargs={'quiz_id': quiz.pk}), None),
+            ('QuestionCreate POST', 'post', reverse('app:QuestionCreate', kwargs={'quiz_id': quiz.pk}), question_data),
+            ('QuestionUpdate', 'get', reverse('app:QuestionUpdate', kwargs={'quiz_id': quiz.pk, 'question_id': question.pk}), None),
+            ('QuestionUpdate POST unchanged', 'post', reverse('app:QuestionUpdate', kwargs={'quiz_id': quiz.pk, 'question_id': question.pk}), unchanged_question_data),
+            ('QuestionUpdate POST', 'post', reverse('app:QuestionUpdate', kwargs={'quiz_id': quiz.pk, 'question_id': question.pk}), question_data),
+            ('question_delete', 'get', reverse('app:question_delete', kwargs={'quiz_id': deleted_question.quiz_id, 'question_id': deleted_question.pk}), None),
+            ('AnonymousUserForm', 'get', reverse('app:AnonymousUserForm') + f'?quiz_id={quiz.pk}', None),
+            ('AnonymousUserForm POST', 'post', reverse('app:AnonymousUserForm') + f'?quiz_id={quiz.pk}', anonymous),
+            ('QuizResultList', 'get', reverse('app:QuizResultList'), None),
+        ]
+        for filetype in ('csv', 'xlsx', 'pdf', 'docx'):
+            requests.append((f'quiz_result_export {filetype}', 'get',
+                             reverse('app:quiz_result_export', kwargs={'quiz_id': quiz.pk, 'filetype': filetype}), None))
+        requests += [
+            ('quiz_result_export_job', 'post', reverse('app:quiz_result_export_job', kwargs={'quiz_id': quiz.pk, 'filetype': 'xlsx'}), None),
+            ('export_job_status', 'get', reverse('app:export_job_status', kwargs={'job_id': job.pk}), None),
+            ('export_job_download', 'get', reverse('app:export_job_download', kwargs={'job_id': job.pk}), None),
+            ('UserAuthorQuizTestResultList', 'get', reverse('app:UserAuthorQuizTestResultList', kwargs={'quiz_id': quiz.pk}), None),
+            ('QuizAnalytics', 'get', reverse('app:QuizAnalytics', kwargs={'quiz_id': quiz.pk}), None),
+            ('quiz_analytics', 'get', reverse('app:quiz_analytics', kwargs={'quiz_id': quiz.pk}), None),
+            ('QuizResultAnswer', 'get', reverse('app:QuizResultAnswer', kwargs={'result_id': results[0].pk}), None),
+            ('profiling_stats', 'get', reverse('app:profiling_stats'), None),
+        ]
+        return requests
+
+    def measure(self, method, url, data):
+        """
+        Run the request with a cold cache, consuming streamed content.
+
+        :return: Tuple of number of queries and wall time in milliseconds.
+        """
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(self.client, method)(url, data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+        self.assertLess(response.status_code, 400, url)
+        return len(queries), elapsed
+
+    def test_views(self):
+        timings = dict()
+        for size in SIZES:
+            for name, method, url, data in self.requests(size):
+                queries, elapsed = self.measure(method, url, data)
+                budget = QUERY_BUDGETS[name]
+                if isinstance(budget, tuple):
+                    budget = budget[0] + budget[1] * size
+                with self.subTest(view=name, size=size):
+                    self.assertEqual(queries, budget)
+                timings[name] = elapsed
+
+        self.assertEqual(set(timings), set(QUERY_BUDGETS), 'Every view needs a query budget.')
+
+        if RECORD_BASELINES:
+            with open(BASELINES_PATH, 'w') as f:
+                json.dump({name: round(elapsed, 1) for name, elapsed in sorted(timings.items())}, f, indent=2)
+                f.write('\n')
+            return
+
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+        for name, elapsed in timings.items():
+            with self.subTest(view=name):
+                self.assertIn(name, baselines, 'Record the baselines with QUIZ_RECORD_BASELINES=1.')
+                self.assertLessEqual(elapsed, baselines[name] * TIME_TOLERANCE + TIME_SLACK_MS)
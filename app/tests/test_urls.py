@@ -1,6 +1,8 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse, resolve
 
+from app import async_views, views
+
 
 class IndexTest(TestCase):
     def test_index_url(self):
@@ -29,6 +31,10 @@ class QuizTestUrls(TestCase):
         url = reverse('app:QuizDetail',kwargs={'quiz_id':1})
         self.assertEqual(resolve(url).view_name,'app:QuizDetail')
 
+    def test_quiz_leaderboard_url(self):
+        url = reverse('app:QuizLeaderboard', kwargs={'quiz_id': 1})
+        self.assertEqual(resolve(url).view_name, 'app:QuizLeaderboard')
+
     def test_quiz_delete_url(self):
         url = reverse('app:quiz_delete',kwargs={'quiz_id':1})
         self.assertEqual(resolve(url).func.__name__,'quiz_delete')
@@ -65,6 +71,10 @@ class QuizResultTestUrl(TestCase):
         url = reverse('app:UserAuthorQuizTestResultList', kwargs={'quiz_id': 1})
         self.assertEqual(resolve(url).view_name, 'app:UserAuthorQuizTestResultList')
 
+    def test_quiz_analytics_url(self):
+        url = reverse('app:QuizAnalytics', kwargs={'quiz_id': 1})
+        self.assertEqual(resolve(url).view_name, 'app:QuizAnalytics')
+
     def test_quiz_result_list_export_url(self):
         url = reverse('app:quiz_result_export',kwargs={'quiz_id':1,'filetype':'csv'})
         self.assertEqual(resolve(url).func.__name__, 'quiz_result_export')
@@ -78,3 +88,20 @@ class AnonymousUserFormTestUrl(TestCase):
     def test_anonymous_user_form(self):
         url = reverse('app:AnonymousUserForm')
         assert resolve(url).view_name == 'app:AnonymousUserForm'
+
+
+@override_settings(ROOT_URLCONF='quiz.async_urls')
+class AsyncUrlsTest(TestCase):
+    def test_async_views_url(self):
+        for name, kwargs in (('Index', {}), ('QuizList', {}), ('QuizDetail', {'quiz_id': 1}), ('QuizTest', {'quiz_id': 1})):
+            match = resolve(reverse(f'app:{name}', kwargs=kwargs))
+            self.assertEqual(match.view_name, f'app:{name}')
+            self.assertIs(match.func.view_class, getattr(async_views, name))
+        match = resolve(reverse('app:quiz_result_export', kwargs={'quiz_id': 1, 'filetype': 'csv'}))
+        self.assertIs(match.func, async_views.quiz_result_export)
+        self.assertIs(resolve('/').func.view_class, async_views.Index)
+
+    def test_sync_views_url(self):
+        match = resolve(reverse('app:QuizCreate'))
+        self.assertEqual(match.view_name, 'app:QuizCreate')
+        self.assertIs(match.func.view_class, views.QuizCreate)
@@ -1,6 +1,26 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 
+from app import async_views, profiling
+from app.jobs import ExportQueue
+from app.leaderboard import Leaderboard
 from app.models import *
 from app.views import *
 
@@ -16,6 +36,9 @@ class IndexTest(TestCase):
         self.index_url = reverse('app:Index')
         self.user = create_user()
 
+    def setUp(self):
+        cache.clear()
+
     def test_index(self):
         response = self.client.get(self.index_url)
         self.assertEqual(response.resolver_match.func.__name__, Index.as_view().__name__)
@@ -43,6 +66,60 @@ class IndexTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context['quizzes']), Quiz.objects.filter(is_published=True).count())
 
+    def test_index_cached_for_anonymous(self):
+        quiz = Quiz.objects.create(title='Hello', author=self.user, is_published=True)
+        self.client.get(self.index_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.index_url)
+        self.assertContains(response, 'Hello')
+
+        quiz.title = 'Changed'
+        quiz.save()
+        self.assertContains(self.client.get(self.index_url), 'Changed')
+        quiz.unpublish_quiz()
+        self.assertNotContains(self.client.get(self.index_url), 'Changed')
+
+    def test_index_not_cached_for_users(self):
+        self.client.login(username='test', password='test')
+        self.client.get(self.index_url)
+        response = self.client.get(self.index_url)
+        self.assertEqual('quizzes' in response.context, True)
+
+    def test_index_cached_in_file_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+            with self.settings(CACHES={'default': backend}):
+                Quiz.objects.create(title='Hello', author=self.user, is_published=True)
+                self.client.get(self.index_url)
+                with self.assertNumQueries(0):
+                    response = self.client.get(self.index_url)
+                self.assertContains(response, 'Hello')
+                Quiz.objects.create(title='World', author=self.user, is_published=True)
+                self.assertContains(self.client.get(self.index_url), 'World')
+
+    def test_index_not_modified(self):
+        Quiz.objects.create(title='Hello', author=self.user, is_published=True)
+        etag = self.client.get(self.index_url)['ETag']
+        # Answered from the cached page.
+        with self.assertNumQueries(0):
+            response = self.client.get(self.index_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Session, user and validators, the page is not rendered.
+        self.client.login(username='test', password='test')
+        response = self.client.get(self.index_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(3):
+            response = self.client.get(self.index_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+
+        Quiz.objects.create(title='World', author=self.user, is_published=True)
+        response = self.client.get(self.index_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'World')
+
 
 class QuizCreateTest(TestCase):
     @classmethod
@@ -112,6 +189,9 @@ class QuizListTest(TestCase):
         self.user = create_user()
         self.quiz_list_url = reverse('app:QuizList')
 
+    def setUp(self):
+        cache.clear()
+
     def test_quiz_list(self):
         response = self.client.get(self.quiz_list_url)
         self.assertEqual(response.resolver_match.func.__name__, QuizList.as_view().__name__)
@@ -143,6 +223,20 @@ class QuizListTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context['quizzes']), Quiz.objects.filter(is_published=True, question__isnull=False).count())
 
+    def test_quiz_list_not_modified(self):
+        quiz = Quiz.objects.create(title='Hello', author=self.user, is_published=True)
+        response = self.client.get(self.quiz_list_url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.client.get(self.quiz_list_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # A question makes the quiz listed.
+        etag = response['ETag']
+        Question.objects.create(quiz=quiz, question='Hi')
+        response = self.client.get(self.quiz_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
 
 class QuizDetailTest(TestCase):
     @classmethod
@@ -150,6 +244,9 @@ class QuizDetailTest(TestCase):
         self.user = create_user()
         self.quiz = Quiz.objects.create(title='Hello', author=self.user)
 
+    def setUp(self):
+        cache.clear()
+
     def test_quiz_detail(self):
         url = reverse('app:QuizDetail', kwargs={'quiz_id': self.quiz.id})
         response = self.client.get(url)
@@ -168,6 +265,79 @@ class QuizDetailTest(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 404)
 
+    def test_quiz_detail_queries(self):
+        # Testing that the number of queries does not grow with the questions.
+        url = reverse('app:QuizDetail', kwargs={'quiz_id': self.quiz.id})
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+        for i in range(3):
+            question = Question.objects.create(quiz=self.quiz, question=f'Question {i}')
+            QuestionChoice.objects.create(question=question, choice='Choice 1', is_correct=True)
+            QuestionChoice.objects.create(question=question, choice='Choice 2')
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, 'Question 2')
+
+    def test_quiz_detail_question_fragments(self):
+        question = Question.objects.create(quiz=self.quiz, question='Question 1')
+        choice = QuestionChoice.objects.create(question=question, choice='Choice 1', is_correct=True)
+        url = reverse('app:QuizDetail', kwargs={'quiz_id': self.quiz.id})
+        self.client.login(username='test', password='test')
+        self.client.get(url)
+        # Session, user, validators and quiz, the question blocks come from the cache.
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, 'Choice 1')
+
+        choice.choice = 'Changed'
+        choice.save()
+        self.assertContains(self.client.get(url), 'Changed')
+
+        # The edit buttons are only cached for the author of an unpublished quiz.
+        self.assertContains(self.client.get(url), 'Edit</a>', count=2)
+        self.quiz.publish_quiz()
+        self.assertContains(self.client.get(url), 'Edit</a>', count=0)
+
+    def test_quiz_detail_not_modified(self):
+        question = Question.objects.create(quiz=self.quiz, question='Question 1')
+        url = reverse('app:QuizDetail', kwargs={'quiz_id': self.quiz.id})
+        self.client.login(username='test', password='test')
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+
+        # Session, user and validators, the quiz is not loaded.
+        with self.assertNumQueries(3):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Only the ETag covers the counters, a modification date alone never revalidates the page.
+        Quiz.objects.filter(pk=self.quiz.pk).update(test_count=1)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp()))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # The page differs for anonymous visitors.
+        self.client.logout()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.client.login(username='test', password='test')
+        question.question = 'Changed'
+        question.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Changed')
+
+        # Pages with pending messages are always rendered.
+        empty = Quiz.objects.create(title='Empty', author=self.user)
+        url = reverse('app:QuizDetail', kwargs={'quiz_id': empty.id})
+        etag = self.client.get(url)['ETag']
+        self.client.get(reverse('app:quiz_publish', kwargs={'quiz_id': empty.id}))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Please add questions to publish.')
+        self.assertFalse(response.has_header('ETag'))
+
 
 class UserAuthorQuizListTest(TestCase):
     @classmethod
@@ -341,6 +511,27 @@ class QuestionUpdateTest(TestCase):
         self.assertRedirects(response, reverse_lazy('app:QuizDetail', kwargs={'quiz_id': self.quiz.pk}), 302, 200)
         self.assertEqual(self.quiz.questions.count(), 1)
 
+    def test_question_update_post_unchanged(self):
+        self.client.login(username='test', password='test')
+        data = {
+            'quiz': self.quiz.pk,
+            'question': 'Question1',
+            'choice1': 'Choice 1', 'choice2': 'Choice 2', 'choice3': 'Choice 3', 'choice4': 'Choice 4',
+            'is_correct1': 'true', 'is_correct2': 'false', 'is_correct3': 'false', 'is_correct4': 'false'
+        }
+        modified = Question.objects.get(pk=self.question.pk).modified
+        response = self.client.post(self.question_update_url, data)
+        self.assertRedirects(response, reverse_lazy('app:QuizDetail', kwargs={'quiz_id': self.quiz.pk}), 302, 200)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).modified, modified)
+        self.assertEqual(self.question.history.count(), 1)
+
+        # A change of the choices alone touches the question, whose modified the quiz pages are validated with.
+        data['is_correct2'] = 'true'
+        self.client.post(self.question_update_url, data)
+        self.assertGreater(Question.objects.get(pk=self.question.pk).modified, modified)
+        self.assertTrue(QuestionChoice.objects.get(pk=self.choice2.pk).is_correct)
+        self.assertEqual(self.question.history.count(), 1)
+
     def test_question_update_post_with_no_correct_choice(self):
         self.client.login(username='test', password='test')
         data = {
@@ -454,6 +645,19 @@ class QuizTestTest(TestCase):
         response = self.client.post(self.form_url + '?anonymous=' + str(True) + '&name=' + query_param['name'] + '&email=' + query_param['email'], data)
         self.assertEqual(response.status_code, 302)
 
+    def test_quiz_test_post_queues_mail(self):
+        data = {
+            self.question.pk: [self.choice1.pk]
+        }
+        response = self.client.post(self.form_url + '?anonymous=True&name=Ashin&email=ashin@gmail.com', data)
+        self.assertEqual(response.status_code, 302)
+        # The request never sends the mail itself.
+        self.assertEqual(len(mail.outbox), 0)
+        queued = QueuedMail.objects.get()
+        self.assertEqual(queued.recipient, 'ashin@gmail.com')
+        self.assertEqual(queued.message, '1')
+        self.assertEqual(queued.status, QueuedMail.PENDING)
+
     def test_quiz_test_post_login(self):
         data = {
             self.question.pk: [self.choice1.pk]
@@ -488,6 +692,33 @@ class QuizResultListTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context['results']), QuizTestResult.objects.filter(user=self.user).count())
 
+    def test_quiz_list_cursor_pages(self):
+        quiz = Quiz.objects.create(title='Quiz 1', author=self.user)
+        QuizTestResult.objects.bulk_create([QuizTestResult(quiz=quiz, user=self.user, score=i) for i in range(30)])
+        # Results created at the same time are ordered by id.
+        QuizTestResult.objects.filter(score__lt=10).update(created=timezone.now())
+        expected = list(QuizTestResult.objects.filter(user=self.user).order_by('-created', '-pk').values_list('pk', flat=True))
+        self.client.login(username='test', password='test')
+
+        pages = []
+        response = self.client.get(self.quiz_list_url)
+        pages.append([result.pk for result in response.context['results']])
+        while response.context['page_obj'].has_next:
+            response = self.client.get(self.quiz_list_url, {'cursor': response.context['page_obj'].next_cursor})
+            pages.append([result.pk for result in response.context['results']])
+        self.assertEqual([len(page) for page in pages], [12, 12, 6])
+        self.assertEqual(sum(pages, []), expected)
+
+        response = self.client.get(self.quiz_list_url, {'cursor': response.context['page_obj'].previous_cursor})
+        self.assertEqual([result.pk for result in response.context['results']], pages[1])
+        self.assertTrue(response.context['page_obj'].has_next)
+        self.assertTrue(response.context['page_obj'].has_previous)
+
+    def test_quiz_list_invalid_cursor(self):
+        self.client.login(username='test', password='test')
+        response = self.client.get(self.quiz_list_url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
 
 class UserAuthorQuizTestResultListTest(TestCase):
     @classmethod
@@ -547,6 +778,181 @@ class QuizResultExportTest(TestCase):
         response = self.client.get(self.export_pdf)
         self.assertEqual(response.resolver_match.func.__name__, quiz_result_export.__name__)
 
+    def test_quiz_result_export_not_modified(self):
+        QuizTestResult.objects.create(quiz=self.quiz, user=self.user, score=3)
+        self.client.login(username='test', password='test')
+        etag = self.client.get(self.export_csv)['ETag']
+        response = self.client.get(self.export_csv, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get(self.export_xlsx)['ETag'], etag)
+
+        QuizTestResult.objects.create(quiz=self.quiz, user=None, score=1)
+        self.assertEqual(self.client.get(self.export_csv, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_quiz_result_export_csv(self):
+        QuizTestResult.objects.create(quiz=self.quiz, user=self.user, score=3)
+        QuizTestResult.objects.create(quiz=self.quiz, user=None, score=1)
+        self.client.login(username='test', password='test')
+        response = self.client.get(self.export_csv)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Username,Email,Score,Date')
+        self.assertTrue(lines[1].startswith('test,,3,'))
+        self.assertTrue(lines[2].startswith(',,1,'))
+
+    def test_quiz_result_export_pdf_chunks(self):
+        for score in range(3):
+            QuizTestResult.objects.create(quiz=self.quiz, user=self.user, score=score)
+        self.client.login(username='test', password='test')
+        # The request renders the chunks itself, without a pool of processes.
+        with self.settings(QUIZ_PDF_CHUNK_ROWS=1, QUIZ_PDF_WORKERS=2), \
+                mock.patch('app.pdf.ProcessPoolExecutor', side_effect=AssertionError):
+            response = self.client.get(self.export_pdf)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_quiz_result_export_office(self):
+        QuizTestResult.objects.create(quiz=self.quiz, user=self.user, score=3)
+        self.client.login(username='test', password='test')
+
+        response = self.client.get(self.export_xlsx)
+        package = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(package.testzip())
+        sheet = package.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('<t xml:space="preserve">test</t>', sheet)
+        self.assertIn('<v>3</v>', sheet)
+
+        response = self.client.get(self.export_docx)
+        package = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIn('Quiz 1', package.read('word/document.xml').decode())
+
+
+class ExportJobTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+        self.quiz = Quiz.objects.create(title='Quiz 1', author=self.user)
+        QuizTestResult.objects.create(quiz=self.quiz, user=self.user, score=3)
+        self.job_url = reverse('app:quiz_result_export_job', kwargs={'quiz_id': self.quiz.pk, 'filetype': 'csv'})
+
+    def setUp(self):
+        self.export_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(QUIZ_EXPORT_ROOT=self.export_root.name)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.export_root.cleanup()
+
+    def test_export_job_when_no_login(self):
+        response = self.client.post(self.job_url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(ExportJob.objects.count(), 0)
+
+    def test_export_job(self):
+        self.client.login(username='test', password='test')
+        response = self.client.post(self.job_url)
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('app:export_job_status', kwargs={'job_id': job.pk}), 302, 200)
+        self.assertEqual(self.client.get(response.url).json()['status'], ExportJob.PENDING)
+
+        # Queueing the same export again reuses the job.
+        self.client.post(self.job_url)
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+        ExportQueue.claim(1)
+        ExportQueue.run(job.pk)
+        data = self.client.get(response.url).json()
+        self.assertEqual(data['status'], ExportJob.DONE)
+
+        response = self.client.get(data['download_url'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'Username,Email,Score,Date'))
+
+        # The synchronous export is served from the cached file.
+        response = self.client.get(reverse('app:quiz_result_export', kwargs={'quiz_id': self.quiz.pk, 'filetype': 'csv'}))
+        self.assertIsInstance(response, FileResponse)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'Username,Email,Score,Date'))
+
+    def test_export_job_after_new_result(self):
+        self.client.login(username='test', password='test')
+        self.client.post(self.job_url)
+        ExportQueue.run(ExportJob.objects.get().pk)
+
+        QuizTestResult.objects.create(quiz=self.quiz, user=self.user, score=1)
+        self.client.post(self.job_url)
+        job = ExportJob.objects.latest('pk')
+        self.assertEqual(job.status, ExportJob.PENDING)
+
+        job = ExportQueue.run(job.pk)
+        self.assertEqual(os.listdir(os.path.dirname(job.artifact)), [os.path.basename(job.artifact)])
+
+    def test_export_job_after_reevaluation(self):
+        self.client.login(username='test', password='test')
+        self.client.post(self.job_url)
+        ExportQueue.run(ExportJob.objects.get().pk)
+
+        # The same results with re-evaluated scores are exported again.
+        QuizTestResult.objects.filter(quiz=self.quiz).update(score=1)
+        export_url = reverse('app:quiz_result_export', kwargs={'quiz_id': self.quiz.pk, 'filetype': 'csv'})
+        self.assertNotIsInstance(self.client.get(export_url), FileResponse)
+        self.client.post(self.job_url)
+        self.assertEqual(ExportJob.objects.latest('pk').status, ExportJob.PENDING)
+        job = ExportQueue.run(ExportJob.objects.latest('pk').pk)
+        with open(job.artifact) as f:
+            self.assertTrue(f.read().splitlines()[1].startswith('test,,1,'))
+
+    def test_export_job_after_deletion(self):
+        zero = QuizTestResult.objects.create(quiz=self.quiz, user=self.user, score=0)
+        QuizTestResult.objects.create(quiz=self.quiz, user=self.user, score=2)
+        self.client.login(username='test', password='test')
+        self.client.post(self.job_url)
+        ExportQueue.run(ExportJob.objects.get().pk)
+
+        # Deleting a result scored 0 leaves the latest result and the total score unchanged.
+        zero.delete()
+        export_url = reverse('app:quiz_result_export', kwargs={'quiz_id': self.quiz.pk, 'filetype': 'csv'})
+        self.assertNotIsInstance(self.client.get(export_url), FileResponse)
+        self.client.post(self.job_url)
+        self.assertEqual(ExportJob.objects.latest('pk').status, ExportJob.PENDING)
+        job = ExportQueue.run(ExportJob.objects.latest('pk').pk)
+        with open(job.artifact) as f:
+            self.assertEqual(len(f.read().splitlines()), 3)
+
+    def test_export_job_lease(self):
+        job = ExportQueue.enqueue(self.quiz, 'csv', self.user)
+        self.assertEqual(ExportQueue.claim(10), [job.pk])
+        # The job of a live worker is not claimed by another one.
+        self.assertEqual(ExportQueue.claim(10), [])
+
+        # The worker died, the job is claimed again once the lease expired.
+        ExportJob.objects.filter(pk=job.pk).update(modified=timezone.now() - timedelta(seconds=settings.QUIZ_EXPORT_LEASE_TIMEOUT + 1))
+        self.assertEqual(ExportQueue.enqueue(self.quiz, 'csv', self.user), job)
+        self.assertEqual(ExportQueue.claim(10), [job.pk])
+
+    def test_export_job_artifact_pruned(self):
+        self.client.login(username='test', password='test')
+        self.client.post(self.job_url)
+        job = ExportQueue.run(ExportJob.objects.get().pk)
+        os.remove(job.artifact)
+
+        # Removed after the lookup, the export is streamed from the database.
+        with mock.patch.object(ExportQueue, 'cached_artifact', return_value=job.artifact):
+            response = self.client.get(reverse('app:quiz_result_export', kwargs={'quiz_id': self.quiz.pk, 'filetype': 'csv'}))
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'Username,Email,Score,Date'))
+
+        response = self.client.get(reverse('app:export_job_download', kwargs={'job_id': job.pk}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_job_pdf_chunks(self):
+        QuizTestResult.objects.create(quiz=self.quiz, user=self.user, score=1)
+        job = ExportQueue.enqueue(self.quiz, 'pdf', self.user)
+        # The worker renders the chunks in a pool of processes.
+        with self.settings(QUIZ_PDF_CHUNK_ROWS=1, QUIZ_PDF_WORKERS=2):
+            job = ExportQueue.run(job.pk)
+        self.assertEqual(job.status, ExportJob.DONE)
+        with open(job.artifact, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+
 
 class QuizResultAnswerTest(TestCase):
     @classmethod
@@ -568,3 +974,337 @@ class QuizResultAnswerTest(TestCase):
         self.assertEqual('result' in response.context, True)
         self.assertEqual('answers' in response.context, True)
         self.assertTemplateUsed(response, 'app/quiz/quiz_result_answer.html')
+
+    def test_quiz_result_answer_selected(self):
+        self.client.login(username='test', password='test')
+        question = Question.objects.create(quiz=self.quiz, question='Question')
+        choice = QuestionChoice.objects.create(question=question, choice='Choice 1', is_correct=True)
+        QuizTestResultAnswer.objects.create(quiz_test=self.result, question=question, choice=choice)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.quiz_result_answer_url)
+
+        # Testing that the number of queries does not grow with the questions and answers.
+        for i in range(3):
+            question = Question.objects.create(quiz=self.quiz, question=f'Question {i}')
+            choice = QuestionChoice.objects.create(question=question, choice='Choice 1', is_correct=True)
+            QuestionChoice.objects.create(question=question, choice='Choice 2')
+            QuizTestResultAnswer.objects.create(quiz_test=self.result, question=question, choice=choice)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(self.quiz_result_answer_url)
+        self.assertContains(response, '(Selected)', count=4)
+
+
+class QuizLeaderboardTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+        self.other_user = User.objects.create_user(username='other', password='test')
+        self.quiz = Quiz.objects.create(title='Quiz 1', author=self.user, is_published=True)
+        self.question = Question.objects.create(quiz=self.quiz, question='Question 1')
+        self.choice1 = QuestionChoice.objects.create(question=self.question, choice='Choice 1', is_correct=True)
+        self.choice2 = QuestionChoice.objects.create(question=self.question, choice='Choice 2')
+        self.leaderboard_url = reverse('app:QuizLeaderboard', kwargs={'quiz_id': self.quiz.pk})
+
+    def setUp(self):
+        cache.clear()
+
+    def take_test(self, user, choice):
+        form = QuizTestForm(self.quiz.pk, data={str(self.question.pk): [choice.pk]})
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            return form.save(self.quiz.pk, user)
+
+    def test_leaderboard(self):
+        self.take_test(self.user, self.choice2)
+        self.take_test(self.other_user, self.choice1)
+        response = self.client.get(self.leaderboard_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'app/quiz/quiz_leaderboard.html')
+        self.assertEqual([(entry['rank'], entry['username'], entry['score']) for entry in response.context['entries']],
+                         [(1, 'other', 1), (2, 'test', 0)])
+
+    def test_leaderboard_record(self):
+        with self.settings(QUIZ_LEADERBOARD_SIZE=2):
+            self.take_test(self.user, self.choice2)
+            self.take_test(self.user, self.choice2)
+            Leaderboard.get(self.quiz.pk)
+            # Later ties of the weakest entry do not enter the full leaderboard, which stays cached.
+            self.take_test(self.other_user, self.choice2)
+            with self.assertNumQueries(0):
+                Leaderboard.top(self.quiz.pk)
+
+            # A better result drops it, the rebuilt leaderboard evicts the weakest entry.
+            best = self.take_test(self.other_user, self.choice1)
+            with self.assertNumQueries(1):
+                entries = Leaderboard.top(self.quiz.pk)
+        self.assertEqual([entry['score'] for entry in entries], [1, 0])
+        self.assertEqual(entries[0]['result'], best.pk)
+
+    def test_leaderboard_rebuilt_after_result_delete(self):
+        result = self.take_test(self.other_user, self.choice1)
+        self.take_test(self.user, self.choice2)
+        Leaderboard.get(self.quiz.pk)
+        result.delete()
+        self.assertEqual([entry['username'] for entry in Leaderboard.top(self.quiz.pk)], ['test'])
+
+    def test_rank(self):
+        results = [self.take_test(self.user, self.choice2), self.take_test(self.user, self.choice1),
+                   self.take_test(self.user, self.choice2), self.take_test(self.user, self.choice1)]
+        self.assertEqual([Leaderboard.rank(result) for result in results], [3, 1, 4, 2])
+
+        self.client.login(username='test', password='test')
+        response = self.client.get(reverse('app:QuizResultAnswer', kwargs={'result_id': results[2].pk}))
+        self.assertContains(response, 'Rank : 4 of 4')
+
+
+class QuizAnalyticsTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+        self.other_user = User.objects.create_user(username='other', password='test')
+        self.quiz = Quiz.objects.create(title='Quiz 1', author=self.user)
+        self.question1 = Question.objects.create(quiz=self.quiz, question='Question 1')
+        self.choice1 = QuestionChoice.objects.create(question=self.question1, choice='Choice 1', is_correct=True)
+        self.choice2 = QuestionChoice.objects.create(question=self.question1, choice='Choice 2')
+        self.question2 = Question.objects.create(quiz=self.quiz, question='Question 2')
+        self.choice3 = QuestionChoice.objects.create(question=self.question2, choice='Choice 3', is_correct=True)
+        self.choice4 = QuestionChoice.objects.create(question=self.question2, choice='Choice 4')
+        self.analytics_url = reverse('app:QuizAnalytics', kwargs={'quiz_id': self.quiz.pk})
+        self.analytics_json_url = reverse('app:quiz_analytics', kwargs={'quiz_id': self.quiz.pk})
+
+    def setUp(self):
+        cache.clear()
+
+    def take_test(self, choices, storage='rows'):
+        data = {str(self.question1.pk): [choices[0].pk], str(self.question2.pk): [choices[1].pk]}
+        form = QuizTestForm(self.quiz.pk, data=data)
+        self.assertTrue(form.is_valid())
+        with self.settings(QUIZ_ANSWER_STORAGE=storage):
+            return form.save(self.quiz.pk, self.user)
+
+    def test_analytics_when_not_author(self):
+        self.client.login(username='other', password='test')
+        self.assertEqual(self.client.get(self.analytics_url).status_code, 404)
+        self.assertEqual(self.client.get(self.analytics_json_url).status_code, 404)
+
+    def test_analytics_without_attempts(self):
+        self.client.login(username='test', password='test')
+        analytics = self.client.get(self.analytics_json_url).json()
+        self.assertEqual(analytics['attempts'], 0)
+        self.assertEqual(analytics['score']['distribution'], [0, 0, 0])
+        self.assertEqual([question['difficulty'] for question in analytics['questions']], [0, 0])
+
+    def test_analytics_of_rows_and_packed_answers(self):
+        self.take_test((self.choice1, self.choice3))
+        self.take_test((self.choice1, self.choice4))
+        self.take_test((self.choice2, self.choice4), storage='packed')
+        self.take_test((self.choice1, self.choice3), storage='packed')
+
+        self.client.login(username='test', password='test')
+        response = self.client.get(self.analytics_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'app/quiz/quiz_analytics.html')
+
+        analytics = self.client.get(self.analytics_json_url).json()
+        self.assertEqual(analytics['attempts'], 4)
+        self.assertEqual(analytics['score']['distribution'], [1, 1, 2])
+        self.assertEqual(analytics['score']['mean'], 1.25)
+        question1, question2 = analytics['questions']
+        self.assertEqual((question1['difficulty'], question2['difficulty']), (0.75, 0.5))
+        # The best attempt answers both questions correctly, the worst none.
+        self.assertEqual((question1['discrimination'], question2['discrimination']), (1, 1))
+        self.assertEqual([(choice['id'], choice['count'], choice['popularity']) for choice in question1['choices']],
+                         [(self.choice1.pk, 3, 0.75), (self.choice2.pk, 1, 0.25)])
+        self.assertEqual([choice['is_correct'] for choice in question2['choices']], [True, False])
+
+    def test_analytics_cached_until_new_attempt(self):
+        self.take_test((self.choice1, self.choice3))
+        self.client.login(username='test', password='test')
+        self.client.get(self.analytics_json_url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.analytics_json_url)
+        self.assertNotIn('app_quiztestresultanswer', ' '.join(query['sql'] for query in queries))
+
+        self.take_test((self.choice2, self.choice3))
+        analytics = self.client.get(self.analytics_json_url).json()
+        self.assertEqual(analytics['attempts'], 2)
+        self.assertEqual(analytics['questions'][0]['difficulty'], 0.5)
+
+
+class ProfilingTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.profiling_url = reverse('app:profiling_stats')
+        self.user = create_user()
+        self.staff = User.objects.create_user(username='staff', password='test', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        profiling.buffer.samples.clear()
+
+    def test_middleware_records_samples(self):
+        self.client.get(reverse('app:Index'))
+        sample = profiling.buffer.snapshot()[-1]
+        self.assertEqual(sample.view, 'app:Index')
+        self.assertGreater(sample.queries, 0)
+        self.assertGreater(sample.template_time, 0)
+        self.assertGreaterEqual(sample.wall, sample.db_time)
+
+    def test_middleware_disabled(self):
+        with self.settings(QUIZ_PROFILING_ENABLED=False):
+            self.client.get(reverse('app:Index'))
+        self.assertEqual(profiling.buffer.snapshot(), [])
+
+    def test_stats_when_not_staff(self):
+        self.client.login(username='test', password='test')
+        response = self.client.get(self.profiling_url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_stats_when_staff(self):
+        self.client.get(reverse('app:Index'))
+        self.client.get(reverse('app:Index'))
+        self.client.login(username='staff', password='test')
+        response = self.client.get(self.profiling_url)
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()['views']['app:Index']
+        self.assertEqual(stats['count'], 2)
+        self.assertLessEqual(stats['wall_p50'], stats['wall_p99'])
+
+
+@override_settings(ROOT_URLCONF='quiz.async_urls')
+class AsyncViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.user = create_user()
+        self.quiz = Quiz.objects.create(title='Hello', author=self.user, is_published=True)
+        self.question = Question.objects.create(quiz=self.quiz, question='Question 1')
+        self.choice = QuestionChoice.objects.create(question=self.question, choice='Choice 1', is_correct=True)
+        QuestionChoice.objects.create(question=self.question, choice='Choice 2')
+
+    def setUp(self):
+        cache.clear()
+        profiling.buffer.samples.clear()
+
+    async def test_index(self):
+        response = await self.async_client.get(reverse('app:Index'))
+        self.assertIs(response.resolver_match.func.view_class, async_views.Index)
+        self.assertContains(response, 'Hello')
+        self.assertEqual(len(response.context['quizzes']), 1)
+
+        # Served from the page cache, and answered with a 304 on a matching ETag.
+        response = await self.async_client.get(reverse('app:Index'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_quiz_list(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse('app:QuizList'))
+        self.assertIs(response.resolver_match.func.view_class, async_views.QuizList)
+        self.assertContains(response, 'Hello')
+        response = await self.async_client.get(reverse('app:QuizList'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_quiz_detail(self):
+        url = reverse('app:QuizDetail', kwargs={'quiz_id': self.quiz.id})
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'Choice 1')
+        etag = response['ETag']
+
+        self.question.question = 'Changed'
+        await self.question.asave()
+        response = await self.async_client.get(url, headers={'If-None-Match': etag})
+        self.assertContains(response, 'Changed')
+
+        response = await self.async_client.get(reverse('app:QuizDetail', kwargs={'quiz_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_quiz_test(self):
+        url = reverse('app:QuizTest', kwargs={'quiz_id': self.quiz.id})
+        response = await self.async_client.get(url)
+        self.assertRedirects(response, reverse('app:AnonymousUserForm') + f'?quiz_id={self.quiz.id}', fetch_redirect_response=False)
+
+        url += '?anonymous=True&name=Anonymous&email=anonymous@example.com'
+        response = await self.async_client.get(url)
+        self.assertIs(response.resolver_match.func.view_class, async_views.QuizTest)
+        self.assertContains(response, 'Choice 2')
+
+        response = await self.async_client.post(url, {self.question.pk: [self.choice.pk]})
+        self.assertRedirects(response, reverse('app:QuizResultList'), fetch_redirect_response=False)
+        result = await QuizTestResult.objects.aget(quiz=self.quiz)
+        self.assertEqual(result.score, 1)
+        self.assertEqual(await QueuedMail.objects.filter(recipient='anonymous@example.com').acount(), 1)
+
+        response = await self.async_client.post(url, {self.question.pk: [0]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await QuizTestResult.objects.acount(), 1)
+
+    async def test_profiling_middleware(self):
+        await self.async_client.get(reverse('app:Index'))
+        sample = profiling.buffer.snapshot()[-1]
+        self.assertEqual(sample.view, 'app:Index')
+        self.assertGreater(sample.template_time, 0)
+        # The queries of the async ORM and of the sync_to_async threads are counted too.
+        self.assertGreater(sample.queries, 0)
+        self.assertGreater(sample.db_time, 0)
+
+
+@override_settings(ROOT_URLCONF='quiz.async_urls')
+class AsyncQuizResultExportTest(TransactionTestCase):
+    # The export runs in a thread of its own, which only sees committed data.
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.quiz = Quiz.objects.create(title='Quiz 1', author=self.user)
+        QuizTestResult.objects.create(quiz=self.quiz, user=self.user, score=3)
+        self.export_root = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(QUIZ_EXPORT_ROOT=self.export_root.name)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.export_root.cleanup()
+
+    async def test_quiz_result_export(self):
+        url = reverse('app:quiz_result_export', kwargs={'quiz_id': self.quiz.pk, 'filetype': 'csv'})
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(url)
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(lines[0], 'Username,Email,Score,Date')
+        self.assertTrue(lines[1].startswith('test,,3,'))
+
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get(reverse('app:quiz_result_export', kwargs={'quiz_id': self.quiz.pk, 'filetype': 'pdf'}))
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    async def test_quiz_result_export_client_gone(self):
+        await QuizTestResult.objects.abulk_create([QuizTestResult(quiz=self.quiz, user=self.user, score=score) for score in range(20)])
+        await sync_to_async(self.async_client.force_login)(self.user)
+        url = reverse('app:quiz_result_export', kwargs={'quiz_id': self.quiz.pk, 'filetype': 'csv'})
+        # A single export thread, left waiting on the full queue if the abandoned export was not stopped.
+        with self.settings(QUIZ_ASYNC_EXPORT_BUFFER=1), \
+                mock.patch.object(async_views, 'export_executor', ThreadPoolExecutor(max_workers=1)) as executor:
+            response = await self.async_client.get(url)
+            self.assertEqual(await response.streaming_content.__aiter__().__anext__(), b'Username,Email,Score,Date\r\n')
+            # Let the thread fill the queue, then close as the handler does when the client is gone.
+            await asyncio.sleep(0.2)
+            response.close()
+
+            response = await asyncio.wait_for(self.async_client.get(url), timeout=10)
+            lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+            self.assertEqual(len(lines), 22)
+        executor.shutdown(wait=False)
+
+    async def test_quiz_result_export_cached_artifact(self):
+        path = ExportQueue.artifact_path(self.quiz.pk, *await sync_to_async(ExportQueue.results_state)(self.quiz), 'csv')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write('cached')
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse('app:quiz_result_export', kwargs={'quiz_id': self.quiz.pk, 'filetype': 'csv'}))
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'cached')
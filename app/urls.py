@@ -12,6 +12,7 @@ urlpatterns = [
     path('<int:quiz_id>/detail/', views.QuizDetail.as_view(), name='QuizDetail'),
     path('<int:quiz_id>/publish/', views.quiz_publish, name='quiz_publish'),
     path('<int:quiz_id>/delete/', views.quiz_delete, name='quiz_delete'),
+    path('<int:quiz_id>/leaderboard/', views.QuizLeaderboard.as_view(), name='QuizLeaderboard'),
 
     path('<int:quiz_id>/question/create/', views.QuestionCreate.as_view(), name='QuestionCreate'),
     path('<int:quiz_id>/question/<int:question_id>/update/', views.QuestionUpdate.as_view(), name='QuestionUpdate'),
@@ -23,7 +24,14 @@ urlpatterns = [
 
     path('result/list/', views.QuizResultList.as_view(), name='QuizResultList'),
     path('<int:quiz_id>/result/export/<str:filetype>/', views.quiz_result_export, name='quiz_result_export'),
+    path('<int:quiz_id>/result/export/<str:filetype>/job/', views.quiz_result_export_job, name='quiz_result_export_job'),
+    path('export/job/<int:job_id>/', views.export_job_status, name='export_job_status'),
+    path('export/job/<int:job_id>/download/', views.export_job_download, name='export_job_download'),
     path('<int:quiz_id>/result/list/', views.UserAuthorQuizTestResultList.as_view(), name='UserAuthorQuizTestResultList'),
+    path('<int:quiz_id>/analytics/', views.QuizAnalyticsView.as_view(), name='QuizAnalytics'),
+    path('<int:quiz_id>/analytics/json/', views.quiz_analytics, name='quiz_analytics'),
 
     path('<int:result_id>/result/answer/', views.QuizResultAnswer.as_view(), name='QuizResultAnswer'),
+
+    path('profiling/', views.profiling_stats, name='profiling_stats'),
 ]
\ No newline at end of file
@@ -1,17 +1,28 @@
 
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import UserPassesTestMixin, LoginRequiredMixin
-from django.core.mail import send_mail
-from django.http import HttpResponseRedirect
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import FileResponse, Http404, HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
-from django.template.loader import get_template
-from django.urls import reverse_lazy
-from django.views.decorators.http import require_GET
+from django.urls import reverse, reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.views.generic import TemplateView, CreateView, FormView, DetailView, UpdateView, ListView
 
-from app.export import Export
+from app import profiling
+from app.analytics import QuizAnalytics
+from app.cache import PageCacheMixin, QuizVersion
+from app.conditional import QuizValidators
+from app.export import QuizResultListExport
+from app.jobs import ExportQueue
+from app.leaderboard import Leaderboard
+from app.mail import MailQueue
+from app.pagination import KeysetPaginationMixin
+from app.models import ExportJob
 from app.forms import *
 from quiz.settings.base import logger
 
@@ -20,15 +31,36 @@ def response_404_handler(request, exception=None):
     return render(request, "app/errors/404.html", status=404)
 
 
-class Index(TemplateView):
+def with_versions(quizzes):
+    """
+    Set the version of each quiz as its version attribute, for the template fragment cache keys.
+
+    :param quizzes: Iterable of Quiz instances.
+    :return: List of the quizzes.
+    """
+    quizzes = list(quizzes)
+    versions = QuizVersion.get_many([quiz.pk for quiz in quizzes])
+    for quiz in quizzes:
+        quiz.version = versions[quiz.pk]
+    return quizzes
+
+
+@method_decorator(condition(etag_func=QuizValidators.listing_etag), name='get')
+class Index(PageCacheMixin, TemplateView):
     """
     Index or Home view.
     """
     template_name = 'app/index.html'
 
+    def get_page_version(self):
+        return QuizVersion.get(QuizVersion.LISTING)
+
+    def get_queryset(self):
+        return Quiz.objects.filter(is_published=True).select_related('author').order_by('-created')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['quizzes'] = Quiz.objects.filter(is_published=True).order_by('-created')
+        context['quizzes'] = with_versions(self.get_queryset())
         return context
 
 
@@ -74,7 +106,8 @@ class QuizUpdate(LoginRequiredMixin, UpdateView):
         return super().form_valid(form)
 
 
-class QuizDetail(DetailView):
+@method_decorator(condition(etag_func=QuizValidators.detail_etag), name='get')
+class QuizDetail(PageCacheMixin, DetailView):
     """
     Detail of the quiz.
     """
@@ -83,8 +116,38 @@ class QuizDetail(DetailView):
     pk_url_kwarg = 'quiz_id'
     context_object_name = 'quiz'
 
+    def get_page_version(self):
+        return QuizVersion.get(self.kwargs.get('quiz_id'))
+
+    def get_queryset(self):
+        return Quiz.objects.select_related('author')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        quiz = self.object
+        # Only evaluated when the cached question blocks are rendered again.
+        context['questions'] = quiz.questions.order_by('pk').prefetch_related(
+            Prefetch('question_choices', queryset=QuestionChoice.objects.order_by('pk')))
+        context['quiz_version'] = QuizVersion.get(quiz.pk)
+        context['can_edit'] = self.request.user.is_authenticated and self.request.user == quiz.author and not quiz.is_published
+        return context
+
+
+class QuizLeaderboard(TemplateView):
+    """
+    Top results of the quiz.
+    """
+    template_name = 'app/quiz/quiz_leaderboard.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['quiz'] = get_object_or_404(Quiz, pk=self.kwargs.get('quiz_id'))
+        context['entries'] = Leaderboard.top(context['quiz'].pk)
+        return context
+
 
-class QuizList(ListView):
+@method_decorator(condition(etag_func=QuizValidators.listing_etag), name='get')
+class QuizList(PageCacheMixin, ListView):
     """
     View all quizzes.
     """
@@ -92,8 +155,16 @@ class QuizList(ListView):
     model = Quiz
     context_object_name = 'quizzes'
 
+    def get_page_version(self):
+        return QuizVersion.get(QuizVersion.LISTING)
+
     def get_queryset(self):
-        return Quiz.objects.distinct().filter(question__isnull=False, is_published=True).order_by('-created')
+        return Quiz.objects.filter(question_count__gt=0, is_published=True).select_related('author').order_by('-created')
+
+    def get_context_data(self, *, object_list=None, **kwargs):
+        context = super().get_context_data(object_list=object_list, **kwargs)
+        context['quizzes'] = with_versions(context['quizzes'])
+        return context
 
 
 class UserAuthorQuizList(LoginRequiredMixin, ListView):
@@ -106,7 +177,7 @@ class UserAuthorQuizList(LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        return Quiz.objects.filter(author=self.request.user).order_by('-created')
+        return Quiz.objects.filter(author=self.request.user).select_related('author').order_by('-created')
 
 
 @login_required
@@ -119,7 +190,7 @@ def quiz_publish(request, quiz_id):
     :return: Redirect to quiz detail.
     """
     quiz = get_object_or_404(Quiz, pk=quiz_id, author=request.user)
-    if quiz.questions.count() > 0:
+    if quiz.question_count > 0:
         quiz.publish_quiz()
         messages.add_message(request, messages.SUCCESS, 'Published successfully.')
     else:
@@ -274,32 +345,40 @@ class QuizTest(UserPassesTestMixin, FormView):
         return context
 
     def form_valid(self, form):
+        self.save_result(form)
+        messages.add_message(self.request, messages.SUCCESS, 'Thank you for your participation.')
+        return HttpResponseRedirect(reverse_lazy('app:QuizResultList'))
+
+    def save_result(self, form):
+        """
+        Save the result of the test and queue the result mail.
+        """
         query_param = self.request.GET
         quiz_id = self.kwargs.get('quiz_id')
 
-        if 'anonymous' in query_param and query_param['anonymous'] == 'True':
-            if query_param.get('email'):
-                q = form.save(quiz_id=quiz_id, user=None)
-                send_mail(subject='Quiz Test Result',
-                          message=f'{q.score}',
-                          from_email='test@gmail.com',
-                          recipient_list=[query_param['email']])
-        else:
-            q = form.save(quiz_id=quiz_id, user=self.request.user)
-            if self.request.user.email:
-                send_mail(subject='Quiz Test Result',
-                          message=f'{q.score}',
-                          from_email='test@gmail.com',
-                          recipient_list=[self.request.user.email])
-        messages.add_message(self.request, messages.SUCCESS, 'Thank you for your participation.')
-        return HttpResponseRedirect(reverse_lazy('app:QuizResultList'))
+        # The result mail is queued with the result, and sent by the send_queued_mail worker.
+        with transaction.atomic():
+            if 'anonymous' in query_param and query_param['anonymous'] == 'True':
+                if query_param.get('email'):
+                    q = form.save(quiz_id=quiz_id, user=None)
+                    MailQueue.enqueue(subject='Quiz Test Result',
+                                      message=f'{q.score}',
+                                      from_email='test@gmail.com',
+                                      recipient_list=[query_param['email']])
+            else:
+                q = form.save(quiz_id=quiz_id, user=self.request.user)
+                if self.request.user.email:
+                    MailQueue.enqueue(subject='Quiz Test Result',
+                                      message=f'{q.score}',
+                                      from_email='test@gmail.com',
+                                      recipient_list=[self.request.user.email])
 
     def form_invalid(self, form):
         print(form.errors)
         return super().form_invalid(form)
 
 
-class QuizResultList(LoginRequiredMixin, ListView):
+class QuizResultList(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     List of results of users quiz.
     """
@@ -309,10 +388,10 @@ class QuizResultList(LoginRequiredMixin, ListView):
     paginate_by = 12
 
     def get_queryset(self):
-        return QuizTestResult.objects.filter(user=self.request.user).order_by('-created')
+        return QuizTestResult.objects.filter(user=self.request.user).select_related('quiz__author').order_by('-created')
 
 
-class UserAuthorQuizTestResultList(LoginRequiredMixin, ListView):
+class UserAuthorQuizTestResultList(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     List of results of quizzes taken.
     """
@@ -322,99 +401,145 @@ class UserAuthorQuizTestResultList(LoginRequiredMixin, ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        return QuizTestResult.objects.filter(quiz=self.kwargs.get('quiz_id'), quiz__author=self.request.user).order_by('-created')
+        return QuizTestResult.objects.filter(quiz=self.kwargs.get('quiz_id'), quiz__author=self.request.user).select_related('user').order_by('-created')
+
+    def get_quiz(self):
+        if not hasattr(self, 'quiz'):
+            self.quiz = Quiz.objects.get(pk=self.kwargs.get('quiz_id'))
+        return self.quiz
+
+    def get_estimated_count(self):
+        return self.get_quiz().test_count
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data()
-        context['quiz'] = Quiz.objects.get(pk=self.kwargs.get('quiz_id'))
+        context['quiz'] = self.get_quiz()
+        context['export_filetypes'] = QuizResultListExport.FILETYPES
         return context
 
 
-class QuizResultListExport:
-    def __init__(self, quiz_id, *args, **kwargs):
-        """
-        :param quiz_id: The primary key of the quiz.
-        """
-        self.quiz = get_object_or_404(Quiz, pk=quiz_id)
-        self.results = QuizTestResult.objects.filter(quiz=self.quiz)
+class QuizAnalyticsView(LoginRequiredMixin, TemplateView):
+    """
+    Score distribution and item statistics of the quiz, for its author.
+    """
+    template_name = 'app/quiz/quiz_analytics.html'
 
-    def export_csv(self):
-        """
-        Export csv for quiz result.
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['quiz'] = get_object_or_404(Quiz, pk=self.kwargs.get('quiz_id'), author=self.request.user)
+        context['analytics'] = QuizAnalytics.get(context['quiz'].pk)
+        return context
 
-        :return: Response with csv attachment.
-        """
-        template = get_template('app/quiz/quiz_result_csv_template.html')
-        context = {'quiz': self.quiz, 'results': self.results}
-        filename = f'{self.quiz.title}-result.csv'
 
-        response = Export.export_csv(template, context, filename)
-        return response
+@require_GET
+@login_required
+def quiz_analytics(request, quiz_id):
+    """
+    Score distribution and item statistics of the quiz.
+
+    :param request:
+    :param quiz_id: The primary key of the quiz.
+    :return: Json response with the statistics, see QuizAnalytics.build.
+    """
+    quiz = get_object_or_404(Quiz.objects.only('pk'), pk=quiz_id, author=request.user)
+    return JsonResponse(QuizAnalytics.get(quiz.pk))
 
-    def export_xlsx(self):
-        """
-        Export csv for quiz result.
 
-        :return: Response with csv attachment.
-        """
-        template = get_template('app/quiz/quiz_result_xlsx_template.html')
-        context = {'quiz': self.quiz, 'results': self.results}
-        filename = f'{self.quiz.title}-result.xlsx'
+@require_GET
+@login_required
+@condition(etag_func=QuizValidators.export_etag)
+def quiz_result_export(request, quiz_id, filetype):
+    """
+    Export quiz result.
 
-        response = Export.export_xlsx(template, context, filename)
-        return response
+    :param request:
+    :param quiz_id: The primary key of the quiz.
+    :param filetype: The type of file to be exported.
+    :return: Response with attachment.
+    """
+    return export_response(quiz_id, filetype)
 
-    def export_pdf(self):
-        """
-        Export pdf for quiz result.
 
-        :return: Response with csv attachment.
-        """
-        template = get_template('app/quiz/quiz_result_pdf_template.html')
-        context = {'quiz': self.quiz, 'results': self.results}
-        filename = f'{self.quiz.title}-result.pdf'
+def export_response(quiz_id, filetype):
+    """
+    The cached export of the quiz result when there is one, the export streamed from the database otherwise.
+    """
+    quiz = get_object_or_404(Quiz, pk=quiz_id)
+    if filetype in QuizResultListExport.FILETYPES:
+        path = ExportQueue.cached_artifact(quiz, filetype)
+        if path:
+            try:
+                return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{quiz.title}-result.{filetype}')
+            except FileNotFoundError:
+                # Pruned by a newer export since it was found, exported from the database instead.
+                pass
 
-        response = Export.export_pdf(template, context, filename)
-        return response
+    return QuizResultListExport(quiz_id).export(filetype)
 
-    def export_docx(self):
-        """
-        Export docx for quiz result.
 
-        :return: Response with csv attachment.
-        """
-        template = get_template('app/quiz/quiz_result_docx_template.html')
-        context = {'quiz': self.quiz, 'results': self.results}
-        filename = f'{self.quiz.title}-result.docx'
+@require_POST
+@login_required
+def quiz_result_export_job(request, quiz_id, filetype):
+    """
+    Queue a background export of the quiz result.
 
-        response = Export.export_docx(template, context, filename)
-        return response
+    :param request:
+    :param quiz_id: The primary key of the quiz.
+    :param filetype: The type of file to be exported.
+    :return: Redirect to the export job status.
+    """
+    quiz = get_object_or_404(Quiz, pk=quiz_id, author=request.user)
+    if filetype not in QuizResultListExport.FILETYPES:
+        raise Http404(f'Unknown export file type {filetype}.')
+    job = ExportQueue.enqueue(quiz, filetype, request.user)
+    return HttpResponseRedirect(reverse_lazy('app:export_job_status', kwargs={'job_id': job.pk}))
 
 
 @require_GET
 @login_required
-def quiz_result_export(request, quiz_id, filetype):
+def export_job_status(request, job_id):
     """
-    Export quiz result.
+    Status of the export job.
 
     :param request:
-    :param quiz_id: The primary key of the quiz.
-    :param filetype: The type of file to be exported.
-    :return: Response with attachment.
+    :param job_id: The primary key of the export job.
+    :return: Json response with the status and the download url once done.
     """
-    q = QuizResultListExport(quiz_id)
+    job = get_object_or_404(ExportJob, pk=job_id, quiz__author=request.user)
+    data = {'id': job.pk, 'quiz': job.quiz_id, 'filetype': job.filetype, 'status': job.status, 'error': job.error}
+    if job.status == ExportJob.DONE:
+        data['download_url'] = reverse('app:export_job_download', kwargs={'job_id': job.pk})
+    return JsonResponse(data)
 
-    if filetype == 'csv':
-        return q.export_csv()
 
-    if filetype == 'xlsx':
-        return q.export_xlsx()
+@require_GET
+@login_required
+def export_job_download(request, job_id):
+    """
+    Download the file generated by the export job.
+
+    :param request:
+    :param job_id: The primary key of the export job.
+    :return: Response with attachment.
+    """
+    job = get_object_or_404(ExportJob.objects.select_related('quiz'), pk=job_id, quiz__author=request.user, status=ExportJob.DONE)
+    try:
+        return FileResponse(open(job.artifact, 'rb'), as_attachment=True, filename=f'{job.quiz.title}-result.{job.filetype}')
+    except FileNotFoundError:
+        raise Http404('Export file does not exist anymore.')
+
 
-    if filetype == 'pdf':
-        return q.export_pdf()
+@require_GET
+@staff_member_required
+def profiling_stats(request):
+    """
+    Per view percentiles of the requests recorded by the profiling middleware.
 
-    if filetype == 'docx':
-        return q.export_docx()
+    :param request:
+    :return: Json response with the statistics of each view, times in milliseconds.
+    """
+    profiling.publish()
+    return JsonResponse({'views': profiling.summarize(profiling.collect())})
 
 
 class QuizResultAnswer(LoginRequiredMixin, TemplateView):
@@ -426,7 +551,11 @@ class QuizResultAnswer(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         result_id = self.kwargs.get('result_id')
-        quiz_test_result = get_object_or_404(QuizTestResult, pk=result_id)
+        quiz_test_result = get_object_or_404(QuizTestResult.objects.select_related('quiz'), pk=result_id)
         context['result'] = quiz_test_result
-        context['answers'] = QuizTestResultAnswer.objects.filter(quiz_test=quiz_test_result)
+        context['answers'] = quiz_test_result.get_answers()
+        context['questions'] = quiz_test_result.quiz.questions.order_by('pk').prefetch_related(
+            Prefetch('question_choices', queryset=QuestionChoice.objects.order_by('pk')))
+        context['selected_choices'] = quiz_test_result.get_selected_choice_ids()
+        context['rank'] = Leaderboard.rank(quiz_test_result)
         return context
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quiz.settings')
+# Serve the async versions of the busiest views, see app/async_views.py.
+os.environ.setdefault('QUIZ_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -0,0 +1,14 @@
+"""quiz URL Configuration of the ASGI application
+
+quiz.urls, with the async versions of the app views in app/async_views.py.
+"""
+from django.urls import path, include
+from app import async_views
+from quiz import urls
+
+urlpatterns = [pattern for pattern in urls.urlpatterns if pattern not in urls.app_urlpatterns] + [
+    path('', async_views.Index.as_view()),
+    path('quiz/', include('app.async_urls')),
+]
+
+handler404 = urls.handler404
@@ -44,15 +44,16 @@ INSTALLED_APPS = [
     'crispy_forms',
     'widget_tweaks',
     'django_extensions',
-    'debug_toolbar',
     'simple_history',
 
     'app',
     'auth_app',
+    'admin_custom',
 
 ]
 
 MIDDLEWARE = [
+    'app.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,11 +62,11 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
     'simple_history.middleware.HistoryRequestMiddleware',
 ]
 
-ROOT_URLCONF = 'quiz.urls'
+# The ASGI application serves the async views, see quiz/asgi.py.
+ROOT_URLCONF = 'quiz.async_urls' if config('QUIZ_ASYNC_VIEWS', default=False, cast=bool) else 'quiz.urls'
 
 TEMPLATES = [
     {
@@ -130,6 +131,75 @@ STATICFILES_FINDERS = [
 
 SASS_PROCESSOR_ROOT = os.path.join(BASE_DIR, 'static')
 
+# Cache shared by the server processes and the management commands, which bump the quiz versions
+# and read the answer keys, leaderboards, pages and profiling samples the others cached. The file
+# cache covers the processes of one host, override CACHES with Redis or Memcached for several hosts.
+# Unreachable entries of old quiz versions are culled past MAX_ENTRIES.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('QUIZ_CACHE_LOCATION', default=os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+if 'test' in sys.argv:
+    # Every test run starts from an empty cache of its own.
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Number of QuizTestResultAnswer rows inserted per query when saving a quiz test.
+QUIZ_ANSWER_BATCH_SIZE = 500
+
+# Storage of the selected choices of new quiz tests: 'rows' of QuizTestResultAnswer, or 'packed'
+# into a bitmap on QuizTestResult. The pack_answers command converts existing rows.
+QUIZ_ANSWER_STORAGE = 'rows'
+
+# Seconds the pages listing and detailing quizzes are cached for anonymous visitors, 0 to disable.
+# Changes to the quizzes invalidate them at once, the test counters may lag for up to this long.
+QUIZ_PAGE_CACHE_TIMEOUT = 60
+
+# Number of results listed on the leaderboard of a quiz, and seconds a cached leaderboard is kept.
+# The timeout bounds how long a leaderboard rebuilt concurrently with a new top result may miss it.
+QUIZ_LEADERBOARD_SIZE = 10
+QUIZ_LEADERBOARD_TIMEOUT = 300
+
+# Number of quiz test results fetched per query when exporting results.
+QUIZ_EXPORT_CHUNK_SIZE = 2000
+
+# Threads generating the result exports of the async views, chunks of content each export
+# buffers ahead of the client, and seconds an export waits for the client to take a chunk.
+QUIZ_ASYNC_EXPORT_THREADS = 4
+QUIZ_ASYNC_EXPORT_BUFFER = 8
+QUIZ_ASYNC_EXPORT_STALL_TIMEOUT = 300
+
+# Result rows rendered per partial pdf, and processes rendering them in the export worker (None for the
+# number of CPUs). Requests render the pdf in their own process.
+QUIZ_PDF_CHUNK_ROWS = 500
+QUIZ_PDF_WORKERS = None
+
+# Request profiling: samples kept per process, and how often (seconds) they are
+# copied to the cache for the profiling_stats command and endpoint.
+QUIZ_PROFILING_ENABLED = True
+QUIZ_PROFILING_BUFFER_SIZE = 5000
+QUIZ_PROFILING_PUBLISH_INTERVAL = 10
+QUIZ_PROFILING_PUBLISH_TIMEOUT = 3600
+
+# Directory of the quiz result exports generated by the export worker, and seconds after which
+# a job left running by a worker that died is claimed again.
+QUIZ_EXPORT_ROOT = os.path.join(BASE_DIR, 'exports')
+QUIZ_EXPORT_LEASE_TIMEOUT = 1800
+
+# Mails delivered per connection by the send_queued_mail worker. A failed mail is retried after
+# QUIZ_MAIL_RETRY_DELAY seconds, doubled at each attempt, until QUIZ_MAIL_MAX_ATTEMPTS.
+# Mails claimed by a worker that died are claimed again after QUIZ_MAIL_LEASE_TIMEOUT seconds.
+QUIZ_MAIL_BATCH_SIZE = 100
+QUIZ_MAIL_RETRY_DELAY = 60
+QUIZ_MAIL_MAX_ATTEMPTS = 5
+QUIZ_MAIL_LEASE_TIMEOUT = 600
+
+# Write no historical row of a quiz or question for a save leaving its tracked fields unchanged.
+# The prune_history command removes the old, excess or no-op rows already written.
+QUIZ_HISTORY_SKIP_UNCHANGED = True
+
 LOGIN_REDIRECT_URL = 'app:Index'
 LOGOUT_REDIRECT_URL = 'app:Index'
 
@@ -9,8 +9,11 @@ ALLOWED_HOSTS = []
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'quiz.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # A file, as the served database. SQLite fails concurrent writers of an in-memory
+        # database at once with 'database table is locked', instead of waiting for the lock.
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test-db.sqlite3')},
     }
 }
 
@@ -18,6 +21,8 @@ AUTH_PASSWORD_VALIDATORS = []
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+INSTALLED_APPS += ['debug_toolbar']
+MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
 INTERNAL_IPS = ['127.0.0.1', 'localhost']
 
 # Override log level
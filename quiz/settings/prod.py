@@ -10,12 +10,15 @@ ALLOWED_HOSTS = ['localhost','127.0.0.1','quiz.com']
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'quiz.sqlite3',
         'NAME': config('DATABASE_NAME'),
         'USER': config('DATABASE_USER'),
         'PASSWORD': config("DATABASE_PASSWORD"),
         'HOST': config("DATABASE_HOST"),
-        'PORT': config("DATABASE_HOST")
+        'PORT': config("DATABASE_HOST"),
+        # A file, as the served database. SQLite fails concurrent writers of an in-memory
+        # database at once with 'database table is locked', instead of waiting for the lock.
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'test-db.sqlite3')},
     }
 }
 
@@ -0,0 +1,17 @@
+"""
+The SQLite backend of Django, with transactions taking the write lock when
+they begin (as the transaction_mode option of later Django versions).
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _start_transaction_under_autocommit(self):
+        """
+        Start a transaction with BEGIN IMMEDIATE. A deferred transaction reading
+        before it writes, as saving a test result does, fails at once with
+        'database is locked' when another connection writes at the same time,
+        without waiting for the lock.
+        """
+        self.cursor().execute('BEGIN IMMEDIATE')
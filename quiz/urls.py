@@ -18,13 +18,17 @@ from django.contrib import admin
 from django.urls import path, include
 from app import views as app_views
 
+# Replaced by their async versions in quiz/async_urls.py.
+app_urlpatterns = [
+    path('', app_views.Index.as_view()),
+    path('quiz/', include('app.urls'))
+]
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
     path('', include('auth_app.urls')),
-    path('', app_views.Index.as_view()),
-    path('quiz/', include('app.urls'))
-]
+] + app_urlpatterns
 
 if settings.DEBUG:
     import debug_toolbar